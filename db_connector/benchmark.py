@@ -0,0 +1,202 @@
+import datetime
+import json
+import os
+import platform
+import threading
+import time
+import duckdb
+import typer
+from . import numpy_engine, process_data
+from .load_data import store_arrow_batches
+from .synthetic import generate_tca_data
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+
+# The pairwise rank engine is quadratic per security; skip it above this size
+RANK_ENGINE_MAX_QUOTES = 1_000_000
+
+# A stage regresses when it is this much slower (or bigger) than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+# Stages faster than this in the baseline are too noisy to compare on wall time
+MIN_COMPARED_SECONDS = 0.05
+
+app = typer.Typer()
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # ru_maxrss is the lifetime peak (KiB on Linux, bytes on macOS); best effort only
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class PeakRss:
+    """Context manager sampling RSS on a background thread to find a stage's peak."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+class _TableCursor:
+    """Cursor stand-in serving an Arrow table the way Snowflake serves result chunks."""
+
+    def __init__(self, table, chunk_rows=500_000):
+        self.table = table
+        self.chunk_rows = chunk_rows
+
+    def fetch_arrow_batches(self):
+        for offset in range(0, self.table.num_rows, self.chunk_rows):
+            yield self.table.slice(offset, self.chunk_rows)
+
+
+def _stage_load_stream(ctx):
+    conn = duckdb.connect()
+    try:
+        store_arrow_batches(_TableCursor(ctx["quotes"]), "loaded_quotes", conn=conn)
+    finally:
+        conn.close()
+
+
+def _stage_bulk_load(ctx):
+    process_data.setup_tables(ctx["conn"])
+    process_data.bulk_load(ctx["conn"], ctx["quotes"], ctx["orders"], ctx["condition_filter"])
+
+
+# Benchmark stages in run order: (name, function(ctx), applies(n_quotes)).
+# ctx holds the generated tables and a DuckDB connection loaded by bulk_load.
+STAGES = [
+    ("load_stream", _stage_load_stream, None),
+    ("bulk_load", _stage_bulk_load, None),
+    ("filter_quotes", lambda ctx: process_data.filter_quotes(ctx["conn"]), None),
+    ("closest_quotes_rank", lambda ctx: process_data.closest_quotes(ctx["conn"], method="rank"),
+     lambda n: n <= RANK_ENGINE_MAX_QUOTES),
+    ("closest_quotes_asof", lambda ctx: process_data.closest_quotes(ctx["conn"], method="asof"), None),
+    ("compute_shortfall_metrics", lambda ctx: process_data.compute_shortfall_metrics(ctx["conn"]), None),
+    ("compute_metrics", lambda ctx: process_data.compute_metrics(ctx["conn"], method="asof"), None),
+    ("compute_markouts", lambda ctx: process_data.compute_markouts(ctx["conn"]), None),
+    # compute_metrics straight from the in-memory tables: NumPy vs. loading a fresh DuckDB
+    ("frames_metrics_numpy", lambda ctx: numpy_engine.metrics_from_frames(
+        ctx["quotes"], ctx["orders"], ctx["condition_filter"], engine="numpy"), None),
+    ("frames_metrics_duckdb", lambda ctx: numpy_engine.metrics_from_frames(
+        ctx["quotes"], ctx["orders"], ctx["condition_filter"], engine="duckdb"), None),
+]
+
+
+def run_benchmark(scales=DEFAULT_SCALES, seed=0, stages=None):
+    """
+    Run every stage on synthetic data at each scale (number of quotes).
+    Returns {"meta": ..., "results": {scale: {stage: {wall_seconds, peak_rss_mb, rows_per_sec}}}}.
+    """
+    results = {}
+    for n_quotes in scales:
+        n_securities = max(10, min(5000, n_quotes // 2000))
+        quotes, orders, condition_filter = generate_tca_data(n_quotes, n_securities, seed=seed)
+        ctx = {"quotes": quotes, "orders": orders, "condition_filter": condition_filter, "conn": duckdb.connect()}
+        scale_results = {}
+        try:
+            for name, stage, applies in STAGES:
+                if (stages and name not in stages) or (applies and not applies(n_quotes)):
+                    continue
+                with PeakRss() as rss:
+                    start = time.perf_counter()
+                    stage(ctx)
+                    wall = time.perf_counter() - start
+                scale_results[name] = {
+                    "wall_seconds": wall,
+                    "peak_rss_mb": rss.peak / 2**20,
+                    "rows_per_sec": n_quotes / wall if wall else 0.0,
+                }
+        finally:
+            ctx["conn"].close()
+        results[str(n_quotes)] = scale_results
+
+    meta = {
+        "created": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare_to_baseline(run, baseline, tolerance=DEFAULT_TOLERANCE, min_seconds=MIN_COMPARED_SECONDS):
+    """
+    Flag stages whose wall time or peak RSS grew by more than tolerance
+    relative to the baseline run. Returns a list of regressions.
+    """
+    regressions = []
+    for scale, stages in run["results"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("results", {}).get(scale, {}).get(stage)
+            if not previous:
+                continue
+            for metric in ("wall_seconds", "peak_rss_mb"):
+                if metric == "wall_seconds" and previous[metric] < min_seconds:
+                    continue
+                ratio = current[metric] / previous[metric] if previous[metric] else 1.0
+                if ratio > 1 + tolerance:
+                    regressions.append({
+                        "scale": scale, "stage": stage, "metric": metric,
+                        "baseline": previous[metric], "current": current[metric], "ratio": ratio,
+                    })
+    return regressions
+
+
+@app.command()
+def main(scales: list[int] = typer.Option(list(DEFAULT_SCALES), '--scale', '-s', help='Number of quotes; repeatable'),
+         output: str = typer.Option("bench_output.json", '--output', '-o', help='Where to write the results'),
+         baseline: str | None = typer.Option(None, '--baseline', '-b', help='Baseline JSON to compare against'),
+         tolerance: float = typer.Option(DEFAULT_TOLERANCE, '--tolerance', help='Allowed relative slowdown'),
+         seed: int = 0):
+    """Benchmark the TCA stages on synthetic data and compare against a baseline."""
+    run = run_benchmark(scales, seed=seed)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+
+    for scale, stages in run["results"].items():
+        for stage, r in stages.items():
+            typer.echo(f"{int(scale):>12,} {stage:<28} {r['wall_seconds']:9.3f}s "
+                       f"{r['peak_rss_mb']:9.1f} MB {r['rows_per_sec']:14,.0f} rows/s")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(run, json.load(f), tolerance)
+        for r in regressions:
+            typer.echo(f"REGRESSION {r['stage']} @ {r['scale']}: {r['metric']} "
+                       f"{r['baseline']:.3f} -> {r['current']:.3f} ({r['ratio']:.2f}x)")
+        if regressions:
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
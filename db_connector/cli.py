@@ -1,15 +1,15 @@
 import typer
-from rich.console import Console
-from rich.table import Table
-from .credentials import set_credentials, check_credentials, get_credentials
-from .db_engine import get_engine
+
+# Heavy modules (rich, keyring, SQLAlchemy and its dialects) are imported inside
+# the commands that need them, so `--help` and `check-credentials` start fast.
 
 app = typer.Typer()
-console = Console()
 
 @app.command("set-credentials")
 def set_credentials_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Database type'), user: str = typer.Option(..., '-u', '--user', help='User account')):
     """Interactively set credentials for the database."""
+    from .credentials import set_credentials
+
     if db_type.lower() == 'snowflake':
         token = typer.prompt("Enter API token", hide_input=True)
         # Store the token in keyring or wherever appropriate
@@ -19,6 +19,10 @@ def set_credentials_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help
 @app.command("check-credentials")
 def check_credentials_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Database type'), user: str = typer.Option(..., '-u', '--user', help='User account')):
     """Check if credentials exist for the given database and display status."""
+    from rich.console import Console
+    from rich.table import Table
+    from .credentials import check_credentials
+
     creds = check_credentials(db_type, user)
     table = Table(title=f"Credentials for {db_type}")
     table.add_column("User", justify="left")
@@ -29,14 +33,16 @@ def check_credentials_cmd(db_type: str = typer.Option(..., '-t', '--db-type', he
     else:
         table.add_row(user, "❌")  # Cross if not set
 
-    console.print(table)
+    Console().print(table)
 
 @app.command("get-engine")
-def get_engine_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Database type'), user: str = typer.Option(..., '-u', '--user', help='User account'), account: str = None, host: str = None, port: int = 1521, sid: str = None):
+def get_engine_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Database type'), user: str = typer.Option(..., '-u', '--user', help='User account'), account: str = None, host: str = None, port: int = 1521, sid: str = None, service_name: str = None, dsn: str = None):
     """Retrieve SQLAlchemy engine for the database.
     For Snowflake, provide account.
-    For Oracle, provide host, port, and sid.
+    For Oracle, provide host, port and sid or service-name, or a dsn.
     """
+    from .db_engine import get_engine
+
     try:
         params = {}
         if account:
@@ -45,6 +51,10 @@ def get_engine_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Dat
             params['host'] = host
         if sid:
             params['sid'] = sid
+        if service_name:
+            params['service_name'] = service_name
+        if dsn:
+            params['dsn'] = dsn
         if port:
             params['port'] = port
         engine = get_engine(db_type, user, **params)
@@ -52,5 +62,34 @@ def get_engine_cmd(db_type: str = typer.Option(..., '-t', '--db-type', help='Dat
     except Exception as e:
         typer.echo(f"Error: {e}")
 
+@app.command("profile")
+def profile_cmd(path: str = typer.Option(None, '-f', '--file', help='JSON lines file recorded via DB_CONNECTOR_PROFILE (defaults to its value)'), top: int = typer.Option(10, '-n', '--top', help='Number of statements to show'), sort: str = typer.Option('total', '--sort', help='Rank by total, max or mean seconds')):
+    """Summarise the slowest statements recorded by the query instrumentation."""
+    import os
+    from rich.console import Console
+    from rich.table import Table
+    from .instrumentation import PROFILE_ENV, read_events, summarize_events
+
+    path = path or os.environ.get(PROFILE_ENV)
+    if not path:
+        typer.echo(f"Error: pass --file or set {PROFILE_ENV}")
+        raise typer.Exit(code=1)
+    try:
+        summary = summarize_events(read_events(path), top=top, sort=sort)
+    except (OSError, ValueError) as e:
+        typer.echo(f"Error: {e}")
+        raise typer.Exit(code=1)
+
+    table = Table(title=f"Slowest statements by {sort} seconds")
+    for column in ("Source", "Statement", "Calls", "Total s", "Mean s", "Max s", "Rows", "Bytes"):
+        table.add_column(column, justify="left" if column in ("Source", "Statement") else "right")
+    for s in summary["statements"]:
+        table.add_row(s["source"], s["statement"][:80], str(s["count"]), f"{s['total']:.3f}",
+                      f"{s['mean']:.3f}", f"{s['max']:.3f}", f"{s['rows']:,}", f"{s['bytes']:,}")
+    console = Console()
+    console.print(table)
+    for source, c in summary["connects"].items():
+        console.print(f"{source}: {c['count']} connects, mean {c['mean']:.3f}s, max {c['max']:.3f}s")
+
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
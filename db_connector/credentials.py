@@ -1,6 +1,19 @@
 import os
+import threading
+import time
 import keyring
 import typer
+from keyring.errors import KeyringError
+
+KEYRING_SERVICE = "db_connector"
+
+# Seconds a resolved credential stays in the in-process cache.
+# Override with DB_CONNECTOR_CREDENTIAL_TTL; 0 disables caching.
+CREDENTIAL_TTL = float(os.environ.get("DB_CONNECTOR_CREDENTIAL_TTL", 300))
+
+_credential_cache = {}
+_credential_lock = threading.Lock()
+
 
 def set_credentials(db_type: str, user: str):
     """
@@ -10,16 +23,19 @@ def set_credentials(db_type: str, user: str):
     password = typer.prompt("Enter password", hide_input=True)
     # Store the password in keyring with a composite key
     keyring_key = f"{db_type}:{user}"
-    keyring.set_password("db_connector", keyring_key, password)
+    keyring.set_password(KEYRING_SERVICE, keyring_key, password)
+    invalidate_credentials(db_type, user)
     typer.echo("Credentials saved.")
 
 
-def get_credentials(db_type: str, user: str):
-    """
-    Retrieve credentials from keyring or fallback to environment variables.
-    """
+def _resolve_credentials(backend, db_type: str, user: str):
+    """Look up one credential in the given keyring backend, then the environment."""
     keyring_key = f"{db_type}:{user}"
-    password = keyring.get_password("db_connector", keyring_key)
+    try:
+        password = backend.get_password(KEYRING_SERVICE, keyring_key)
+    except KeyringError:
+        # No usable backend (e.g. headless host or locked keyring): use the env fallback.
+        password = None
     if password:
         return {"password": password}
     # Fallback to environment variable e.g. SNOWFLAKE_USER_PASSWORD
@@ -30,6 +46,61 @@ def get_credentials(db_type: str, user: str):
     return None
 
 
+def _cache_credentials(db_type: str, user: str, creds):
+    # Misses are not cached so credentials set later are picked up immediately.
+    if creds and CREDENTIAL_TTL > 0:
+        _credential_cache[(db_type, user)] = (time.monotonic() + CREDENTIAL_TTL, creds)
+
+
+def get_credentials(db_type: str, user: str, use_cache: bool = True):
+    """
+    Retrieve credentials from keyring or fallback to environment variables.
+    Results are cached in-process for CREDENTIAL_TTL seconds.
+    """
+    key = (db_type, user)
+    if use_cache:
+        with _credential_lock:
+            cached = _credential_cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+    creds = _resolve_credentials(keyring.get_keyring(), db_type, user)
+    with _credential_lock:
+        _cache_credentials(db_type, user, creds)
+    return creds
+
+
+def prefetch_credentials(pairs):
+    """
+    Resolve credentials for many (db_type, user) pairs in one pass and cache them.
+    Returns a dict mapping each pair to its credentials, or None if not found.
+    """
+    backend = keyring.get_keyring()
+    results = {}
+    for db_type, user in pairs:
+        if (db_type, user) not in results:
+            results[(db_type, user)] = _resolve_credentials(backend, db_type, user)
+
+    with _credential_lock:
+        for (db_type, user), creds in results.items():
+            _cache_credentials(db_type, user, creds)
+    return results
+
+
+def invalidate_credentials(db_type: str = None, user: str = None):
+    """
+    Drop cached credentials. With no arguments the whole cache is cleared,
+    otherwise only entries matching the given db_type and/or user.
+    """
+    with _credential_lock:
+        if db_type is None and user is None:
+            _credential_cache.clear()
+            return
+        for key in list(_credential_cache):
+            if (db_type is None or key[0] == db_type) and (user is None or key[1] == user):
+                del _credential_cache[key]
+
+
 def check_credentials(db_type: str, user: str):
     """
     Check if credentials exist for the given database type and user.
@@ -39,6 +110,3 @@ def check_credentials(db_type: str, user: str):
         typer.echo("Credentials found.")
     else:
         typer.echo("Credentials not found.")
-
-
-
@@ -1,35 +1,203 @@
+import atexit
 import os
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import NullPool
 from .credentials import get_credentials
+from .instrumentation import instrument_creator, instrument_engine
 
 
 class BaseEngineBuilder(ABC):
+    # Default QueuePool settings; subclasses override per database and callers
+    # can override per builder instance, e.g. OracleEngineBuilder(pool_size=20).
+    default_pool_settings = {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+        'pool_timeout': 30,
+    }
+
+    def __init__(self, **pool_settings):
+        unknown = set(pool_settings) - set(self.default_pool_settings)
+        if unknown:
+            raise ValueError(f"Unknown pool settings: {', '.join(sorted(unknown))}")
+        self.pool_settings = {**self.default_pool_settings, **pool_settings}
+
     @abstractmethod
-    def build_engine(self, user: str, password: str, **kwargs):
+    def build_url(self, user: str, password: str, **kwargs) -> URL:
         pass
 
+    def build_engine(self, user: str, password: str, **kwargs):
+        url = self.build_url(user, password, **kwargs)
+        # Listeners are no-ops until an instrumentation sink is configured.
+        return instrument_engine(create_engine(url, **self.pool_settings))
+
+    def dispose(self, engine):
+        """Close the engine's pooled connections."""
+        engine.dispose()
+
 
 class SnowflakeEngineBuilder(BaseEngineBuilder):
-    def build_engine(self, user: str, password: str, **kwargs):
+    # Snowflake drops idle sessions after four hours; recycle well before that
+    # and keep the pool small since every connection is a warehouse login.
+    default_pool_settings = {
+        **BaseEngineBuilder.default_pool_settings,
+        'pool_size': 2,
+        'max_overflow': 4,
+        'pool_recycle': 1800,
+    }
+
+    def build_url(self, user: str, password: str, **kwargs) -> URL:
         account = kwargs.get('account') or os.environ.get('SNOWFLAKE_ACCOUNT')
         if not account:
             raise ValueError("Snowflake account identifier must be provided via argument or SNOWFLAKE_ACCOUNT environment variable")
         # Construct URI: snowflake://<user>:<password>@<account>
-        uri = f"snowflake://{user}:{password}@{account}"
-        return create_engine(uri)
+        return URL.create("snowflake", username=user, password=password, host=account)
+
+
+# Rows fetched per Oracle round trip. The driver default of 100 turns a
+# million-row read into 10,000 round trips; this makes it 100.
+DEFAULT_ORACLE_ARRAYSIZE = 10_000
+
+# DRCP connection class used when none is given; sessions are only shared
+# between pools of the same class.
+DEFAULT_DRCP_CLASS = "DB_CONNECTOR"
+
+
+class OracleSessionPool:
+    """
+    python-oracledb driver session pool, created on the first connection so
+    building an engine stays offline. Its acquire() is the engine's creator.
+    """
+
+    def __init__(self, **params):
+        self.params = params
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def _create(self):
+        import oracledb
+
+        params = dict(self.params)
+        params['getmode'] = oracledb.POOL_GETMODE_TIMEDWAIT
+        if params.get('server_type') == 'pooled':
+            params['purity'] = oracledb.PURITY_SELF
+        return oracledb.create_pool(**params)
+
+    def acquire(self):
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = self._create()
+        return self.pool.acquire()
+
+    def close(self):
+        with self._lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.close(force=True)
+
+
+def _fetch_size_listener(arraysize, prefetchrows):
+    def set_fetch_size(conn, cursor, statement, parameters, context, executemany):
+        cursor.arraysize = arraysize
+        cursor.prefetchrows = prefetchrows
+    return set_fetch_size
 
 
 class OracleEngineBuilder(BaseEngineBuilder):
-    def build_engine(self, user: str, password: str, **kwargs):
+    """
+    Oracle through python-oracledb in thin mode (no Instant Client). Sessions
+    come from a driver session pool sized by the pool settings, optionally on
+    DRCP (Database Resident Connection Pooling), and every cursor fetches
+    arraysize rows per round trip.
+    """
+
+    def __init__(self, arraysize=DEFAULT_ORACLE_ARRAYSIZE, prefetchrows=None, **pool_settings):
+        super().__init__(**pool_settings)
+        if arraysize < 1:
+            raise ValueError("arraysize must be positive")
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows
+        self._session_pools = weakref.WeakKeyDictionary()
+
+    def connect_params(self, **kwargs):
+        """
+        Where to connect: a DSN (TNS alias, Easy Connect string or connect
+        descriptor), or a host and port with a service name or SID.
+        """
+        dsn = kwargs.get('dsn') or os.environ.get('ORACLE_DSN')
+        if dsn:
+            return {'dsn': dsn}
         host = kwargs.get('host') or os.environ.get('ORACLE_HOST')
         port = kwargs.get('port') or os.environ.get('ORACLE_PORT', 1521)
+        service_name = kwargs.get('service_name') or os.environ.get('ORACLE_SERVICE_NAME')
         sid = kwargs.get('sid') or os.environ.get('ORACLE_SID')
-        if not host or not sid:
-            raise ValueError("Oracle host and SID must be provided via arguments or environment variables (ORACLE_HOST, ORACLE_SID)")
-        # Construct URI: oracle://<user>:<password>@<host>:<port>/<sid>
-        uri = f"oracle://{user}:{password}@{host}:{port}/{sid}"
-        return create_engine(uri)
+        if not host or not (service_name or sid):
+            raise ValueError(
+                "Oracle dsn, or host and service name or SID, must be provided via arguments or environment "
+                "variables (ORACLE_DSN, ORACLE_HOST, ORACLE_SERVICE_NAME, ORACLE_SID)"
+            )
+        params = {'host': host, 'port': int(port)}
+        if service_name:
+            params['service_name'] = service_name
+        else:
+            params['sid'] = sid
+        return params
+
+    def build_url(self, user: str, password: str, **kwargs) -> URL:
+        params = self.connect_params(**kwargs)
+        # Construct URI: oracle+oracledb://<user>:<password>@<host>:<port>/<sid>,
+        # ...@<host>:<port>?service_name=<service>, or ...@/?dsn=<dsn>
+        if 'dsn' in params:
+            return URL.create("oracle+oracledb", username=user, password=password, query={'dsn': params['dsn']})
+        query = {'service_name': params['service_name']} if 'service_name' in params else {}
+        return URL.create("oracle+oracledb", username=user, password=password, host=params['host'],
+                          port=params['port'], database=params.get('sid'), query=query)
+
+    def session_pool_params(self, user: str, password: str, drcp=False, cclass=None, **kwargs):
+        """oracledb.create_pool arguments, with the pool settings mapped onto the driver pool."""
+        settings = self.pool_settings
+        params = {
+            'user': user,
+            'password': password,
+            **self.connect_params(**kwargs),
+            'min': settings['pool_size'],
+            'max': settings['pool_size'] + settings['max_overflow'],
+            'increment': 1,
+            'wait_timeout': int(settings['pool_timeout'] * 1000),
+            'max_lifetime_session': settings['pool_recycle'],
+            # Idle sessions are pinged before reuse when older than this; -1 disables
+            'ping_interval': 60 if settings['pool_pre_ping'] else -1,
+        }
+        if drcp:
+            params['server_type'] = 'pooled'
+            params['cclass'] = cclass or DEFAULT_DRCP_CLASS
+        return params
+
+    def build_engine(self, user: str, password: str, arraysize=None, prefetchrows=None, **kwargs):
+        url = self.build_url(user, password, **kwargs)
+        session_pool = OracleSessionPool(**self.session_pool_params(user, password, **kwargs))
+        # The driver pool does the pooling, so SQLAlchemy hands connections straight back to it.
+        creator = instrument_creator(session_pool.acquire, f"sqlalchemy:{url.get_backend_name()}")
+        engine = create_engine(url, creator=creator, poolclass=NullPool)
+        arraysize = arraysize or self.arraysize
+        if prefetchrows is None:
+            # One more row than arraysize lets a result that fits in one fetch finish in the execute round trip
+            prefetchrows = self.prefetchrows if self.prefetchrows is not None else arraysize + 1
+        event.listen(engine, "before_cursor_execute", _fetch_size_listener(arraysize, prefetchrows))
+        self._session_pools[engine] = session_pool
+        return instrument_engine(engine)
+
+    def dispose(self, engine):
+        engine.dispose()
+        session_pool = self._session_pools.pop(engine, None)
+        if session_pool is not None:
+            session_pool.close()
 
 
 # Registry of engine builders
@@ -38,39 +206,86 @@ engine_builders = {
     'oracle': OracleEngineBuilder(),
 }
 
+# Process-wide engine cache keyed on (db_type, user, connection params), so all
+# callers asking for the same database share one connection pool.
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _engine_key(db_type: str, user: str, kwargs: dict):
+    return (db_type.lower(), user, tuple(sorted(kwargs.items())))
+
+
+def _get_builder(db_type: str):
+    builder = engine_builders.get(db_type.lower())
+    if not builder:
+        raise ValueError(f"Unsupported database type: {db_type}")
+    return builder
+
+
+def _get_password(db_type: str, user: str):
+    creds = get_credentials(db_type, user)
+    if not creds or 'password' not in creds:
+        raise ValueError(f"Credentials not found for {db_type} user {user}")
+    return creds['password']
+
 
 def get_engine(db_type: str, user: str, **kwargs):
     """
     Retrieve a SQLAlchemy engine for a given db_type and user using dependency injection.
     The appropriate engine builder (e.g. SnowflakeEngineBuilder or OracleEngineBuilder) is selected from the registry.
+    Engines are cached per (db_type, user, connection params) and reused on later calls.
     """
-    creds = get_credentials(db_type, user)
-    if not creds or 'password' not in creds:
-        raise ValueError(f"Credentials not found for {db_type} user {user}")
-
-    password = creds['password']
-    builder = engine_builders.get(db_type.lower())
-    if not builder:
-        raise ValueError(f"Unsupported database type: {db_type}")
+    key = _engine_key(db_type, user, kwargs)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
 
-    engine = builder.build_engine(user, password, **kwargs)
+    builder = _get_builder(db_type)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            password = _get_password(db_type, user)
+            engine = builder.build_engine(user, password, **kwargs)
+            _engines[key] = engine
     return engine
 
 
-def create_connection_string(db_type: str, user: str, **kwargs):
+def dispose_engine(db_type: str, user: str, **kwargs):
     """
-    Create a connection string for the specified database type and user.
-    This can be used in other applications.
+    Dispose the cached engine for the given db_type, user and connection params, if any.
+    The next get_engine call builds a fresh engine (e.g. after a password rotation).
     """
-    creds = get_credentials(db_type, user)
-    if not creds or 'password' not in creds:
-        raise ValueError(f"Credentials not found for {db_type} user {user}")
+    with _engines_lock:
+        engine = _engines.pop(_engine_key(db_type, user, kwargs), None)
+    if engine is not None:
+        _get_builder(db_type).dispose(engine)
 
-    password = creds['password']
-    builder = engine_builders.get(db_type.lower())
-    if not builder:
-        raise ValueError(f"Unsupported database type: {db_type}")
 
-    # Construct the connection string using the builder
-    connection_string = builder.build_engine(user, password, **kwargs).url
-    return connection_string
+def dispose_engines():
+    """
+    Dispose every cached engine and close their pooled connections.
+    Registered with atexit; call it explicitly from service shutdown hooks.
+    """
+    with _engines_lock:
+        engines = list(_engines.items())
+        _engines.clear()
+    for (db_type, _, _), engine in engines:
+        builder = engine_builders.get(db_type)
+        if builder is not None:
+            builder.dispose(engine)
+        else:
+            engine.dispose()
+
+
+atexit.register(dispose_engines)
+
+
+def create_connection_string(db_type: str, user: str, **kwargs):
+    """
+    Create a connection string for the specified database type and user.
+    This can be used in other applications. No engine is created.
+    """
+    builder = _get_builder(db_type)
+    password = _get_password(db_type, user)
+    return builder.build_url(user, password, **kwargs)
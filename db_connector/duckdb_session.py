@@ -0,0 +1,214 @@
+import atexit
+import os
+import tempfile
+import threading
+import duckdb
+
+# DuckDB settings per workload. memory_fraction is turned into memory_limit as
+# a share of the memory available to the process (the cgroup limit in a
+# container, physical memory otherwise); everything else is passed to DuckDB as-is.
+TUNING_PROFILES = {
+    # Bulk ingest: leave room for the Arrow batches held in Python, and let DuckDB
+    # write rows in any order (an explicit ORDER BY is still honoured).
+    "loader": {
+        "memory_fraction": 0.5,
+        "preserve_insertion_order": False,
+        "checkpoint_threshold": "1GB",
+    },
+    # TCA queries: large joins and windows get most of the memory and spill to
+    # the temp directory beyond it.
+    "analytics": {
+        "memory_fraction": 0.75,
+        "preserve_insertion_order": True,
+    },
+}
+
+# Directory DuckDB spills large joins/sorts to (defaults to <database>.tmp)
+SPILL_DIR_ENV = "DB_CONNECTOR_DUCKDB_SPILL_DIR"
+
+
+# Mount point of the cgroup v2 hierarchy, or of the v1 controllers
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _cgroup_memory_limit():
+    """The process's cgroup v2 (memory.max) or v1 (memory.limit_in_bytes) limit, or None."""
+    root = CGROUP_ROOT
+    candidates = []
+    try:
+        with open("/proc/self/cgroup", encoding="utf-8") as f:
+            for line in f:
+                _, controllers, path = line.rstrip("\n").split(":", 2)
+                if not controllers:
+                    candidates.append(os.path.join(root, path.lstrip("/"), "memory.max"))
+                elif "memory" in controllers.split(","):
+                    candidates.append(os.path.join(root, "memory", path.lstrip("/"), "memory.limit_in_bytes"))
+    except (OSError, ValueError):
+        pass
+    # Inside a container's cgroup namespace the limit sits at the root
+    candidates += [os.path.join(root, "memory.max"), os.path.join(root, "memory", "memory.limit_in_bytes")]
+    limits = []
+    for candidate in candidates:
+        try:
+            with open(candidate, encoding="utf-8") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():  # "max" means unlimited
+            limits.append(int(value))
+    return min(limits) if limits else None
+
+
+def _available_memory():
+    """Memory the process can use: the cgroup limit if lower than physical memory."""
+    limits = [m for m in (_physical_memory(), _cgroup_memory_limit()) if m]
+    return min(limits) if limits else None
+
+
+def _spill_dir(path, spill_dir=None):
+    spill_dir = spill_dir or os.environ.get(SPILL_DIR_ENV)
+    if spill_dir:
+        return spill_dir
+    if path in (":memory:", ""):
+        # One directory per process, so in-memory databases never share temp files
+        return os.path.join(tempfile.gettempdir(), f"db_connector_duckdb_spill-{os.getpid()}")
+    return f"{path}.tmp"
+
+
+def tuning_config(path=":memory:", profile="analytics", spill_dir=None, **settings):
+    """
+    DuckDB config for a workload profile, with settings overriding the profile
+    and temp_directory pointing at the spill directory.
+    """
+    try:
+        config = {**TUNING_PROFILES[profile], **settings}
+    except KeyError:
+        raise ValueError(f"Unknown DuckDB tuning profile: {profile}") from None
+    fraction = config.pop("memory_fraction", None)
+    memory = _available_memory()
+    if fraction and memory and "memory_limit" not in config:
+        config["memory_limit"] = f"{int(memory * fraction) // 2**20}MiB"
+    config.setdefault("temp_directory", _spill_dir(path, spill_dir))
+    return {k: v for k, v in config.items() if v is not None}
+
+
+def connect(path=":memory:", profile="analytics", read_only=False, spill_dir=None, **settings):
+    """Open a DuckDB connection tuned for profile; the caller owns and closes it."""
+    return duckdb.connect(path, read_only=read_only, config=tuning_config(path, profile, spill_dir, **settings))
+
+
+class DuckDBSession:
+    """
+    A lazily opened, tuned DuckDB database with per-thread cursors.
+
+    DuckDB allows one read-write process per database file, so readers inside
+    the process use cursor() (each thread gets its own cursor on the shared
+    database and sees committed data), and readers in other processes open a
+    snapshot() copy read-only with open_snapshot() while ingestion goes on.
+    """
+
+    def __init__(self, path=":memory:", profile="analytics", read_only=False, spill_dir=None, **settings):
+        self.path = path
+        self.profile = profile
+        self.read_only = read_only
+        self.config = tuning_config(path, profile, spill_dir, **settings)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cursors = []
+
+    @property
+    def conn(self):
+        """The session's connection, opened on first use."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = duckdb.connect(self.path, read_only=self.read_only, config=self.config)
+        return self._conn
+
+    def cursor(self):
+        """A cursor owned by the calling thread, created on its first call."""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self.conn.cursor()
+            self._local.cursor = cursor
+            with self._lock:
+                self._cursors.append(cursor)
+        return cursor
+
+    def snapshot(self, snapshot_path):
+        """
+        Copy the database to snapshot_path in one transaction, while writers
+        keep going, and swap it into place atomically. Readers that already
+        have the previous snapshot open keep reading it.
+        """
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        cursor = self.conn.cursor()
+        try:
+            source = cursor.execute("SELECT current_database()").fetchone()[0]
+            cursor.execute(f"ATTACH '{tmp_path}' AS db_connector_snapshot")
+            try:
+                cursor.execute(f'COPY FROM DATABASE "{source}" TO db_connector_snapshot')
+            finally:
+                cursor.execute("DETACH db_connector_snapshot")
+        finally:
+            cursor.close()
+        os.replace(tmp_path, snapshot_path)
+        return snapshot_path
+
+    def close(self):
+        with self._lock:
+            cursors, self._cursors = self._cursors, []
+            conn, self._conn = self._conn, None
+        for cursor in cursors:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_snapshot(snapshot_path, profile="analytics", **settings):
+    """Read-only session on a snapshot written by DuckDBSession.snapshot()."""
+    return DuckDBSession(snapshot_path, profile=profile, read_only=True, **settings)
+
+
+# Process-wide sessions keyed on (path, read_only); the first caller's profile wins.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(path=":memory:", profile="analytics", read_only=False, **settings):
+    """Return the shared session for path, creating it (unopened) on first use."""
+    key = (os.path.abspath(path) if path != ":memory:" else path, read_only)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = DuckDBSession(path, profile=profile, read_only=read_only, **settings)
+    return session
+
+
+def close_sessions():
+    """Close every shared session. Registered with atexit."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_sessions)
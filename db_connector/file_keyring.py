@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+from jaraco.classes import properties
+from keyring.backend import KeyringBackend
+from keyring.errors import PasswordDeleteError
+
+DEFAULT_PATH_ENV = "DB_CONNECTOR_KEYRING_FILE"
+
+
+class FileKeyring(KeyringBackend):
+    """
+    Keyring stand-in that stores passwords in a JSON file.
+
+    Passwords are stored in plain text, so this is meant for tests and CI
+    machines without a desktop keyring, not for real secrets. Enable it with
+    keyring.set_keyring(FileKeyring(path)) or by setting
+    PYTHON_KEYRING_BACKEND=db_connector.file_keyring.FileKeyring together with
+    DB_CONNECTOR_KEYRING_FILE=<path>.
+    """
+
+    @classmethod
+    def _default_path(cls):
+        return os.environ.get(DEFAULT_PATH_ENV)
+
+    @properties.classproperty
+    def priority(cls):
+        # Only eligible for automatic selection when explicitly configured.
+        if not cls._default_path():
+            raise RuntimeError(f"{DEFAULT_PATH_ENV} is not set")
+        return 0.5
+
+    def __init__(self, path: str = None):
+        super().__init__()
+        self.path = path or self._default_path()
+        if not self.path:
+            raise ValueError(f"FileKeyring needs a path or the {DEFAULT_PATH_ENV} environment variable")
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, data):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def get_password(self, service: str, username: str):
+        with self._lock:
+            return self._read().get(service, {}).get(username)
+
+    def set_password(self, service: str, username: str, password: str):
+        with self._lock:
+            data = self._read()
+            data.setdefault(service, {})[username] = password
+            self._write(data)
+
+    def delete_password(self, service: str, username: str):
+        with self._lock:
+            data = self._read()
+            if username not in data.get(service, {}):
+                raise PasswordDeleteError("Password not found")
+            del data[service][username]
+            self._write(data)
@@ -0,0 +1,223 @@
+import time
+import pyarrow as pa
+from . import process_data
+from .instrumentation import duckdb_query
+from .process_data import CLOSEST_QUOTE_TOLERANCE, DEFAULT_LOAD_CHUNK_ROWS, SETTLEMENT_HORIZON, _metrics_query
+
+# Materialized compute_metrics result, one row per order (with its time columns)
+METRICS_TABLE = "tca_metrics"
+
+# Event time of each tracked table; new rows dirty their security over this range
+TIME_COLUMNS = {"quotes": "timestamp", "orders": "fulfill_time"}
+
+# 🔹 Orders whose metrics can change because of the dirty ranges:
+# - new orders themselves (orders ranges cover their fulfill_time),
+# - orders whose closest quote may now be a new quote (fulfill_time within
+#   tolerance after it), whose VWAP window contains a new quote, or whose
+#   markout time is at or after a new quote,
+# - every order of a security that traded on a new exchange, since that
+#   changes which condition codes are excluded for the security.
+DIRTY_ORDERS_SQL = """
+    WITH new_order_securities AS (
+        SELECT DISTINCT security_id FROM tca_dirty_ranges WHERE source = 'orders'
+    ),
+    changed_exchanges AS (
+        SELECT DISTINCT security_id FROM (
+            SELECT DISTINCT security_id, mic_exchange FROM orders
+            WHERE security_id IN (SELECT security_id FROM new_order_securities)
+            EXCEPT
+            SELECT security_id, mic_exchange FROM tca_order_exchanges
+        )
+    )
+    SELECT o.security_id, o.fulfill_time, o.order_start_time, o.order_end_time, o.execution_price
+    FROM orders o
+    JOIN tca_dirty_ranges r ON o.security_id = r.security_id
+    WHERE (r.source = 'orders' AND o.fulfill_time BETWEEN r.start_time AND r.end_time)
+       OR (r.source = 'quotes' AND (
+            o.fulfill_time BETWEEN r.start_time AND r.end_time + to_seconds($tolerance + 1)
+            OR (o.order_start_time <= r.end_time AND o.order_end_time >= r.start_time)
+            OR o.order_end_time + to_seconds($horizon) >= r.start_time
+       ))
+    UNION
+    SELECT security_id, fulfill_time, order_start_time, order_end_time, execution_price
+    FROM orders
+    WHERE security_id IN (SELECT security_id FROM changed_exchanges)
+"""
+
+# 🔹 Shadows quotes/orders for compute_metrics' CTEs with just what the dirty
+# orders need: all orders of their securities (for the exchange-based condition
+# filter) and the quotes between the earliest window start / closest-quote
+# lookback and the latest markout time. Any order that has a closest quote has
+# a filtered quote inside that range at or before its markout time, so the
+# markout ASOF lookups see the same prevailing quote as a full run. Orders
+# filled after their markout time can need older quotes and keep the full tape.
+REFRESH_SCOPE = """
+    quote_bounds AS (
+        SELECT security_id,
+               MIN(CASE WHEN fulfill_time > order_end_time + to_seconds($horizon) THEN '-infinity'::TIMESTAMP
+                        ELSE LEAST(order_start_time, fulfill_time - to_seconds($tolerance + 1)) END) AS low,
+               MAX(GREATEST(fulfill_time, order_end_time + to_seconds($horizon))) AS high
+        FROM tca_refresh_orders
+        GROUP BY security_id
+    ),
+    quotes AS (
+        SELECT q.* FROM main.quotes q
+        JOIN quote_bounds b ON q.security_id = b.security_id AND q.timestamp BETWEEN b.low AND b.high
+    ),
+    orders AS (
+        SELECT * FROM main.orders WHERE security_id IN (SELECT security_id FROM quote_bounds)
+    ),
+"""
+
+_REFRESH_ORDER_MATCH = """
+    f.security_id = r.security_id AND f.fulfill_time = r.fulfill_time
+    AND f.order_start_time = r.order_start_time AND f.order_end_time = r.order_end_time
+    AND f.execution_price IS NOT DISTINCT FROM r.execution_price
+"""
+
+
+def setup_incremental(conn, method="asof", tolerance_seconds=CLOSEST_QUOTE_TOLERANCE):
+    """
+    Create the dirty-range and refresh state tables. The first refresh_metrics
+    builds tca_metrics in full; later ones only recompute dirty orders.
+    """
+    process_data._closest_quotes_cte(method)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tca_dirty_ranges (
+            security_id TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            source TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS tca_order_exchanges (security_id TEXT, mic_exchange TEXT)")
+    conn.execute("""
+        CREATE OR REPLACE TABLE tca_incremental_config (method TEXT, tolerance_seconds INTEGER, built BOOLEAN)
+    """)
+    conn.execute("INSERT INTO tca_incremental_config VALUES (?, ?, FALSE)", [method, tolerance_seconds])
+
+
+def mark_dirty(conn, security_id, start_time, end_time, source="quotes"):
+    """Record that rows of source for security_id arrived between start_time and end_time."""
+    if source not in TIME_COLUMNS:
+        raise ValueError(f"Unsupported dirty source: {source}")
+    conn.execute("INSERT INTO tca_dirty_ranges VALUES (?, ?, ?, ?)", [security_id, start_time, end_time, source])
+
+
+def _field_index(schema, name):
+    for i, field in enumerate(schema):
+        if field.name.lower() == name:
+            return i
+    raise ValueError(f"Invalid schema: missing column {name}")
+
+
+def _tracked(data, time_column, chunk_rows, ranges):
+    """
+    Pass data through as a RecordBatchReader, collecting the min/max of
+    time_column per security of every batch into ranges on the way.
+    """
+    if not isinstance(data, (pa.RecordBatchReader, pa.Table)):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    if isinstance(data, pa.Table):
+        data = pa.RecordBatchReader.from_batches(data.schema, data.to_batches(max_chunksize=chunk_rows))
+    security = _field_index(data.schema, "security_id")
+    event_time = _field_index(data.schema, time_column)
+
+    def batches():
+        for batch in data:
+            if batch.num_rows:
+                ids = batch.column(security)
+                if pa.types.is_dictionary(ids.type):
+                    ids = ids.dictionary_decode()
+                ranges.append(
+                    pa.table({"security_id": ids.cast(pa.string()), "t": batch.column(event_time)})
+                    .group_by("security_id").aggregate([("t", "min"), ("t", "max")])
+                )
+            yield batch
+
+    return pa.RecordBatchReader.from_batches(data.schema, batches())
+
+
+def ingest(conn, quotes=None, orders=None, chunk_rows=DEFAULT_LOAD_CHUNK_ROWS):
+    """
+    bulk_load new quotes and/or orders and record, in the same transaction,
+    the time range each security received, so refresh_metrics knows which
+    orders to recompute. Returns the bulk_load stats.
+    """
+    ranges = {}
+    sources = {}
+    for table_name, data in (("quotes", quotes), ("orders", orders)):
+        if data is not None:
+            ranges[table_name] = []
+            sources[table_name] = _tracked(data, TIME_COLUMNS[table_name], chunk_rows, ranges[table_name])
+
+    def record_ranges(conn, table_name):
+        if not ranges.get(table_name):
+            return
+        new_ranges = (
+            pa.concat_tables(ranges[table_name])
+            .group_by("security_id").aggregate([("t_min", "min"), ("t_max", "max")])
+        )
+        conn.register("tca_new_ranges", new_ranges)
+        try:
+            conn.execute(
+                f"INSERT INTO tca_dirty_ranges SELECT security_id, t_min_min, t_max_max, '{table_name}' FROM tca_new_ranges"
+            )
+        finally:
+            conn.unregister("tca_new_ranges")
+
+    return process_data.bulk_load(conn, sources.get("quotes"), sources.get("orders"),
+                                  chunk_rows=chunk_rows, on_insert=record_ranges)
+
+
+def refresh_metrics(conn, full=False):
+    """
+    Bring tca_metrics up to date with the quotes and orders ingested since the
+    last refresh, recomputing only the dirty orders on the quote ranges they
+    need. The first refresh, or full=True (e.g. after condition_filter
+    changes), rebuilds the table from scratch. Returns the number of orders
+    recomputed, rows written and elapsed seconds.
+    """
+    method, tolerance, built = conn.execute(
+        "SELECT method, tolerance_seconds, built FROM tca_incremental_config"
+    ).fetchone()
+    params = {"tolerance": tolerance, "horizon": SETTLEMENT_HORIZON}
+    metrics_params = {"tolerance": tolerance, "horizons": [SETTLEMENT_HORIZON]}
+    full = full or not built
+    start = time.perf_counter()
+    conn.begin()
+    try:
+        if full:
+            duckdb_query(conn, f"CREATE OR REPLACE TABLE {METRICS_TABLE} AS {_metrics_query(method, order_keys=True)}",
+                          metrics_params, label="refresh_metrics:full", fetch=None)
+            orders = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            conn.execute("DELETE FROM tca_order_exchanges")
+            conn.execute("INSERT INTO tca_order_exchanges SELECT DISTINCT security_id, mic_exchange FROM orders")
+            conn.execute("UPDATE tca_incremental_config SET built = TRUE")
+        else:
+            duckdb_query(conn, f"CREATE OR REPLACE TEMP TABLE tca_refresh_orders AS {DIRTY_ORDERS_SQL}",
+                         params, label="refresh_metrics:dirty_orders", fetch=None)
+            orders = conn.execute("SELECT COUNT(*) FROM tca_refresh_orders").fetchone()[0]
+            if orders:
+                query = _metrics_query(
+                    method, scope=REFRESH_SCOPE, order_keys=True,
+                    select=f"SELECT f.* FROM final_metrics f SEMI JOIN tca_refresh_orders r ON {_REFRESH_ORDER_MATCH}",
+                )
+                conn.execute(f"DELETE FROM {METRICS_TABLE} f USING tca_refresh_orders r WHERE {_REFRESH_ORDER_MATCH}")
+                duckdb_query(conn, f"INSERT INTO {METRICS_TABLE} {query}", {**params, **metrics_params},
+                             label="refresh_metrics:incremental", fetch=None)
+            conn.execute("""
+                INSERT INTO tca_order_exchanges
+                SELECT DISTINCT security_id, mic_exchange FROM orders
+                WHERE security_id IN (SELECT security_id FROM tca_dirty_ranges WHERE source = 'orders')
+                EXCEPT
+                SELECT security_id, mic_exchange FROM tca_order_exchanges
+            """)
+            conn.execute("DROP TABLE tca_refresh_orders")
+        conn.execute("DELETE FROM tca_dirty_ranges")
+        rows = conn.execute(f"SELECT COUNT(*) FROM {METRICS_TABLE}").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"full": full, "orders": orders, "rows": rows, "seconds": time.perf_counter() - start}
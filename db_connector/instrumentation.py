@@ -0,0 +1,302 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Opt-in query instrumentation. Nothing is recorded until a sink is added,
+# either with add_sink() or by pointing DB_CONNECTOR_PROFILE at a JSON lines file.
+#
+# Every event is a dict with kind ("query", "connect" or "checkout"), source
+# ("duckdb" or "sqlalchemy:<dialect>"), and where known label, statement,
+# seconds, rows, bytes and (DuckDB only) the profiler's JSON output. Failed
+# SQLAlchemy statements are recorded as query events with error set to True.
+
+PROFILE_ENV = "DB_CONNECTOR_PROFILE"
+
+logger = logging.getLogger("db_connector")
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+    sink.close()
+
+
+def clear_sinks():
+    with _sinks_lock:
+        sinks = list(_sinks)
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(clear_sinks)
+
+
+def is_enabled():
+    return bool(_sinks)
+
+
+def record(event):
+    event.setdefault("time", time.time())
+    for sink in tuple(_sinks):
+        sink.write(event)
+
+
+class LogSink:
+    """Log one line per event (without the profiler tree) at the given level."""
+
+    def __init__(self, level=logging.INFO, log=logger):
+        self.level = level
+        self.log = log
+
+    def write(self, event):
+        fields = {k: v for k, v in event.items() if k not in ("profile", "time")}
+        self.log.log(self.level, "db_connector %s", json.dumps(fields, default=str))
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Append every event as one JSON document per line; read back by `db-connect profile`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusTextSink:
+    """
+    Aggregate events into counters for the node_exporter textfile collector.
+    The file is rewritten atomically at most every min_interval seconds and on close.
+    """
+
+    def __init__(self, path, prefix="db_connector", min_interval=5.0):
+        self.path = path
+        self.prefix = prefix
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._last_write = 0.0
+
+    def _add(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        self._metrics[key] = self._metrics.get(key, 0) + value
+
+    def write(self, event):
+        labels = {"source": event.get("source", "")}
+        kind = event.get("kind")
+        with self._lock:
+            if kind == "query":
+                labels["label"] = event.get("label") or ""
+                self._add("query_seconds_count", labels, 1)
+                self._add("query_seconds_sum", labels, event.get("seconds") or 0.0)
+                self._add("query_rows_total", labels, event.get("rows") or 0)
+                self._add("query_bytes_total", labels, event.get("bytes") or 0)
+            elif kind == "connect":
+                self._add("connect_seconds_count", labels, 1)
+                self._add("connect_seconds_sum", labels, event.get("seconds") or 0.0)
+            elif kind == "checkout":
+                self._add("pool_checkouts_total", labels, 1)
+            if time.monotonic() - self._last_write >= self.min_interval:
+                self._flush()
+
+    def _flush(self):
+        lines = []
+        for (name, labels), value in sorted(self._metrics.items()):
+            rendered = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+            lines.append(f"{self.prefix}_{name}{{{rendered}}} {value}")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+        self._last_write = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _configure_from_env():
+    path = os.environ.get(PROFILE_ENV)
+    if path:
+        add_sink(JsonLinesSink(path))
+
+
+_configure_from_env()
+
+
+def instrument_creator(creator, source):
+    """
+    Wrap a SQLAlchemy creator callable so each new connection is recorded as a
+    connect event. Engines built with creator= never call the dialect's
+    do_connect, so instrument_engine cannot time their connects.
+    """
+
+    def timed_creator():
+        if not _sinks:
+            return creator()
+        start = time.perf_counter()
+        connection = creator()
+        record({"kind": "connect", "source": source, "seconds": time.perf_counter() - start})
+        return connection
+
+    return timed_creator
+
+
+def instrument_engine(engine):
+    """
+    Attach pool connect/checkout and cursor execute listeners to a SQLAlchemy
+    engine. The listeners return immediately while no sink is configured.
+    """
+    from sqlalchemy import event
+
+    source = f"sqlalchemy:{engine.url.get_backend_name()}"
+
+    @event.listens_for(engine, "do_connect")
+    def _before_connect(dialect, conn_rec, cargs, cparams):
+        if _sinks:
+            conn_rec.info["db_connector_connect_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, conn_rec):
+        start = conn_rec.info.pop("db_connector_connect_start", None)
+        if start is not None and _sinks:
+            record({"kind": "connect", "source": source, "seconds": time.perf_counter() - start})
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, conn_rec, conn_proxy):
+        if _sinks:
+            record({"kind": "checkout", "source": source})
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if _sinks:
+            conn.info.setdefault("db_connector_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("db_connector_query_start")
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        if _sinks:
+            rowcount = getattr(cursor, "rowcount", -1)
+            record({
+                "kind": "query", "source": source, "statement": statement, "seconds": seconds,
+                "rows": rowcount if rowcount is not None and rowcount >= 0 else None,
+                "executemany": executemany,
+            })
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # A failing statement never reaches after_cursor_execute; drop its start time here
+        conn = context.connection
+        starts = conn.info.get("db_connector_query_start") if conn is not None else None
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        if _sinks:
+            record({
+                "kind": "query", "source": source, "statement": context.statement, "seconds": seconds,
+                "rows": None, "executemany": bool(context.execution_context and context.execution_context.executemany),
+                "error": True,
+            })
+
+    return engine
+
+
+def duckdb_query(conn, sql, params=None, label=None, fetch="fetchdf"):
+    """
+    Run sql on a DuckDB connection and return getattr(result, fetch)(), or
+    None when fetch is None (DDL/DML). While instrumentation is enabled the
+    query runs under DuckDB's profiler and its JSON output is recorded with
+    the latency, rows and result bytes.
+    """
+    if not _sinks:
+        result = conn.execute(sql, params)
+        return getattr(result, fetch)() if fetch else None
+
+    conn.execute("PRAGMA enable_profiling = 'no_output'")
+    try:
+        start = time.perf_counter()
+        result = conn.execute(sql, params)
+        value = getattr(result, fetch)() if fetch else None
+        seconds = time.perf_counter() - start
+        profile = json.loads(conn.get_profiling_information(format="json"))
+    finally:
+        conn.execute("PRAGMA disable_profiling")
+    record({
+        "kind": "query", "source": "duckdb", "label": label, "statement": sql, "seconds": seconds,
+        "rows": profile.get("rows_returned"), "bytes": profile.get("result_set_size"),
+        "profile": profile,
+    })
+    return value
+
+
+def read_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _statement_key(event):
+    return event.get("label") or re.sub(r"\s+", " ", event.get("statement") or "").strip()[:200]
+
+
+def summarize_events(events, top=10, sort="total"):
+    """
+    Group query events by source and label (or normalised statement) and
+    return the top groups by total, max or mean seconds, plus connect stats.
+    """
+    if sort not in ("total", "max", "mean"):
+        raise ValueError(f"Unsupported sort: {sort}")
+    groups = {}
+    connects = {}
+    for event in events:
+        if event.get("kind") == "connect":
+            stats = connects.setdefault(event.get("source"), {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += event["seconds"]
+            stats["max"] = max(stats["max"], event["seconds"])
+        elif event.get("kind") == "query":
+            key = (event.get("source"), _statement_key(event))
+            stats = groups.setdefault(key, {"source": key[0], "statement": key[1], "count": 0,
+                                            "total": 0.0, "max": 0.0, "rows": 0, "bytes": 0})
+            stats["count"] += 1
+            stats["total"] += event["seconds"]
+            stats["max"] = max(stats["max"], event["seconds"])
+            stats["rows"] += event.get("rows") or 0
+            stats["bytes"] += event.get("bytes") or 0
+    for stats in list(groups.values()) + list(connects.values()):
+        stats["mean"] = stats["total"] / stats["count"]
+    slowest = sorted(groups.values(), key=lambda s: s[sort], reverse=True)[:top]
+    return {"statements": slowest, "connects": connects}
@@ -1,7 +1,14 @@
 import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 import snowflake.connector
 import duckdb
-from snowflake.connector.errors import ProgrammingError
+import pyarrow as pa
+import pyarrow.compute as pc
+from snowflake.connector.errors import Error as SnowflakeError
+from .duckdb_session import close_sessions, get_session
+from .instrumentation import duckdb_query
 
 # Snowflake connection details
 SNOWFLAKE_CONFIG = {
@@ -13,73 +20,416 @@ SNOWFLAKE_CONFIG = {
     "schema": "your_schema"
 }
 
-# Connect to DuckDB (Persistent DB)
+# DuckDB (Persistent DB), opened on first use with the loader tuning profile
 DUCKDB_PATH = "quotes_data.duckdb"
-duckdb_conn = duckdb.connect(DUCKDB_PATH)
 
-# Asynchronous function to fetch data from Snowflake
-async def fetch_and_store_quotes(query, table_name):
-    """Fetches data from Snowflake and saves to DuckDB"""
+# Maximum rows appended to DuckDB per Arrow batch; bounds loader memory
+DEFAULT_BATCH_ROWS = 100_000
+
+# Securities per batched extraction query (bound IN list)
+DEFAULT_CHUNK_SIZE = 1000
+
+# Natural key of a quote; incremental loads upsert on it and use
+# (timestamp, condition_code) as the per-security high-watermark.
+QUOTE_KEY = ("security_id", "timestamp", "condition_code")
+
+
+def get_duckdb_conn():
+    """Return the shared DuckDB connection, opening it on first use."""
+    return get_session(DUCKDB_PATH, profile="loader").conn
+
+
+def _append_batch(conn, table_name, batch, created):
+    """Append one Arrow record batch to a DuckDB table, creating it from the batch schema if needed."""
+    conn.register("arrow_batch", batch)
     try:
-        conn = snowflake.connector.connect(**SNOWFLAKE_CONFIG)
-        cur = conn.cursor()
-        
-        # Run query asynchronously
-        cur.execute_async(query)
-        query_id = cur.sfqid  # Query ID
-
-        # Wait for query completion
-        while True:
-            status = conn.get_query_status(query_id)
-            if status == snowflake.connector.QueryStatus.COMPLETE:
-                break
-            elif status == snowflake.connector.QueryStatus.FAILED:
-                raise RuntimeError(f"Query Failed: {query_id}")
-            await asyncio.sleep(0.5)  # Non-blocking wait
-
-        # Fetch results
-        cur.execute(f"SELECT * FROM TABLE(RESULT_SCAN('{query_id}'))")
-        df = cur.fetch_pandas_all()
-        
-        # Store in DuckDB
-        if not df.empty:
-            duckdb_conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM df")
-            duckdb_conn.execute(f"INSERT INTO {table_name} SELECT * FROM df")
-        
-        cur.close()
-        conn.close()
-        return len(df)  # Return row count
-
-    except ProgrammingError as e:
-        print(f"Error: {e}")
-        return 0
+        if table_name not in created:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM arrow_batch LIMIT 0")
+            created.add(table_name)
+        duckdb_query(conn, f"INSERT INTO {table_name} SELECT * FROM arrow_batch", label=f"append:{table_name}", fetch=None)
+    finally:
+        conn.unregister("arrow_batch")
 
-# Run multiple queries concurrently
-async def main():
-    securities = ["AAPL", "TSLA", "GOOGL"]
+
+def _iter_record_batches(cur, batch_rows):
+    """Yield non-empty record batches of at most batch_rows rows from a cursor's Arrow result."""
+    for table in cur.fetch_arrow_batches():
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            if batch.num_rows:
+                yield batch
+
+
+def _column(batch, name):
+    """Look up a batch column case-insensitively (Snowflake upper-cases unquoted names)."""
+    for i, field in enumerate(batch.schema):
+        if field.name.lower() == name.lower():
+            return batch.column(i)
+    raise KeyError(name)
+
+
+def _count_by(batch, name, counts):
+    for entry in pc.value_counts(_column(batch, name)).to_pylist():
+        counts[entry["values"]] = counts.get(entry["values"], 0) + entry["counts"]
+
+
+def _throughput(rows, nbytes, seconds):
+    return {
+        "rows": rows,
+        "bytes": nbytes,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else 0.0,
+        "bytes_per_sec": nbytes / seconds if seconds else 0.0,
+    }
+
+
+def store_arrow_batches(cur, table_name, conn=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Stream a cursor's result into a DuckDB table as Arrow record batches.
+
+    Batches come from cur.fetch_arrow_batches() and are re-chunked to at most
+    batch_rows rows before being appended, so only one batch is held in memory
+    at a time and pandas is never involved. The table is created from the
+    first batch's schema if needed. Returns rows, bytes and throughput stats.
+    """
+    conn = conn or get_duckdb_conn()
+    rows = nbytes = 0
+    created = set()
+    start = time.perf_counter()
+
+    for batch in _iter_record_batches(cur, batch_rows):
+        _append_batch(conn, table_name, batch, created)
+        rows += batch.num_rows
+        nbytes += batch.nbytes
+
+    return _throughput(rows, nbytes, time.perf_counter() - start)
+
+
+def _connect_snowflake():
+    return snowflake.connector.connect(**SNOWFLAKE_CONFIG)
+
+
+async def load_queries(queries, conn=None, max_concurrency=4, batch_rows=DEFAULT_BATCH_ROWS,
+                       connect=_connect_snowflake, queue_size=8, table_name=None, count_by=None,
+                       writer=_append_batch):
+    """
+    Run several Snowflake queries concurrently and stream their results into DuckDB.
+
+    queries maps a name to SQL, or to a (SQL, params) tuple for bound
+    parameters. Results go to the DuckDB table of the same name, or all into
+    table_name if given. Each query runs on a worker thread with its own
+    connection from connect(); at most max_concurrency are in flight. Workers
+    push Arrow batches onto a bounded queue drained by a single writer task,
+    which performs every DuckDB write on one dedicated thread because DuckDB
+    allows only one writer connection.
+
+    writer(conn, table_name, batch, created) performs each write; the default
+    appends. Returns per-query stats (rows, bytes, seconds, throughput, error,
+    and row counts per count_by value if set) plus the overall wall clock and
+    the speedup over running the queries back to back.
+    """
+    conn = conn or get_duckdb_conn()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    stats = {name: {"rows": 0, "bytes": 0, "counts": {}, "error": None} for name in queries}
+
+    def fetch(name, query):
+        # Runs on a worker thread: blocking connector calls never touch the event loop.
+        sql, params = (query, None) if isinstance(query, str) else query
+        sf_conn = connect()
+        try:
+            cur = sf_conn.cursor()
+            cur.execute(sql, params)
+            for batch in _iter_record_batches(cur, batch_rows):
+                asyncio.run_coroutine_threadsafe(queue.put((name, batch)), loop).result()
+            cur.close()
+        finally:
+            sf_conn.close()
+
+    async def run_query(name, query, fetch_pool):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(fetch_pool, fetch, name, query)
+            except Exception as e:
+                # Any failure is recorded per query: raising here would stop the writer
+                # while other fetch threads still block on the full queue.
+                if not isinstance(e, SnowflakeError):
+                    e = f"{type(e).__name__}: {e}"
+                print(f"Error: {e}")
+                stats[name]["error"] = str(e)
+            stats[name]["seconds"] = time.perf_counter() - start
+
+    def store(name, batch, created):
+        # Runs on the single writer thread.
+        writer(conn, table_name or name, batch, created)
+        if count_by:
+            _count_by(batch, count_by, stats[name]["counts"])
+
+    async def write(writer_pool):
+        created = set()
+        while (item := await queue.get()) is not None:
+            name, batch = item
+            query_stats = stats[name]
+            if query_stats["error"] is None:
+                try:
+                    await loop.run_in_executor(writer_pool, store, name, batch, created)
+                    query_stats["rows"] += batch.num_rows
+                    query_stats["bytes"] += batch.nbytes
+                except Exception as e:
+                    # Keep draining the queue so fetch threads never block on it
+                    query_stats["error"] = str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as fetch_pool, \
+            ThreadPoolExecutor(max_workers=1) as writer_pool:
+        write_task = asyncio.create_task(write(writer_pool))
+        try:
+            await asyncio.gather(*(run_query(n, q, fetch_pool) for n, q in queries.items()))
+        finally:
+            await queue.put(None)
+            await write_task
+    wall_seconds = time.perf_counter() - start
+
+    results = {
+        name: {**_throughput(s["rows"], s["bytes"], s["seconds"]), "counts": s["counts"], "error": s["error"]}
+        for name, s in stats.items()
+    }
+    query_seconds = sum(s["seconds"] for s in results.values())
+    return {
+        "queries": results,
+        "wall_seconds": wall_seconds,
+        "speedup": query_seconds / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def chunk_securities(securities, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Split securities into chunks of at most chunk_size, dropping duplicates and keeping order."""
+    unique = list(dict.fromkeys(securities))
+    return [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+
+
+def build_chunk_query(chunk, where=None, source="quotes"):
+    """Build one extraction query with a bound IN list over a chunk of securities."""
+    placeholders = ", ".join(["%s"] * len(chunk))
+    sql = f"SELECT * FROM {source} WHERE security_id IN ({placeholders})"
+    if where:
+        sql += f" AND {where}"
+    return sql, tuple(chunk)
+
+
+async def load_securities(securities, where=None, chunk_size=DEFAULT_CHUNK_SIZE, table_name="quotes", **kwargs):
+    """
+    Extract quotes for many securities with one query per chunk of securities.
+
+    Every chunk writes into the single DuckDB table table_name, keyed by
+    security_id, instead of one query and one table per security. Extra
+    keyword arguments are passed to load_queries. The result adds
+    rows_by_security with the row count loaded for each requested security.
+    """
     queries = {
-        sec: f"SELECT * FROM quotes WHERE security_id = '{sec}' AND timestamp >= CURRENT_TIMESTAMP - INTERVAL '30 seconds'"
-        for sec in securities
+        f"chunk_{i}": build_chunk_query(chunk, where)
+        for i, chunk in enumerate(chunk_securities(securities, chunk_size))
     }
+    result = await load_queries(queries, table_name=table_name, count_by="security_id", **kwargs)
+    result["rows_by_security"] = _rows_by_security(securities, result)
+    return result
 
-    # Run all queries asynchronously
-    results = await asyncio.gather(*(fetch_and_store_quotes(q, sec) for sec, q in queries.items()))
 
-    # Print summary
-    print(f"✅ Data saved in DuckDB. Rows inserted per security: {dict(zip(securities, results))}")
+def _rows_by_security(securities, result):
+    rows_by_security = dict.fromkeys(securities, 0)
+    for stats in result["queries"].values():
+        for security_id, count in stats["counts"].items():
+            rows_by_security[security_id] = rows_by_security.get(security_id, 0) + count
+    return rows_by_security
 
-# Execute async queries
-asyncio.run(main())
 
-# Close DuckDB connection
-duckdb_conn.close()
+def setup_watermarks(conn, table_name="quotes"):
+    """Create the per-security high-watermark table for table_name if needed."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name}_watermarks (
+            security_id TEXT PRIMARY KEY,
+            last_timestamp TIMESTAMP,
+            last_condition_code TEXT
+        )
+    """)
+
+
+def get_watermarks(conn, table_name="quotes"):
+    """Return {security_id: (last_timestamp, last_condition_code)} for table_name."""
+    rows = conn.execute(
+        f"SELECT security_id, last_timestamp, last_condition_code FROM {table_name}_watermarks"
+    ).fetchall()
+    return {security_id: (ts, cc) for security_id, ts, cc in rows}
+
+
+def build_incremental_query(chunk, watermarks, where=None, source="quotes"):
+    """
+    Build one extraction query returning only rows past each security's watermark.
+
+    The chunk's watermarks are bound as a VALUES list and joined to the source,
+    so each security is filtered on its own (timestamp, condition_code).
+    Securities without a watermark are read in full, or only the rows
+    matching where if given; where never limits securities with a watermark.
+    """
+    values = ", ".join(["(%s, %s, %s)"] * len(chunk))
+    params = []
+    for security_id in chunk:
+        last_timestamp, last_condition_code = watermarks.get(security_id, (None, None))
+        params += [security_id, last_timestamp, last_condition_code]
+    sql = f"""
+        SELECT q.* FROM {source} q
+        JOIN (
+            SELECT column1 AS security_id, column2::TIMESTAMP_NTZ AS wm_timestamp, column3 AS wm_condition_code
+            FROM VALUES {values}
+        ) w ON q.security_id = w.security_id
+        WHERE (w.wm_timestamp IS NULL{f" AND ({where})" if where else ""})
+           OR q.timestamp > w.wm_timestamp
+           OR (q.timestamp = w.wm_timestamp AND COALESCE(q.condition_code, '') > w.wm_condition_code)
+    """
+    return sql, tuple(params)
+
+
+def _ensure_keyed_table(conn, table_name):
+    """Create table_name from the registered batch's schema with QUOTE_KEY as primary key."""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM arrow_batch LIMIT 0")
+    has_key = conn.execute(
+        "SELECT COUNT(*) FROM duckdb_constraints() WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'",
+        [table_name],
+    ).fetchone()[0]
+    if not has_key:
+        conn.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY ({', '.join(QUOTE_KEY)})")
+
+
+def _upsert_quotes_batch(conn, table_name, batch, created, pending):
+    """
+    Upsert one batch of quotes on QUOTE_KEY and collect each security's latest
+    (timestamp, condition_code) of the batch into pending.
+
+    Watermarks are not written here: a query's batches arrive unordered and a
+    later one can still fail, so load_incremental advances them only once the
+    whole query has been stored. Missing condition codes are stored as '' since
+    key columns cannot be NULL.
+    """
+    conn.register("arrow_batch", batch)
+    try:
+        conn.begin()
+        try:
+            if table_name not in created:
+                _ensure_keyed_table(conn, table_name)
+                created.add(table_name)
+            duckdb_query(conn, f"""
+                INSERT OR REPLACE INTO {table_name} BY NAME
+                SELECT * REPLACE (COALESCE(condition_code, '') AS condition_code)
+                FROM arrow_batch
+                QUALIFY row_number() OVER (
+                    PARTITION BY security_id, timestamp, COALESCE(condition_code, '')
+                ) = 1
+            """, label=f"upsert:{table_name}", fetch=None)
+            marks = conn.execute("""
+                SELECT security_id, timestamp, COALESCE(condition_code, '')
+                FROM arrow_batch
+                QUALIFY row_number() OVER (
+                    PARTITION BY security_id ORDER BY timestamp DESC, COALESCE(condition_code, '') DESC
+                ) = 1
+            """).fetchall()
+            conn.commit()
+        except duckdb.Error:
+            conn.rollback()
+            raise
+    finally:
+        conn.unregister("arrow_batch")
+    for security_id, last_timestamp, last_condition_code in marks:
+        pending[security_id] = max(pending.get(security_id, (last_timestamp, last_condition_code)),
+                                   (last_timestamp, last_condition_code))
+
+
+def _advance_watermarks(conn, table_name, marks):
+    """Move the watermarks of marks ({security_id: (timestamp, condition_code)}) forward, never back."""
+    if not marks:
+        return
+    conn.register("new_watermarks", pa.table({
+        "security_id": pa.array(list(marks), pa.string()),
+        "last_timestamp": pa.array([ts for ts, _ in marks.values()], pa.timestamp("us")),
+        "last_condition_code": pa.array([cc for _, cc in marks.values()], pa.string()),
+    }))
+    try:
+        duckdb_query(conn, f"""
+            INSERT INTO {table_name}_watermarks
+            SELECT security_id, last_timestamp, last_condition_code FROM new_watermarks
+            ON CONFLICT (security_id) DO UPDATE SET
+                last_timestamp = excluded.last_timestamp,
+                last_condition_code = excluded.last_condition_code
+            WHERE excluded.last_timestamp > {table_name}_watermarks.last_timestamp
+               OR (excluded.last_timestamp = {table_name}_watermarks.last_timestamp
+                   AND excluded.last_condition_code > {table_name}_watermarks.last_condition_code)
+        """, label=f"watermarks:{table_name}", fetch=None)
+    finally:
+        conn.unregister("new_watermarks")
+
+
+async def load_incremental(securities, where=None, chunk_size=DEFAULT_CHUNK_SIZE, table_name="quotes",
+                           conn=None, **kwargs):
+    """
+    Incrementally ingest quotes past each security's stored high-watermark.
+
+    Rows are upserted on (security_id, timestamp, condition_code), so rerunning
+    or overlapping runs never duplicate data. A chunk's watermarks advance only
+    after all of its rows are stored, so a failed chunk is fetched again in
+    full on the next run. where optionally bounds the first load of securities
+    that have no watermark yet. Extra keyword arguments are passed to
+    load_queries; the result includes rows_by_security.
+    """
+    conn = conn or get_duckdb_conn()
+    setup_watermarks(conn, table_name)
+    watermarks = get_watermarks(conn, table_name)
+    chunks = {f"chunk_{i}": chunk for i, chunk in enumerate(chunk_securities(securities, chunk_size))}
+    queries = {name: build_incremental_query(chunk, watermarks, where) for name, chunk in chunks.items()}
+    pending = {}
+    result = await load_queries(
+        queries, conn=conn, table_name=table_name, count_by="security_id",
+        writer=functools.partial(_upsert_quotes_batch, pending=pending), **kwargs
+    )
+    stored = {
+        security_id: pending[security_id]
+        for name, chunk in chunks.items() if result["queries"][name]["error"] is None
+        for security_id in chunk if security_id in pending
+    }
+    _advance_watermarks(conn, table_name, stored)
+    result["rows_by_security"] = _rows_by_security(securities, result)
+    return result
+
+
+# Asynchronous function to fetch data from Snowflake
+async def fetch_and_store_quotes(query, table_name, batch_rows=DEFAULT_BATCH_ROWS):
+    """Fetches data from Snowflake and streams it into DuckDB"""
+    result = await load_queries({table_name: query}, batch_rows=batch_rows)
+    stats = result["queries"][table_name]
+    print(
+        f"{table_name}: {stats['rows']} rows, {stats['rows_per_sec']:,.0f} rows/s, "
+        f"{stats['bytes_per_sec'] / 1e6:,.1f} MB/s"
+    )
+    return stats["rows"]  # Return row count
+
+# Run multiple queries concurrently
+async def main():
+    securities = ["AAPL", "TSLA", "GOOGL"]
+
+    # Only rows past each security's watermark, upserted into the quotes table
+    result = await load_incremental(securities, where="q.timestamp >= CURRENT_DATE")
+
+    # Print summary
+    print(f"✅ Data saved in DuckDB. Rows inserted per security: {result['rows_by_security']}")
+    print(f"Wall clock {result['wall_seconds']:.2f}s, {result['speedup']:.1f}x faster than sequential")
 
-import duckdb
 
-duckdb_conn = duckdb.connect("quotes_data.duckdb")
+if __name__ == "__main__":
+    # Execute async queries
+    asyncio.run(main())
 
-# Query the latest quotes in DuckDB
-df = duckdb_conn.execute("SELECT * FROM AAPL ORDER BY timestamp DESC LIMIT 10").fetchdf()
-print(df)
+    # Query the latest quotes in DuckDB
+    df = get_duckdb_conn().execute("SELECT * FROM quotes WHERE security_id = 'AAPL' ORDER BY timestamp DESC LIMIT 10").fetchdf()
+    print(df)
 
-duckdb_conn.close()
\ No newline at end of file
+    # Close DuckDB connection
+    close_sessions()
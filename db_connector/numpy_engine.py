@@ -0,0 +1,292 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from . import process_data
+from .process_data import CLOSEST_QUOTE_TOLERANCE, SETTLEMENT_HORIZON
+
+# engine="auto" uses the NumPy engine up to this many quotes. This is a memory
+# cap, not a speed crossover: NumPy stays faster than loading and querying an
+# in-memory DuckDB at every measured size, but it holds sorted copies of every
+# quote column at once (about 200 bytes per quote at peak, ~400 MB here),
+# whereas DuckDB works within its memory_limit.
+NUMPY_ENGINE_MAX_QUOTES = 2_000_000
+
+ENGINES = ("auto", "numpy", "duckdb")
+
+_US = 1_000_000
+_NAT = np.iinfo(np.int64).min
+
+
+def _column(data, name):
+    """A column of a pandas DataFrame or Arrow table as a NumPy array."""
+    if isinstance(data, pa.Table):
+        column = data.column(name)
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        return column.to_numpy()
+    return data[name].to_numpy()
+
+
+def _floats(data, name):
+    # The FLOAT columns of setup_tables, so results round the way DuckDB's do
+    return np.asarray(_column(data, name), dtype=np.float32)
+
+
+def _micros(data, name):
+    """Timestamps as int64 microseconds; NaT becomes _NAT."""
+    return np.asarray(_column(data, name)).astype("datetime64[us]").view(np.int64)
+
+
+def _strings(data, name):
+    return np.asarray(_column(data, name), dtype=object)
+
+
+class _SortedQuotes:
+    """
+    Quotes sorted by (security, timestamp), each packed into one int64 key so
+    that a single searchsorted finds, for every order at once, the latest
+    quote of its security at or before a time. Securities occupy disjoint key
+    ranges, so a lookup never lands on another security's quotes.
+    """
+
+    def __init__(self, security, timestamp, values):
+        self.t0 = int(timestamp.min()) if len(timestamp) else 0
+        self.span = int(timestamp.max()) - self.t0 + 2 if len(timestamp) else 2
+        n_securities = int(security.max()) + 1 if len(security) else 0
+        if n_securities * self.span >= np.iinfo(np.int64).max:
+            raise ValueError("Quote time range too wide for the NumPy engine; use engine='duckdb'")
+        keys = security * self.span + (timestamp - self.t0)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.security = security[order]
+        self.timestamp = timestamp[order]
+        self.values = {name: column[order] for name, column in values.items()}
+
+    def subset(self, mask):
+        """The quotes where mask (in sorted order) is set, still sorted."""
+        subset = object.__new__(_SortedQuotes)
+        subset.t0, subset.span = self.t0, self.span
+        subset.keys, subset.security, subset.timestamp = self.keys[mask], self.security[mask], self.timestamp[mask]
+        subset.values = {name: column[mask] for name, column in self.values.items()}
+        return subset
+
+    def _lookup_keys(self, security, times):
+        # Times outside the quotes' range clip to just before / after all of the security's keys
+        return security * self.span + np.clip(times - self.t0, -1, self.span - 1)
+
+    def _own(self, security, pos):
+        if not len(self.keys):
+            return np.full(len(pos), -1)
+        return np.where((pos >= 0) & (self.security[np.maximum(pos, 0)] == security), pos, -1)
+
+    def last_at_or_before(self, security, times):
+        """Position of the latest quote of security with timestamp <= time, or -1."""
+        return self._own(security, np.searchsorted(self.keys, self._lookup_keys(security, times), side="right") - 1)
+
+    def last_before(self, security, times):
+        """Position of the latest quote of security with timestamp < time, or -1."""
+        return self._own(security, np.searchsorted(self.keys, self._lookup_keys(security, times), side="left") - 1)
+
+    def take(self, name, pos):
+        """Column name at pos, NaN where pos is -1."""
+        column = self.values[name]
+        if not len(column):
+            return np.full(len(pos), np.nan, dtype=column.dtype)
+        out = column[np.maximum(pos, 0)]
+        return np.where(pos >= 0, out, np.nan).astype(out.dtype)
+
+    def time_at(self, pos):
+        """Timestamp (int64 microseconds) at pos, _NAT where pos is -1."""
+        if not len(self.timestamp):
+            return np.full(len(pos), _NAT)
+        return np.where(pos >= 0, self.timestamp[np.maximum(pos, 0)], _NAT)
+
+
+def _prepare(quotes, orders):
+    """
+    Quotes sorted by security and time, and order columns as arrays, with
+    securities as shared integer codes.
+    """
+    quote_ids = _strings(quotes, "security_id")
+    order_ids = _strings(orders, "security_id")
+    codes, _ = pd.factorize(np.concatenate([quote_ids, order_ids]))
+    security = codes[:len(quote_ids)].astype(np.int64)
+    timestamp = _micros(quotes, "timestamp")
+    condition_code, conditions = pd.factorize(_strings(quotes, "condition_code"))
+    bid_price, ask_price = _floats(quotes, "bid_price"), _floats(quotes, "ask_price")
+    values = {
+        "condition_code": condition_code,
+        "mid_price": (bid_price + ask_price) / np.float32(2),
+        "trade_price": _floats(quotes, "trade_price"),
+        "volume": _floats(quotes, "volume"),
+    }
+    # Quotes with a NULL security or timestamp never match a lookup in DuckDB either
+    valid = (security >= 0) & (timestamp != _NAT)
+    q = _SortedQuotes(security[valid], timestamp[valid], {k: v[valid] for k, v in values.items()})
+    q.conditions = conditions
+    o = {
+        "security_id": order_ids,
+        "security": codes[len(quote_ids):].astype(np.int64),
+        "mic_exchange": _strings(orders, "mic_exchange"),
+        "fulfill_time": _micros(orders, "fulfill_time"),
+        "order_start_time": _micros(orders, "order_start_time"),
+        "order_end_time": _micros(orders, "order_end_time"),
+        "execution_price": _floats(orders, "execution_price"),
+    }
+    return q, o
+
+
+def _excluded_conditions(q, o, condition_filter):
+    """
+    Mask of the quotes FILTERED_QUOTES_CTE drops: a condition code is excluded
+    for a security when every exchange its orders trade on drops that code.
+    """
+    exchanges = pd.DataFrame({"security": o["security"], "mic_exchange": o["mic_exchange"]}).drop_duplicates()
+    exchanges = exchanges[exchanges["security"] >= 0]
+    n_exchanges = exchanges.groupby("security").size()
+    drops = pd.DataFrame({
+        "mic_exchange": _strings(condition_filter, "mic_exchange"),
+        "condition_code": _strings(condition_filter, "condition_code_to_drop"),
+    }).dropna().drop_duplicates()
+    counts = exchanges.dropna().merge(drops, on="mic_exchange").groupby(["security", "condition_code"]).size()
+    excluded = counts[counts.to_numpy() == n_exchanges.loc[counts.index.get_level_values(0)].to_numpy()]
+    # (security, condition) lookup table; the extra last column is for NULL condition codes (-1)
+    table = np.zeros((int(max(q.security.max(initial=-1), o["security"].max(initial=-1))) + 1,
+                      len(q.conditions) + 1), dtype=bool)
+    condition = pd.Index(q.conditions).get_indexer(excluded.index.get_level_values(1))
+    present = condition >= 0
+    table[excluded.index.get_level_values(0).to_numpy()[present], condition[present]] = True
+    return table[q.security, q.values["condition_code"]]
+
+
+def _order_vwaps(q, o):
+    """
+    VWAP over [order_start_time, order_end_time] as in VWAP_CTE: the window's
+    notional and volume are the per-security cumulative sums at the last
+    quote <= end minus those at the last quote < start.
+    """
+    trade_price = q.values["trade_price"].astype(np.float64)
+    volume = q.values["volume"].astype(np.float64)
+    notional = trade_price * volume
+    sums = pd.DataFrame({
+        "notional": np.where(np.isnan(notional), 0.0, notional),
+        "volume": np.where(np.isnan(volume), 0.0, volume),
+    }).groupby(q.security, sort=False).cumsum()
+    cum_notional, cum_volume = (np.concatenate([[0.0], sums[c].to_numpy()]) for c in ("notional", "volume"))
+    end = q.last_at_or_before(o["security"], o["order_end_time"]) + 1
+    start = q.last_before(o["security"], o["order_start_time"]) + 1  # 0 (the leading zero) when none
+    window_volume = cum_volume[end] - cum_volume[start]
+    window_volume[window_volume == 0] = np.nan
+    vwap = (cum_notional[end] - cum_notional[start]) / window_volume
+    return np.where(end > 0, vwap, np.nan)
+
+
+def _joinable(o):
+    """Orders DuckDB can join to their VWAP window: no NULL security or order times."""
+    return (o["security"] >= 0) & (o["order_start_time"] != _NAT) & (o["order_end_time"] != _NAT)
+
+
+def compute_shortfall_metrics(quotes, orders):
+    """
+    process_data.compute_shortfall_metrics on pandas DataFrames or Arrow
+    tables with the setup_tables columns, computed in memory with NumPy.
+    Returns the same columns and rows, in orders order.
+    """
+    q, o = _prepare(quotes, orders)
+    execution_price = o["execution_price"]
+    pre_trade_price = q.take("mid_price", q.last_at_or_before(o["security"], o["fulfill_time"]))
+    pre_trade_price[o["fulfill_time"] == _NAT] = np.nan
+    vwap_price = _order_vwaps(q, o)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = pd.DataFrame({
+            "security_id": o["security_id"],
+            "execution_price": execution_price,
+            "pre_trade_price": pre_trade_price,
+            "vwap_price": vwap_price,
+            "arrival_shortfall_bps": (execution_price - pre_trade_price) / pre_trade_price * np.float32(100),
+            "vwap_shortfall_bps": (execution_price - vwap_price) / vwap_price * 100,
+        })
+    return metrics[_joinable(o)].reset_index(drop=True)
+
+
+def compute_metrics(quotes, orders, condition_filter, tolerance_seconds=CLOSEST_QUOTE_TOLERANCE):
+    """
+    process_data.compute_metrics with method="asof" on pandas DataFrames or
+    Arrow tables with the setup_tables columns, computed in memory with NumPy.
+    Returns the same columns and rows, in orders order.
+    """
+    q, o = _prepare(quotes, orders)
+    filtered = q.subset(~_excluded_conditions(q, o, condition_filter))
+
+    # Closest filtered quote at or before fulfill_time, at most tolerance whole seconds earlier
+    closest = filtered.last_at_or_before(o["security"], o["fulfill_time"])
+    quote_time = filtered.time_at(closest)
+    keep = (
+        _joinable(o) & (o["fulfill_time"] != _NAT) & (closest >= 0)
+        & (o["fulfill_time"] // _US - quote_time // _US <= tolerance_seconds)
+        & ~np.isnan(o["execution_price"])  # markouts join on execution_price
+    )
+    execution_price = o["execution_price"]
+    pre_trade_price = filtered.take("mid_price", closest)
+    markout_time = o["order_end_time"] + SETTLEMENT_HORIZON * _US
+    end_price = filtered.take("mid_price", filtered.last_at_or_before(o["security"], markout_time))
+    vwap_price = _order_vwaps(q, o)
+
+    hundred = np.float32(100)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = pd.DataFrame({
+            "security_id": o["security_id"],
+            "execution_price": execution_price,
+            "pre_trade_price": pre_trade_price,
+            "vwap_price": vwap_price,
+            "end_price": end_price,
+            "arrival_shortfall_bps": (execution_price - pre_trade_price) / pre_trade_price * hundred,
+            "vwap_shortfall_bps": (execution_price - vwap_price) / vwap_price * 100,
+            "settlement_shortfall_bps": (execution_price - end_price) / end_price * hundred,
+            "return_after_execution_bps": (end_price - execution_price) / execution_price * hundred,
+        })
+    return metrics[keep].reset_index(drop=True)
+
+
+def choose_engine(n_quotes, engine="auto"):
+    """Resolve engine="auto" to "numpy" or "duckdb" by the number of quotes."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unsupported TCA engine: {engine} (expected one of {', '.join(ENGINES)})")
+    if engine == "auto":
+        return "numpy" if n_quotes <= NUMPY_ENGINE_MAX_QUOTES else "duckdb"
+    return engine
+
+
+def _duckdb_conn(quotes, orders, condition_filter=None):
+    conn = duckdb.connect()
+    process_data.setup_tables(conn)
+    process_data.bulk_load(conn, quotes, orders, condition_filter)
+    return conn
+
+
+def metrics_from_frames(quotes, orders, condition_filter, engine="auto",
+                        tolerance_seconds=CLOSEST_QUOTE_TOLERANCE):
+    """
+    compute_metrics for in-memory quotes/orders/condition_filter, on the NumPy
+    engine or an in-memory DuckDB loaded with the frames (method="asof").
+    engine="auto" picks by the number of quotes.
+    """
+    if choose_engine(len(quotes), engine) == "numpy":
+        return compute_metrics(quotes, orders, condition_filter, tolerance_seconds)
+    conn = _duckdb_conn(quotes, orders, condition_filter)
+    try:
+        return process_data.compute_metrics(conn, method="asof", tolerance_seconds=tolerance_seconds)
+    finally:
+        conn.close()
+
+
+def shortfall_metrics_from_frames(quotes, orders, engine="auto"):
+    """compute_shortfall_metrics for in-memory quotes/orders; see metrics_from_frames."""
+    if choose_engine(len(quotes), engine) == "numpy":
+        return compute_shortfall_metrics(quotes, orders)
+    conn = _duckdb_conn(quotes, orders)
+    try:
+        return process_data.compute_shortfall_metrics(conn)
+    finally:
+        conn.close()
@@ -1,180 +1,41 @@
-import duckdb
-
-# Connect to DuckDB database
-duckdb_conn = duckdb.connect("quotes_data.duckdb")
-
-# 🔹 STEP 1: Ensure tables exist
-duckdb_conn.execute("""
-    CREATE TABLE IF NOT EXISTS quotes (
-        security_id TEXT, 
-        timestamp TIMESTAMP, 
-        condition_code TEXT, 
-        bid_price FLOAT, 
-        ask_price FLOAT
-    )
-""")
+import datetime
+import re
+import time
+import pyarrow as pa
+from . import duckdb_session
+from .instrumentation import duckdb_query
 
-duckdb_conn.execute("""
-    CREATE TABLE IF NOT EXISTS orders (
-        security_id TEXT, 
-        mic_exchange TEXT, 
-        fulfill_time TIMESTAMP
-    )
-""")
+DUCKDB_PATH = "tca_data.duckdb"
 
-duckdb_conn.execute("""
-    CREATE TABLE IF NOT EXISTS condition_filter (
-        mic_exchange TEXT, 
-        condition_code_to_drop TEXT
-    )
-""")
-
-# 🔹 STEP 2: Filter Quotes & Compute Mid Price
-query = """
-WITH filtered_quotes AS (
-    SELECT q.security_id, q.timestamp, q.bid_price, q.ask_price, q.condition_code
-    FROM quotes q
-    LEFT JOIN orders o ON q.security_id = o.security_id
-    LEFT JOIN condition_filter cf 
-        ON o.mic_exchange = cf.mic_exchange 
-        AND q.condition_code = cf.condition_code_to_drop
-    WHERE cf.condition_code_to_drop IS NULL  -- 🔥 Remove unwanted condition codes
-),
-closest_quotes AS (
-    SELECT 
-        f.security_id, 
-        f.timestamp, 
-        f.bid_price, 
-        f.ask_price, 
-        (f.bid_price + f.ask_price) / 2 AS mid_price,  -- ✅ Mid Price Calculation
-        o.fulfill_time,
-        ABS(strftime('%s', f.timestamp) - strftime('%s', o.fulfill_time)) AS time_diff
-    FROM filtered_quotes f
-    JOIN orders o 
-        ON f.security_id = o.security_id
-    WHERE f.timestamp <= o.fulfill_time -- 🔥 Only quotes BEFORE fulfill time
-    AND time_diff <= 3  -- ✅ Closest quote within 3 sec
-),
-ranked_quotes AS (
-    SELECT *, RANK() OVER (
-        PARTITION BY security_id, fulfill_time ORDER BY time_diff ASC
-    ) AS rank
-    FROM closest_quotes
-)
-SELECT security_id, fulfill_time, mid_price
-FROM ranked_quotes
-WHERE rank = 1;  -- ✅ Select closest quote
-"""
+# Rows per Arrow batch fed to DuckDB by bulk_load
+DEFAULT_LOAD_CHUNK_ROWS = 1_000_000
 
-# Run Query
-df = duckdb_conn.execute(query).fetchdf()
-print(df)
-
-# Close connection
-duckdb_conn.close()
-
-    def load_data(self, quotes_df, orders_df, condition_filter_df):
-        """Load data into DuckDB tables"""
-        self.conn.register("quotes_df", quotes_df)
-        self.conn.register("orders_df", orders_df)
-        self.conn.register("condition_filter_df", condition_filter_df)
-
-        self.conn.execute("INSERT INTO quotes SELECT * FROM quotes_df")
-        self.conn.execute("INSERT INTO orders SELECT * FROM orders_df")
-        self.conn.execute("INSERT INTO condition_filter SELECT * FROM condition_filter_df")
-
-    def compute_metrics(self):
-        """Compute shortfall metrics and returns"""
-        query = """
-        WITH filtered_quotes AS (
-            SELECT q.security_id, q.timestamp, q.trade_price, q.condition_code, q.volume,
-                   (q.bid_price + q.ask_price) / 2 AS mid_price
-            FROM quotes q
-            LEFT JOIN orders o ON q.security_id = o.security_id
-            LEFT JOIN condition_filter cf 
-                ON o.mic_exchange = cf.mic_exchange 
-                AND q.condition_code = cf.condition_code_to_drop
-            WHERE cf.condition_code_to_drop IS NULL
-        ),
-        closest_quotes AS (
-            SELECT f.security_id, f.timestamp, f.mid_price, f.trade_price, o.fulfill_time,
-                   ABS(strftime('%s', f.timestamp) - strftime('%s', o.fulfill_time)) AS time_diff
-            FROM filtered_quotes f
-            JOIN orders o ON f.security_id = o.security_id
-            WHERE f.timestamp <= o.fulfill_time AND time_diff <= 3
-        ),
-        ranked_quotes AS (
-            SELECT *, RANK() OVER (
-                PARTITION BY security_id, fulfill_time ORDER BY time_diff ASC
-            ) AS rank
-            FROM closest_quotes
-        ),
-        execution_prices AS (
-            SELECT o.security_id, o.execution_price, o.order_start_time, o.order_end_time, o.fulfill_time,
-                   q.mid_price AS pre_trade_price
-            FROM ranked_quotes q
-            JOIN orders o ON q.security_id = o.security_id
-            WHERE q.rank = 1
-        ),
-        post_trade_returns AS (
-            SELECT e.security_id, e.execution_price, e.order_end_time, 
-                   q.timestamp, q.mid_price AS post_trade_price,
-                   (q.mid_price - e.execution_price) / e.execution_price * 100 AS return_bps,
-                   ABS(strftime('%s', q.timestamp) - strftime('%s', e.order_end_time)) AS time_diff
-            FROM execution_prices e
-            JOIN quotes q ON e.security_id = q.security_id
-            WHERE q.timestamp >= e.order_end_time
-            ORDER BY e.security_id, time_diff
-        ),
-        vwap_calc AS (
-            SELECT security_id, 
-                   SUM(trade_price * volume) / SUM(volume) AS vwap_price
-            FROM quotes
-            WHERE timestamp BETWEEN (SELECT MIN(order_start_time) FROM orders)
-                              AND (SELECT MAX(order_end_time) FROM orders)
-            GROUP BY security_id
-        ),
-        final_metrics AS (
-            SELECT e.security_id,
-                   e.execution_price,
-                   e.pre_trade_price,
-                   v.vwap_price,
-                   p.post_trade_price AS end_price,
-                   (e.execution_price - e.pre_trade_price) / e.pre_trade_price * 100 AS arrival_shortfall_bps,
-                   (e.execution_price - v.vwap_price) / v.vwap_price * 100 AS vwap_shortfall_bps,
-                   (e.execution_price - p.post_trade_price) / p.post_trade_price * 100 AS settlement_shortfall_bps,
-                   p.return_bps AS return_after_execution_bps
-            FROM execution_prices e
-            JOIN vwap_calc v ON e.security_id = v.security_id
-            JOIN post_trade_returns p ON e.security_id = p.security_id
-            WHERE p.time_diff = 10  -- 10 seconds after order execution
-        )
-        SELECT * FROM final_metrics;
-        """
+# Physical sort order of quotes; keeps DuckDB zone maps selective for
+# security and time-range filters
+QUOTES_CLUSTER_KEY = ("security_id", "timestamp")
+
+# Maximum age in seconds of the quote matched to an order's fulfill_time
+CLOSEST_QUOTE_TOLERANCE = 3
 
-        return self.conn.execute(query).fetchdf()
-    
-    
-    
-# setup table
+# Post-trade markout horizons in seconds; compute_metrics reports the settlement one
+DEFAULT_MARKOUT_HORIZONS = (1, 5, 10, 60, 300)
+SETTLEMENT_HORIZON = 10
 
-## 🏗 **3️⃣ DuckDB Database Setup (src/db.py)**
-```python
-import duckdb
 
-def connect_db(db_path="tca_data.duckdb"):
-    """Establish DuckDB connection."""
-    return duckdb.connect(db_path)
+def connect_db(db_path=DUCKDB_PATH, profile="analytics", **settings):
+    """Establish DuckDB connection, tuned for the given duckdb_session profile."""
+    return duckdb_session.connect(db_path, profile=profile, **settings)
+
 
 def setup_tables(conn):
     """Create necessary tables in DuckDB."""
     conn.execute("""
         CREATE TABLE IF NOT EXISTS quotes (
-            security_id TEXT, 
-            timestamp TIMESTAMP, 
-            condition_code TEXT, 
-            bid_price FLOAT, 
-            ask_price FLOAT, 
+            security_id TEXT,
+            timestamp TIMESTAMP,
+            condition_code TEXT,
+            bid_price FLOAT,
+            ask_price FLOAT,
             trade_price FLOAT,
             volume FLOAT
         )
@@ -182,68 +43,368 @@ def setup_tables(conn):
 
     conn.execute("""
         CREATE TABLE IF NOT EXISTS orders (
-            security_id TEXT, 
-            mic_exchange TEXT, 
-            fulfill_time TIMESTAMP, 
+            security_id TEXT,
+            mic_exchange TEXT,
+            fulfill_time TIMESTAMP,
             order_start_time TIMESTAMP,
             order_end_time TIMESTAMP,
-            order_size FLOAT, 
+            order_size FLOAT,
             execution_price FLOAT
         )
     """)
 
     conn.execute("""
         CREATE TABLE IF NOT EXISTS condition_filter (
-            mic_exchange TEXT, 
+            mic_exchange TEXT,
             condition_code_to_drop TEXT
         )
     """)
-    
-import pandas as pd
+
+
+# Arrow types accepted for each DuckDB column type declared in setup_tables
+_ARROW_TYPE_CHECKS = {
+    "VARCHAR": lambda t: pa.types.is_string(t) or pa.types.is_large_string(t)
+    or (pa.types.is_dictionary(t) and (pa.types.is_string(t.value_type) or pa.types.is_large_string(t.value_type)))
+    or pa.types.is_null(t),
+    "TIMESTAMP": lambda t: pa.types.is_timestamp(t) or pa.types.is_null(t),
+    "FLOAT": lambda t: pa.types.is_floating(t) or pa.types.is_integer(t) or pa.types.is_null(t),
+}
+
+
+def _arrow_source(data, chunk_rows):
+    """Wrap data as something DuckDB scans without copying, plus its Arrow schema."""
+    if isinstance(data, pa.RecordBatchReader):
+        return data, data.schema
+    if isinstance(data, pa.Table):
+        batches = data.to_batches(max_chunksize=chunk_rows)
+        return pa.RecordBatchReader.from_batches(data.schema, batches), data.schema
+    # pandas fallback: DuckDB scans the DataFrame directly; only the schema is inferred.
+    return data, pa.Schema.from_pandas(data, preserve_index=False)
+
+
+def validate_schema(conn, table_name, schema):
+    """
+    Check an Arrow schema against a table created by setup_tables.
+    Every table column must be present with a compatible type; extra columns are ignored.
+    Returns the table's column names.
+    """
+    columns = conn.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+        [table_name],
+    ).fetchall()
+    fields = {field.name.lower(): field.type for field in schema}
+    errors = []
+    for name, data_type in columns:
+        arrow_type = fields.get(name.lower())
+        check = _ARROW_TYPE_CHECKS.get(data_type)
+        if arrow_type is None:
+            errors.append(f"missing column {name}")
+        elif check and not check(arrow_type):
+            errors.append(f"column {name} has type {arrow_type}, expected {data_type}")
+    if errors:
+        raise ValueError(f"Invalid schema for {table_name}: " + "; ".join(errors))
+    return [name for name, _ in columns]
+
+
+def bulk_load(conn, quotes, orders=None, condition_filter=None, chunk_rows=DEFAULT_LOAD_CHUNK_ROWS, on_insert=None):
+    """
+    Bulk-load Arrow tables, RecordBatchReaders or pandas DataFrames into the setup_tables tables.
+
+    Inputs are validated against the table schemas and scanned by DuckDB in
+    place, chunk_rows rows at a time, all inside one transaction. Quotes are
+    written sorted by QUOTES_CLUSTER_KEY so later security/time-range queries
+    can skip row groups via zone maps. on_insert(conn, table_name), if given,
+    runs inside the transaction after each table is loaded.
+    Returns rows, seconds and rows/sec per table.
+    """
+    stats = {}
+    sources = {"quotes": quotes, "orders": orders, "condition_filter": condition_filter}
+    conn.begin()
+    try:
+        for table_name, data in sources.items():
+            if data is None:
+                continue
+            source, schema = _arrow_source(data, chunk_rows)
+            columns = ", ".join(validate_schema(conn, table_name, schema))
+            order_by = f"ORDER BY {', '.join(QUOTES_CLUSTER_KEY)}" if table_name == "quotes" else ""
+            start = time.perf_counter()
+            conn.register("bulk_source", source)
+            try:
+                rows = duckdb_query(
+                    conn, f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM bulk_source {order_by}",
+                    label=f"bulk_load:{table_name}", fetch="fetchone",
+                )[0]
+            finally:
+                conn.unregister("bulk_source")
+            if on_insert is not None:
+                on_insert(conn, table_name)
+            seconds = time.perf_counter() - start
+            stats[table_name] = {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0.0}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
 
 def load_data(conn, quotes_df, orders_df, condition_filter_df):
     """Load data into DuckDB tables."""
-    conn.register("quotes_df", quotes_df)
-    conn.register("orders_df", orders_df)
-    conn.register("condition_filter_df", condition_filter_df)
-
-    conn.execute("INSERT INTO quotes SELECT * FROM quotes_df")
-    conn.execute("INSERT INTO orders SELECT * FROM orders_df")
-    conn.execute("INSERT INTO condition_filter SELECT * FROM condition_filter_df") 
-    
-def filter_quotes(conn):
-    """Filter out quotes based on invalid condition codes."""
-    query = """
+    return bulk_load(conn, quotes_df, orders_df, condition_filter_df)
+
+
+def _zone_map_bounds(stats, parse):
+    match = re.search(r"Min: (.*?), Max: (.*?)(?:, Has|\])", stats or "")
+    if not match or match.group(1) in ("", "NULL"):
+        return None
+    return parse(match.group(1)), parse(match.group(2))
+
+
+def row_groups_touched(conn, security_id, start_time, end_time, table_name="quotes"):
+    """
+    Count the row groups of table_name whose zone maps (min/max of security_id
+    and timestamp) overlap the filter, versus the total. This is the number of
+    row groups a security + time-range query has to scan.
+    """
+    bounds = {}
+    rows = conn.execute(
+        "SELECT row_group_id, column_name, stats FROM pragma_storage_info(?) "
+        "WHERE column_name IN ('security_id', 'timestamp') AND column_path = '[0]'",
+        [table_name],
+    ).fetchall()
+    for row_group_id, column_name, stats in rows:
+        parse = str if column_name == "security_id" else datetime.datetime.fromisoformat
+        segment = _zone_map_bounds(stats, parse)
+        if segment is None:
+            continue
+        low, high = bounds.get((row_group_id, column_name), segment)
+        bounds[(row_group_id, column_name)] = (min(low, segment[0]), max(high, segment[1]))
+
+    row_groups = {row_group_id for row_group_id, _ in bounds}
+    touched = 0
+    for row_group_id in row_groups:
+        sec_low, sec_high = bounds.get((row_group_id, "security_id"), (security_id, security_id))
+        ts_low, ts_high = bounds.get((row_group_id, "timestamp"), (start_time, end_time))
+        if sec_low <= security_id <= sec_high and ts_low <= end_time and ts_high >= start_time:
+            touched += 1
+    return {"touched": touched, "total": len(row_groups)}
+
+
+# 🔹 Quotes with unwanted condition codes removed, plus mid price.
+# A (security_id, condition_code) is excluded when every exchange the security's
+# orders trade on drops that code. The exclusion set is built once from orders and
+# condition_filter and anti-joined to quotes, so the work scales with the number
+# of quotes rather than quotes x orders; it is materialized once per query and
+# shared by every metric that reads it.
+FILTERED_QUOTES_CTE = """
+    order_exchanges AS (
+        SELECT DISTINCT security_id, mic_exchange FROM orders
+    ),
+    exchange_counts AS (
+        SELECT security_id, COUNT(*) AS n_exchanges FROM order_exchanges GROUP BY security_id
+    ),
+    excluded_conditions AS (
+        SELECT oe.security_id, cf.condition_code_to_drop AS condition_code
+        FROM order_exchanges oe
+        JOIN (SELECT DISTINCT mic_exchange, condition_code_to_drop FROM condition_filter) cf
+            ON oe.mic_exchange = cf.mic_exchange
+        JOIN exchange_counts ec ON oe.security_id = ec.security_id
+        GROUP BY oe.security_id, cf.condition_code_to_drop, ec.n_exchanges
+        HAVING COUNT(*) = ec.n_exchanges
+    ),
+    filtered_quotes AS MATERIALIZED (
         SELECT q.security_id, q.timestamp, q.trade_price, q.condition_code, q.volume,
                (q.bid_price + q.ask_price) / 2 AS mid_price
         FROM quotes q
-        LEFT JOIN orders o ON q.security_id = o.security_id
-        LEFT JOIN condition_filter cf 
-            ON o.mic_exchange = cf.mic_exchange 
-            AND q.condition_code = cf.condition_code_to_drop
-        WHERE cf.condition_code_to_drop IS NULL
+        ANTI JOIN excluded_conditions x  -- 🔥 Remove unwanted condition codes
+            ON q.security_id = x.security_id AND q.condition_code = x.condition_code
+    )
+"""
+
+# 🔹 Closest-quote engines. Each defines closest_quotes(security_id, fulfill_time,
+# timestamp, mid_price): the last filtered quote at or before each fulfill_time,
+# at most $tolerance whole seconds earlier.
+CLOSEST_QUOTES_CTES = {
+    # Pairs every quote with every order of the security, then ranks the pairs.
+    "rank": """
+        candidate_quotes AS (
+            SELECT f.security_id, f.timestamp, f.mid_price, o.fulfill_time,
+                   date_diff('second', f.timestamp, o.fulfill_time) AS time_diff
+            FROM filtered_quotes f
+            JOIN orders o ON f.security_id = o.security_id
+            WHERE f.timestamp <= o.fulfill_time  -- 🔥 Only quotes BEFORE fulfill time
+            AND time_diff <= $tolerance  -- ✅ Closest quote within tolerance
+        ),
+        ranked_quotes AS (
+            -- time_diff counts whole seconds, so break ties on the latest quote as ASOF does
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY security_id, fulfill_time ORDER BY time_diff ASC, timestamp DESC
+            ) AS rank
+            FROM candidate_quotes
+        ),
+        closest_quotes AS (
+            SELECT security_id, fulfill_time, timestamp, mid_price
+            FROM ranked_quotes
+            WHERE rank = 1
+        )
+    """,
+    # One sorted merge per security: each fulfill_time picks the latest quote at or before it.
+    "asof": """
+        fulfill_times AS (
+            SELECT DISTINCT security_id, fulfill_time FROM orders
+        ),
+        closest_quotes AS (
+            SELECT o.security_id, o.fulfill_time, f.timestamp, f.mid_price
+            FROM fulfill_times o
+            ASOF JOIN filtered_quotes f
+                ON o.security_id = f.security_id AND o.fulfill_time >= f.timestamp
+            WHERE date_diff('second', f.timestamp, o.fulfill_time) <= $tolerance
+        )
+    """,
+}
+
+
+# 🔹 Per-order VWAP over [order_start_time, order_end_time]. Cumulative notional and
+# volume are built once per security over time-sorted quotes; each order's window
+# is then the difference of two ASOF lookups, so the cost is
+# O(quotes + orders * log quotes) instead of a quotes x orders range join.
+# vwap_price is NULL when no volume traded in the window.
+VWAP_CTE = """
+    vwap_prefix AS (
+        SELECT security_id, timestamp,
+               SUM(SUM(trade_price::DOUBLE * volume)) OVER w AS cum_notional,
+               SUM(SUM(volume::DOUBLE)) OVER w AS cum_volume
+        FROM quotes
+        GROUP BY security_id, timestamp
+        WINDOW w AS (PARTITION BY security_id ORDER BY timestamp)
+    ),
+    order_windows AS (
+        SELECT DISTINCT security_id, order_start_time, order_end_time FROM orders
+    ),
+    vwap_end AS (
+        SELECT o.security_id, o.order_start_time, o.order_end_time, p.cum_notional, p.cum_volume
+        FROM order_windows o
+        ASOF LEFT JOIN vwap_prefix p
+            ON o.security_id = p.security_id AND o.order_end_time >= p.timestamp
+    ),
+    vwap_calc AS (
+        SELECT e.security_id, e.order_start_time, e.order_end_time,
+               (e.cum_notional - COALESCE(s.cum_notional, 0))
+               / NULLIF(e.cum_volume - COALESCE(s.cum_volume, 0), 0) AS vwap_price
+        FROM vwap_end e
+        ASOF LEFT JOIN vwap_prefix s  -- cumulative totals strictly before the window
+            ON e.security_id = s.security_id AND e.order_start_time > s.timestamp
+    )
+"""
+
+
+# 🔹 Post-trade markouts. For every order in markout_orders and every horizon h,
+# the prevailing filtered mid at order_end_time + h is found with one ASOF lookup,
+# so the cost grows with orders x horizons rather than with the quote tape.
+# post_trade_price is NULL when no quote precedes the markout time.
+MARKOUT_CTE = """
+    markout_horizons AS (
+        SELECT UNNEST($horizons::INTEGER[]) AS horizon_seconds
+    ),
+    markout_points AS (
+        SELECT DISTINCT o.security_id, o.fulfill_time, o.order_end_time, o.execution_price, h.horizon_seconds,
+               o.order_end_time + to_seconds(h.horizon_seconds) AS markout_time
+        FROM markout_orders o
+        CROSS JOIN markout_horizons h
+    ),
+    markouts AS (
+        SELECT m.security_id, m.fulfill_time, m.order_end_time, m.execution_price, m.horizon_seconds,
+               q.timestamp AS post_trade_time,
+               q.mid_price AS post_trade_price,
+               (q.mid_price - m.execution_price) / m.execution_price * 100 AS return_bps
+        FROM markout_points m
+        ASOF LEFT JOIN filtered_quotes q
+            ON m.security_id = q.security_id AND m.markout_time >= q.timestamp
+    )
+"""
+
+
+def _horizons(horizons):
+    horizons = [int(h) for h in horizons]
+    if not horizons or min(horizons) < 0:
+        raise ValueError("Markout horizons must be a non-empty list of non-negative seconds")
+    return horizons
+
+
+def _closest_quotes_cte(method):
+    try:
+        return CLOSEST_QUOTES_CTES[method]
+    except KeyError:
+        raise ValueError(f"Unsupported closest-quote method: {method}") from None
+
+
+def filter_quotes(conn):
+    """Filter out quotes based on invalid condition codes."""
+    return duckdb_query(conn, f"WITH {FILTERED_QUOTES_CTE} SELECT * FROM filtered_quotes", label="filter_quotes")
+
+
+def closest_quotes(conn, method="rank", tolerance_seconds=CLOSEST_QUOTE_TOLERANCE):
     """
-    return conn.execute(query).fetchdf()
+    Find the mid price of the closest quote at or before each order's fulfill time.
+    method selects the matching engine: "rank" (pairwise ranking) or "asof" (ASOF JOIN).
+    """
+    query = f"""
+        WITH {FILTERED_QUOTES_CTE}, {_closest_quotes_cte(method)}
+        SELECT security_id, fulfill_time, mid_price
+        FROM closest_quotes
+        ORDER BY security_id, fulfill_time
+    """
+    return duckdb_query(conn, query, {"tolerance": tolerance_seconds}, label=f"closest_quotes:{method}")
+
+
+def order_vwaps(conn):
+    """Compute the VWAP of each distinct order window."""
+    query = f"""
+        WITH {VWAP_CTE}
+        SELECT security_id, order_start_time, order_end_time, vwap_price
+        FROM vwap_calc
+        ORDER BY security_id, order_start_time, order_end_time
+    """
+    return duckdb_query(conn, query, label="order_vwaps")
+
+
+def compute_markouts(conn, horizons=DEFAULT_MARKOUT_HORIZONS, wide=False):
+    """
+    Compute post-trade mid and return for each order at each horizon (seconds after order_end_time).
+    Returns one row per order and horizon, or one row per order with
+    post_trade_price_<h>s / return_<h>s_bps columns when wide=True.
+    """
+    horizons = _horizons(horizons)
+    keys = "security_id, fulfill_time, order_end_time, execution_price"
+    if wide:
+        columns = ",\n".join(
+            f"MAX(post_trade_price) FILTER (WHERE horizon_seconds = {h}) AS post_trade_price_{h}s,\n"
+            f"MAX(return_bps) FILTER (WHERE horizon_seconds = {h}) AS return_{h}s_bps"
+            for h in horizons
+        )
+        select = f"SELECT {keys}, {columns} FROM markouts GROUP BY {keys} ORDER BY {keys}"
+    else:
+        select = f"SELECT * FROM markouts ORDER BY {keys}, horizon_seconds"
+    query = f"""
+        WITH {FILTERED_QUOTES_CTE},
+        markout_orders AS (SELECT * FROM orders),
+        {MARKOUT_CTE}
+        {select}
+    """
+    return duckdb_query(conn, query, {"horizons": horizons}, label="compute_markouts")
+
 
 def compute_shortfall_metrics(conn):
     """Compute shortfall metrics such as arrival, VWAP, and settlement shortfall."""
-    query = """
+    query = f"""
         WITH execution_prices AS (
             SELECT o.security_id, o.execution_price, o.order_start_time, o.order_end_time, o.fulfill_time,
-                   (SELECT mid_price FROM quotes 
-                    WHERE security_id = o.security_id 
-                    AND timestamp <= o.fulfill_time 
+                   (SELECT (bid_price + ask_price) / 2 FROM quotes
+                    WHERE security_id = o.security_id
+                    AND timestamp <= o.fulfill_time
                     ORDER BY timestamp DESC LIMIT 1) AS pre_trade_price
             FROM orders o
         ),
-        vwap_calc AS (
-            SELECT security_id, 
-                   SUM(trade_price * volume) / SUM(volume) AS vwap_price
-            FROM quotes
-            WHERE timestamp BETWEEN (SELECT MIN(order_start_time) FROM orders)
-                              AND (SELECT MAX(order_end_time) FROM orders)
-            GROUP BY security_id
-        )
+        {VWAP_CTE}
         SELECT e.security_id,
                e.execution_price,
                e.pre_trade_price,
@@ -251,6 +412,76 @@ def compute_shortfall_metrics(conn):
                (e.execution_price - e.pre_trade_price) / e.pre_trade_price * 100 AS arrival_shortfall_bps,
                (e.execution_price - v.vwap_price) / v.vwap_price * 100 AS vwap_shortfall_bps
         FROM execution_prices e
-        JOIN vwap_calc v ON e.security_id = v.security_id;
+        JOIN vwap_calc v
+            ON e.security_id = v.security_id
+            AND e.order_start_time = v.order_start_time
+            AND e.order_end_time = v.order_end_time;
+    """
+    return duckdb_query(conn, query, label="compute_shortfall_metrics")
+
+
+# Order columns identifying a row of the metrics when order_keys=True
+ORDER_KEY_COLUMNS = ("security_id", "fulfill_time", "order_start_time", "order_end_time", "execution_price")
+
+
+def _metrics_query(method, scope="", order_keys=False, select="SELECT * FROM final_metrics"):
     """
-    return conn.execute(query).fetchdf()   
\ No newline at end of file
+    SQL of compute_metrics. scope is prepended to the WITH list (e.g. CTEs named
+    quotes/orders that shadow the tables), order_keys adds the order time
+    columns to final_metrics, and select replaces the final SELECT.
+    """
+    keys = "e.fulfill_time, e.order_start_time, e.order_end_time," if order_keys else ""
+    return f"""
+    WITH {scope}{FILTERED_QUOTES_CTE}, {_closest_quotes_cte(method)},
+    execution_prices AS (
+        SELECT o.security_id, o.execution_price, o.order_start_time, o.order_end_time, o.fulfill_time,
+               c.mid_price AS pre_trade_price
+        FROM orders o
+        JOIN closest_quotes c ON c.security_id = o.security_id AND c.fulfill_time = o.fulfill_time
+    ),
+    markout_orders AS (SELECT * FROM execution_prices),
+    {MARKOUT_CTE},
+    {VWAP_CTE},
+    final_metrics AS (
+        SELECT e.security_id, {keys}
+               e.execution_price,
+               e.pre_trade_price,
+               v.vwap_price,
+               p.post_trade_price AS end_price,
+               (e.execution_price - e.pre_trade_price) / e.pre_trade_price * 100 AS arrival_shortfall_bps,
+               (e.execution_price - v.vwap_price) / v.vwap_price * 100 AS vwap_shortfall_bps,
+               (e.execution_price - p.post_trade_price) / p.post_trade_price * 100 AS settlement_shortfall_bps,
+               p.return_bps AS return_after_execution_bps
+        FROM execution_prices e
+        JOIN vwap_calc v
+            ON e.security_id = v.security_id
+            AND e.order_start_time = v.order_start_time
+            AND e.order_end_time = v.order_end_time
+        JOIN markouts p
+            ON e.security_id = p.security_id
+            AND e.fulfill_time = p.fulfill_time
+            AND e.order_end_time = p.order_end_time
+            AND e.execution_price = p.execution_price
+    )
+    {select}
+    """
+
+
+def compute_metrics(conn, method="rank", tolerance_seconds=CLOSEST_QUOTE_TOLERANCE):
+    """
+    Compute shortfall metrics and returns.
+    Settlement uses the prevailing mid SETTLEMENT_HORIZON seconds after order_end_time.
+    """
+    params = {"tolerance": tolerance_seconds, "horizons": [SETTLEMENT_HORIZON]}
+    return duckdb_query(conn, _metrics_query(method), params, label=f"compute_metrics:{method}")
+
+
+if __name__ == "__main__":
+    duckdb_conn = connect_db()
+    setup_tables(duckdb_conn)
+
+    # Closest quote per order fulfill time
+    df = closest_quotes(duckdb_conn)
+    print(df)
+
+    duckdb_conn.close()
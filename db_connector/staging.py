@@ -0,0 +1,213 @@
+import datetime
+import json
+import os
+import shutil
+import time
+import duckdb
+import pyarrow as pa
+from .load_data import DEFAULT_CHUNK_SIZE, _connect_snowflake, _iter_record_batches, chunk_securities
+
+# Local Parquet staging area for Snowflake extracts
+STAGE_ROOT = "quotes_stage"
+
+# Columns of the staged quotes exposed to process_data as the quotes view
+QUOTE_COLUMNS = ("security_id", "timestamp", "condition_code", "bid_price", "ask_price", "trade_price", "volume")
+
+
+def _days(start_date, end_date):
+    return [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def _date_ranges(days):
+    """Group sorted dates into contiguous (start, end) ranges."""
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + datetime.timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+
+def snowflake_fetcher(source="quotes", connect=_connect_snowflake, batch_rows=100_000):
+    """
+    Build a fetch(securities, start_date, end_date) function that pulls rows of
+    source for the given securities and inclusive date range from Snowflake as
+    Arrow record batches.
+    """
+    def fetch(securities, start_date, end_date):
+        placeholders = ", ".join(["%s"] * len(securities))
+        sql = (
+            f"SELECT * FROM {source} WHERE security_id IN ({placeholders}) "
+            f"AND timestamp >= %s AND timestamp < %s"
+        )
+        params = (*securities, start_date, end_date + datetime.timedelta(days=1))
+        sf_conn = connect()
+        try:
+            cur = sf_conn.cursor()
+            cur.execute(sql, params)
+            yield from _iter_record_batches(cur, batch_rows)
+            cur.close()
+        finally:
+            sf_conn.close()
+
+    return fetch
+
+
+class ParquetStage:
+    """
+    Parquet staging cache for Snowflake extracts.
+
+    Extracts are written under <root>/<query>/trade_date=.../security_id=.../ as
+    Hive-partitioned Parquet, sorted by timestamp. manifest.json records which
+    (query, security_id, trade_date) partitions have been fetched, including
+    empty ones, so reruns only send the missing date ranges to Snowflake.
+    """
+
+    def __init__(self, root=STAGE_ROOT):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def partition_path(self, query, security_id, trade_date):
+        return os.path.join(self.root, query, f"trade_date={trade_date.isoformat()}", f"security_id={security_id}")
+
+    def is_covered(self, query, security_id, trade_date):
+        return trade_date.isoformat() in self.manifest.get(query, {}).get(security_id, {})
+
+    def missing_ranges(self, securities, start_date, end_date, query="quotes"):
+        """
+        Return {(start, end): [securities]} for the date ranges not yet staged,
+        grouping securities that miss exactly the same ranges into one fetch.
+        """
+        missing = {}
+        for security_id in dict.fromkeys(securities):
+            days = [d for d in _days(start_date, end_date) if not self.is_covered(query, security_id, d)]
+            for date_range in _date_ranges(days):
+                missing.setdefault(date_range, []).append(security_id)
+        return missing
+
+    def _write_partitions(self, batches, query, securities, start_date, end_date):
+        """
+        Stream record batches into the Hive-partitioned layout, sorted by timestamp
+        within each partition. Returns row counts per (security_id, trade_date).
+        """
+        batches = iter(batches)
+        first = next(batches, None)
+        if first is None:
+            return {}
+
+        def all_batches():
+            yield first
+            yield from batches
+
+        reader = pa.RecordBatchReader.from_batches(first.schema, all_batches())
+        # Snowflake upper-cases unquoted names; stage everything in lower case.
+        columns = ", ".join(f'"{name}" AS {name.lower()}' for name in first.schema.names)
+        conn = duckdb.connect()
+        try:
+            conn.register("extract", reader)
+            conn.execute(f"""
+                COPY (
+                    SELECT {columns}, CAST(timestamp AS DATE) AS trade_date
+                    FROM extract
+                    ORDER BY security_id, timestamp
+                )
+                TO '{os.path.join(self.root, query)}'
+                (FORMAT PARQUET, PARTITION_BY (trade_date, security_id),
+                 FILENAME_PATTERN 'part_{{uuid}}', OVERWRITE_OR_IGNORE true)
+            """)
+            # Row counts come from the Parquet footers of the partitions just written.
+            counts = conn.execute(
+                f"SELECT security_id, trade_date, COUNT(*) FROM ({self.relation_sql(start_date, end_date, securities, query)}) "
+                f"GROUP BY ALL"
+            ).fetchall()
+        finally:
+            conn.close()
+        return {(security_id, trade_date): rows for security_id, trade_date, rows in counts}
+
+    def ensure(self, securities, start_date, end_date, fetch=None, query="quotes", chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Make sure every (security, trade date) in the inclusive range is staged.
+        Only missing ranges are fetched, one fetch per range and chunk of securities.
+        Returns the fetched ranges, rows written and elapsed seconds.
+        """
+        fetch = fetch or snowflake_fetcher(source=query)
+        start = time.perf_counter()
+        fetched = []
+        total_rows = 0
+        for (range_start, range_end), range_securities in sorted(self.missing_ranges(
+                securities, start_date, end_date, query).items()):
+            for chunk in chunk_securities(range_securities, chunk_size):
+                # Clear leftovers of an interrupted run before rewriting these partitions.
+                for security_id in chunk:
+                    for day in _days(range_start, range_end):
+                        shutil.rmtree(self.partition_path(query, security_id, day), ignore_errors=True)
+
+                counts = self._write_partitions(fetch(chunk, range_start, range_end), query, chunk, range_start, range_end)
+                fetched_at = datetime.datetime.now(datetime.UTC).isoformat()
+                covered = self.manifest.setdefault(query, {})
+                for security_id in chunk:
+                    for day in _days(range_start, range_end):
+                        covered.setdefault(security_id, {})[day.isoformat()] = {
+                            "rows": counts.get((security_id, day), 0),
+                            "fetched_at": fetched_at,
+                        }
+                self._write_manifest()
+                total_rows += sum(counts.values())
+                fetched.append((range_start, range_end, list(chunk)))
+
+        return {"fetched": fetched, "rows": total_rows, "seconds": time.perf_counter() - start}
+
+    def has_rows(self, securities, start_date, end_date, query="quotes"):
+        covered = self.manifest.get(query, {})
+        return any(
+            covered.get(security_id, {}).get(day.isoformat(), {}).get("rows", 0)
+            for security_id in securities
+            for day in _days(start_date, end_date)
+        )
+
+    def relation_sql(self, start_date, end_date, securities=None, query="quotes"):
+        """
+        SQL reading the staged partitions in place with read_parquet. The
+        trade_date and security_id predicates prune whole partitions.
+        Partition values are typed explicitly: autocast would turn numeric-looking
+        security IDs into BIGINT.
+        """
+        glob = os.path.join(self.root, query, "*", "*", "*.parquet")
+        sql = (
+            f"SELECT * FROM read_parquet('{glob}', hive_partitioning = true, union_by_name = true, "
+            f"hive_types = {{'trade_date': DATE, 'security_id': VARCHAR}}) "
+            f"WHERE trade_date BETWEEN DATE '{start_date.isoformat()}' AND DATE '{end_date.isoformat()}'"
+        )
+        if securities:
+            ids = ", ".join("'" + s.replace("'", "''") + "'" for s in securities)
+            sql += f" AND security_id IN ({ids})"
+        return sql
+
+    def create_view(self, conn, start_date, end_date, securities=None, query="quotes", view_name="quotes"):
+        """
+        Expose the staged partitions to conn as a view (default: quotes) with
+        the process_data quotes columns, so the TCA queries run on them in place.
+        """
+        if not self.has_rows(securities or list(self.manifest.get(query, {})), start_date, end_date, query):
+            raise ValueError(f"No staged {query} rows between {start_date} and {end_date}; call ensure() first")
+        columns = ", ".join(QUOTE_COLUMNS)
+        conn.execute(
+            f"CREATE OR REPLACE VIEW {view_name} AS "
+            f"SELECT {columns} FROM ({self.relation_sql(start_date, end_date, securities, query)})"
+        )
@@ -0,0 +1,132 @@
+import time
+import pyarrow as pa
+from sqlalchemy import event, text
+from .db_engine import get_engine
+
+# Rows per yielded batch, and the driver fetch size used to fill it
+DEFAULT_BATCH_ROWS = 50_000
+
+_OUTPUTS = ("arrow", "pandas")
+
+
+def _set_fetch_size(conn, cursor, statement, parameters, context, executemany):
+    """Size driver round trips to the stream's batch (Oracle arraysize/prefetchrows)."""
+    rows = context.execution_options.get("fetch_rows") if context is not None else None
+    if not rows:
+        return
+    if hasattr(cursor, "arraysize"):
+        cursor.arraysize = rows
+    if hasattr(cursor, "prefetchrows"):
+        # One more than arraysize lets the first fetch finish in the execute round trip
+        cursor.prefetchrows = rows + 1
+
+
+class QueryStream:
+    """
+    Iterable over a query result in batches of at most batch_rows rows, as Arrow
+    record batches or pandas DataFrames. Only one batch is materialised at a
+    time. stats holds the running rows, bytes, batches and throughput.
+    """
+
+    def __init__(self, engine, sql, params=None, batch_rows=DEFAULT_BATCH_ROWS, output="arrow", schema=None):
+        if output not in _OUTPUTS:
+            raise ValueError(f"Unsupported output: {output} (expected one of {', '.join(_OUTPUTS)})")
+        if batch_rows < 1:
+            raise ValueError("batch_rows must be positive")
+        self.engine = engine
+        self.sql = sql
+        self.params = params or {}
+        self.batch_rows = batch_rows
+        self.output = output
+        self.schema = schema
+        self.stats = {"rows": 0, "bytes": 0, "batches": 0, "seconds": 0.0, "first_batch_seconds": None,
+                      "rows_per_sec": 0.0, "bytes_per_sec": 0.0}
+        self._batches = None
+
+    def __iter__(self):
+        if self._batches is not None:
+            raise RuntimeError("A QueryStream can only be iterated once")
+        self._batches = self._record_batches()
+        start = time.perf_counter()
+        for batch in self._batches:
+            seconds = time.perf_counter() - start
+            stats = self.stats
+            stats["rows"] += batch.num_rows
+            stats["bytes"] += batch.nbytes
+            stats["batches"] += 1
+            stats["seconds"] = seconds
+            if stats["first_batch_seconds"] is None:
+                stats["first_batch_seconds"] = seconds
+            stats["rows_per_sec"] = stats["rows"] / seconds if seconds else 0.0
+            stats["bytes_per_sec"] = stats["bytes"] / seconds if seconds else 0.0
+            yield batch.to_pandas() if self.output == "pandas" else batch
+
+    def close(self):
+        """Stop the query early and release its connection."""
+        if self._batches is not None:
+            self._batches.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record_batches(self):
+        if self.engine.dialect.name == "snowflake":
+            return self._snowflake_batches()
+        return self._cursor_batches()
+
+    def _snowflake_batches(self):
+        # Snowflake serves results as Arrow chunks; read them through the raw DBAPI cursor.
+        from .load_data import _iter_record_batches
+
+        compiled = text(self.sql).bindparams(**self.params).compile(dialect=self.engine.dialect)
+        raw = self.engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            try:
+                cur.execute(compiled.string, compiled.params)
+                for batch in _iter_record_batches(cur, self.batch_rows):
+                    yield batch.cast(self.schema) if self.schema is not None else batch
+            finally:
+                cur.close()
+        finally:
+            raw.close()
+
+    def _cursor_batches(self):
+        if not event.contains(self.engine, "before_cursor_execute", _set_fetch_size):
+            event.listen(self.engine, "before_cursor_execute", _set_fetch_size)
+        with self.engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=self.batch_rows, fetch_rows=self.batch_rows,
+            ).execute(text(self.sql), self.params)
+            names = list(result.keys())
+            schema = self.schema
+            for rows in result.partitions(self.batch_rows):
+                columns = list(zip(*rows))
+                if schema is None:
+                    batch = pa.RecordBatch.from_arrays([pa.array(c) for c in columns], names=names)
+                    # Later batches reuse the first batch's types; pass schema when a
+                    # column can be all NULL in the first batch.
+                    schema = batch.schema
+                else:
+                    batch = pa.RecordBatch.from_arrays(
+                        [pa.array(c, type=field.type) for c, field in zip(columns, schema)], schema=schema
+                    )
+                yield batch
+
+
+def stream_query(db_type, user, sql, params=None, batch_rows=DEFAULT_BATCH_ROWS, output="arrow", schema=None,
+                 **engine_kwargs):
+    """
+    Stream the result of sql (with :name bind params) from the cached engine
+    for db_type/user in bounded-memory batches of at most batch_rows rows.
+
+    Uses a server-side cursor (stream_results) with the driver fetch size set
+    to batch_rows; Snowflake results are read as native Arrow batches.
+    Returns a QueryStream yielding Arrow record batches, or DataFrames when
+    output="pandas"; its stats hold rows, bytes and throughput so far.
+    """
+    engine = get_engine(db_type, user, **engine_kwargs)
+    return QueryStream(engine, sql, params, batch_rows=batch_rows, output=output, schema=schema)
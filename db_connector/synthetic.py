@@ -0,0 +1,107 @@
+import datetime
+import numpy as np
+import pyarrow as pa
+
+# Regular trading session used for synthetic timestamps
+SESSION_OPEN = datetime.time(9, 30)
+SESSION_SECONDS = 6 * 3600 + 30 * 60
+
+EXCHANGES = ("XNAS", "XNYS", "ARCX", "BATS")
+# "@" is a regular quote; the rest are the usual odd-lot/out-of-sequence style flags
+CONDITION_CODES = ("@", "F", "T", "I", "W", "Z")
+CONDITION_WEIGHTS = (0.86, 0.04, 0.03, 0.03, 0.02, 0.02)
+
+
+def _security_ids(n_securities):
+    return pa.array([f"SEC{i:05d}" for i in range(n_securities)])
+
+
+def _activity_weights(n_securities, skew):
+    """Zipf-like activity: security i gets weight 1 / (i + 1) ** skew."""
+    weights = 1.0 / np.arange(1, n_securities + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_tca_data(n_quotes=10_000, n_securities=100, n_orders=None, seed=0,
+                      trade_date=datetime.date(2024, 1, 2), skew=1.1):
+    """
+    Generate seeded, realistic quotes/orders/condition_filter data as Arrow tables
+    matching the setup_tables schemas.
+
+    Quote activity is skewed across securities (Zipf with exponent skew), prices
+    follow a per-security random walk with a spread, and timestamps arrive in
+    time order over one trading session. Orders (default one per 1000 quotes)
+    pick securities with the same skew and execute near the prevailing mid.
+    Returns (quotes, orders, condition_filter).
+    """
+    if n_quotes < 1 or n_securities < 1:
+        raise ValueError("n_quotes and n_securities must be positive")
+    rng = np.random.default_rng(seed)
+    n_orders = n_orders if n_orders is not None else max(10, n_quotes // 1000)
+    ids = _security_ids(n_securities)
+    weights = _activity_weights(n_securities, skew)
+    session_start = np.datetime64(datetime.datetime.combine(trade_date, SESSION_OPEN), "us")
+
+    # Quotes, in arrival order
+    offsets_us = np.sort(rng.integers(0, SESSION_SECONDS * 1_000_000, n_quotes))
+    timestamps = session_start + offsets_us.astype("timedelta64[us]")
+    security = rng.choice(n_securities, size=n_quotes, p=weights).astype(np.int32)
+
+    # Per-security random walk: cumulative returns within each security, in time order
+    base_price = rng.lognormal(mean=4.0, sigma=0.8, size=n_securities)
+    steps = rng.normal(0.0, 2e-4, n_quotes)
+    by_security = np.argsort(security, kind="stable")
+    cumulative = np.cumsum(steps[by_security])
+    sorted_security = security[by_security]
+    group_start = np.searchsorted(sorted_security, sorted_security, side="left")
+    cumulative -= np.concatenate(([0.0], cumulative))[group_start]
+    walk = np.empty(n_quotes)
+    walk[by_security] = cumulative
+    mid = base_price[security] * np.exp(walk)
+
+    half_spread = mid * rng.uniform(1e-4, 1e-3, n_quotes)
+    trade_price = mid + rng.uniform(-1.0, 1.0, n_quotes) * half_spread
+    volume = np.maximum(1, np.round(rng.lognormal(4.0, 1.0, n_quotes) / 100)) * 100
+    condition = rng.choice(len(CONDITION_CODES), size=n_quotes, p=CONDITION_WEIGHTS).astype(np.int32)
+
+    quotes = pa.table({
+        "security_id": pa.DictionaryArray.from_arrays(pa.array(security), ids),
+        "timestamp": pa.array(timestamps, pa.timestamp("us")),
+        "condition_code": pa.DictionaryArray.from_arrays(pa.array(condition), pa.array(CONDITION_CODES)),
+        "bid_price": pa.array((mid - half_spread).astype(np.float32)),
+        "ask_price": pa.array((mid + half_spread).astype(np.float32)),
+        "trade_price": pa.array(trade_price.astype(np.float32)),
+        "volume": pa.array(volume.astype(np.float32)),
+    })
+
+    # Orders: executed near the prevailing mid of their security at fulfill time
+    order_security = rng.choice(n_securities, size=n_orders, p=weights).astype(np.int32)
+    duration_us = rng.integers(1, 1800, n_orders) * 1_000_000
+    start_us = rng.integers(0, SESSION_SECONDS * 1_000_000 - duration_us)
+    end_us = start_us + duration_us
+    key = sorted_security.astype(np.int64) * (SESSION_SECONDS * 1_000_000) + offsets_us[by_security]
+    order_key = order_security.astype(np.int64) * (SESSION_SECONDS * 1_000_000) + end_us
+    prior = np.searchsorted(key, order_key, side="right") - 1
+    prior_or_first = np.maximum(prior, 0)
+    found = (prior >= 0) & (sorted_security[prior_or_first] == order_security)
+    prevailing = np.where(found, mid[by_security][prior_or_first], base_price[order_security])
+    execution_price = prevailing * (1 + rng.normal(0.0, 5e-4, n_orders))
+
+    orders = pa.table({
+        "security_id": ids.take(pa.array(order_security)),
+        "mic_exchange": pa.array(np.array(EXCHANGES)[rng.integers(0, len(EXCHANGES), n_orders)]),
+        "fulfill_time": pa.array(session_start + end_us.astype("timedelta64[us]"), pa.timestamp("us")),
+        "order_start_time": pa.array(session_start + start_us.astype("timedelta64[us]"), pa.timestamp("us")),
+        "order_end_time": pa.array(session_start + end_us.astype("timedelta64[us]"), pa.timestamp("us")),
+        "order_size": pa.array((rng.integers(1, 100, n_orders) * 100).astype(np.float32)),
+        "execution_price": pa.array(execution_price.astype(np.float32)),
+    })
+
+    # Each exchange drops a couple of the irregular condition codes
+    drops = [(exchange, code) for i, exchange in enumerate(EXCHANGES)
+             for code in CONDITION_CODES[1 + i % 3:3 + i % 3]]
+    condition_filter = pa.table({
+        "mic_exchange": pa.array([exchange for exchange, _ in drops]),
+        "condition_code_to_drop": pa.array([code for _, code in drops]),
+    })
+    return quotes, orders, condition_filter
@@ -0,0 +1,136 @@
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import duckdb
+import pandas as pd
+from . import duckdb_session, process_data
+from .staging import ParquetStage
+
+# Failed shards are rerun on their own up to this many more times
+DEFAULT_SHARD_RETRIES = 2
+
+
+def _process_pool(max_workers):
+    # Forking a process that already runs DuckDB threads can deadlock; spawn clean workers.
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def plan_shards(database, n_buckets, trade_dates=None):
+    """
+    List the non-empty (trade_date, bucket) shards of the orders in database.
+    Securities are assigned to buckets by hash(security_id) % n_buckets, so a
+    security's orders for a day always land in the same shard.
+    Returns {(trade_date, bucket): n_orders}.
+    """
+    conn = duckdb.connect(database, read_only=True)
+    try:
+        rows = conn.execute(
+            "SELECT CAST(fulfill_time AS DATE), hash(security_id) % $n_buckets, COUNT(*) "
+            "FROM orders GROUP BY ALL ORDER BY ALL",
+            {"n_buckets": n_buckets},
+        ).fetchall()
+    finally:
+        conn.close()
+    wanted = set(trade_dates) if trade_dates is not None else None
+    return {(day, bucket): n for day, bucket, n in rows if wanted is None or day in wanted}
+
+
+def _run_shard(spec):
+    """
+    Compute the TCA metrics of one shard in a private in-memory DuckDB with the
+    source database attached read-only. quotes/orders/condition_filter are views
+    restricted to the shard's trade date and security bucket, so
+    process_data.compute_metrics runs on them unchanged.
+    """
+    start = time.perf_counter()
+    # Workers share the machine: split the analytics memory budget, and give each
+    # process its own spill directory so temp files never collide.
+    spill_dir = os.path.join(duckdb_session.tuning_config()["temp_directory"], f"shard-{os.getpid()}")
+    conn = duckdb_session.connect(profile="analytics", spill_dir=spill_dir, threads=spec["threads"],
+                                  memory_fraction=spec["memory_fraction"])
+    try:
+        conn.execute("SET enable_progress_bar = false")
+        conn.execute(f"ATTACH '{spec['database']}' AS src (READ_ONLY)")
+        bucket = f"hash(security_id) % {spec['n_buckets']} = {spec['bucket']}"
+        day = f"DATE '{spec['trade_date'].isoformat()}'"
+        next_day = f"DATE '{(spec['trade_date'] + datetime.timedelta(days=1)).isoformat()}'"
+        if spec.get("stage_root"):
+            # The stage's trade_date partitions already limit the scan to the day.
+            stage = ParquetStage(spec["stage_root"])
+            quotes = f"({stage.relation_sql(spec['trade_date'], spec['trade_date'])}) WHERE {bucket}"
+        else:
+            quotes = f"src.quotes WHERE timestamp >= {day} AND timestamp < {next_day} AND {bucket}"
+        conn.execute(f"CREATE VIEW quotes AS SELECT * FROM {quotes}")
+        conn.execute(f"CREATE VIEW orders AS SELECT * FROM src.orders WHERE CAST(fulfill_time AS DATE) = {day} AND {bucket}")
+        conn.execute("CREATE VIEW condition_filter AS SELECT * FROM src.condition_filter")
+        metrics = process_data.compute_metrics(conn, method=spec["method"], tolerance_seconds=spec["tolerance"])
+    finally:
+        conn.close()
+    metrics.insert(0, "trade_date", spec["trade_date"])
+    return metrics, time.perf_counter() - start
+
+
+def run_sharded_tca(database, trade_dates=None, n_buckets=None, max_workers=None, threads_per_shard=None,
+                    method="asof", tolerance_seconds=process_data.CLOSEST_QUOTE_TOLERANCE,
+                    retries=DEFAULT_SHARD_RETRIES, stage_root=None, executor_factory=_process_pool):
+    """
+    Run compute_metrics over many trade dates, sharded by trade date and
+    security bucket, with one shard per worker process at a time.
+
+    Each shard gives the same rows as compute_metrics on that trade date's data
+    alone. Shards that raise are retried on their own, up to retries more
+    times, in a fresh pool (a crashed worker breaks the whole pool). Quotes
+    come from database, or from the ParquetStage at stage_root when given.
+
+    Returns the merged metrics (with a trade_date column), per-shard stats and
+    the errors of shards that still failed after all retries.
+    """
+    start = time.perf_counter()
+    max_workers = max_workers or os.cpu_count() or 1
+    n_buckets = n_buckets or max_workers
+    threads_per_shard = threads_per_shard or max(1, (os.cpu_count() or 1) // max_workers)
+    memory_fraction = duckdb_session.TUNING_PROFILES["analytics"]["memory_fraction"] / max_workers
+    database = os.path.abspath(database)
+    shards = plan_shards(database, n_buckets, trade_dates)
+
+    results = {}
+    stats = {shard: {"orders": n, "attempts": 0} for shard, n in shards.items()}
+    errors = {}
+    pending = sorted(shards)
+    for _ in range(retries + 1):
+        if not pending:
+            break
+        failed = []
+        with executor_factory(max_workers) as pool:
+            futures = {
+                pool.submit(_run_shard, {
+                    "database": database, "trade_date": day, "bucket": bucket, "n_buckets": n_buckets,
+                    "threads": threads_per_shard, "memory_fraction": memory_fraction,
+                    "method": method, "tolerance": tolerance_seconds,
+                    "stage_root": stage_root and os.path.abspath(stage_root),
+                }): (day, bucket)
+                for day, bucket in pending
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                stats[shard]["attempts"] += 1
+                try:
+                    results[shard], stats[shard]["seconds"] = future.result()
+                except Exception as e:
+                    errors[shard] = repr(e)
+                    failed.append(shard)
+                else:
+                    errors.pop(shard, None)
+                    stats[shard]["rows"] = len(results[shard])
+        pending = sorted(failed)
+
+    frames = [results[shard] for shard in sorted(results)]
+    metrics = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return {
+        "metrics": metrics,
+        "shards": stats,
+        "failed": errors,
+        "wall_seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,199 @@
+import contextlib
+import time
+import pyarrow as pa
+from sqlalchemy import text
+from .db_engine import get_engine
+
+# Rows per write batch by dialect. Snowflake batches are staged Parquet files
+# loaded with COPY INTO, so they can be much larger than array-bound inserts.
+DEFAULT_WRITE_BATCH_ROWS = {
+    "snowflake": 500_000,
+    "oracle": 10_000,
+}
+GENERIC_WRITE_BATCH_ROWS = 10_000
+
+WRITE_MODES = ("append", "merge")
+
+
+def _chunks(df, batch_rows):
+    for offset in range(0, len(df), batch_rows):
+        yield df.iloc[offset:offset + batch_rows]
+
+
+def _rows(df):
+    """DataFrame rows as tuples of plain Python values (datetime, float, ...), with NaN/NaT as None."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return list(zip(*(column.to_pylist() for column in table.columns)))
+
+
+def _timed(batches, rows, fn):
+    start = time.perf_counter()
+    fn()
+    batches.append({"rows": rows, "seconds": time.perf_counter() - start})
+
+
+def _merge_sql(table_name, source, columns, key):
+    """MERGE INTO table_name from source (a table or subquery aliased s), matching on key."""
+    on = " AND ".join(f"t.{k} = s.{k}" for k in key)
+    updates = ", ".join(f"{c} = s.{c}" for c in columns if c not in key)
+    inserts = ", ".join(f"s.{c}" for c in columns)
+    matched = f" WHEN MATCHED THEN UPDATE SET {updates}" if updates else ""
+    return (
+        f"MERGE INTO {table_name} t USING {source} s ON ({on}){matched} "
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({inserts})"
+    )
+
+
+def _write_snowflake(engine, df, table_name, mode, key, batch_rows):
+    """
+    Stage each batch as Parquet and COPY it in with write_pandas. Merges load
+    into a temporary table first and apply one MERGE at the end.
+    """
+    from snowflake.connector.pandas_tools import write_pandas
+
+    batches = []
+    columns = list(df.columns)
+    target = f"{table_name}_merge_stage" if mode == "merge" else table_name
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        try:
+            if mode == "merge":
+                cur.execute(f"CREATE TEMPORARY TABLE {target} AS SELECT {', '.join(columns)} FROM {table_name} LIMIT 0")
+            for chunk in _chunks(df, batch_rows):
+                _timed(batches, len(chunk), lambda: write_pandas(
+                    raw.driver_connection, chunk, target, quote_identifiers=False, auto_create_table=False,
+                ))
+            if mode == "merge":
+                _timed(batches, len(df), lambda: cur.execute(_merge_sql(table_name, target, columns, key)))
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            if mode == "merge":
+                # Best effort only: a failing DROP must not mask the write's own error.
+                with contextlib.suppress(Exception):
+                    cur.execute(f"DROP TABLE IF EXISTS {target}")
+            raise
+        else:
+            if mode == "merge":
+                # The connection goes back to the pool, so don't leave the stage behind.
+                cur.execute(f"DROP TABLE IF EXISTS {target}")
+        finally:
+            cur.close()
+    finally:
+        raw.close()
+    return batches
+
+
+def _write_oracle(engine, df, table_name, mode, key, batch_rows):
+    """Array-bind each batch with one executemany round trip, committing once at the end."""
+    columns = list(df.columns)
+    binds = ", ".join(f":{i + 1}" for i in range(len(columns)))
+    if mode == "merge":
+        source = f"(SELECT {', '.join(f':{i + 1} AS {c}' for i, c in enumerate(columns))} FROM dual)"
+        sql = _merge_sql(table_name, source, columns, key)
+    else:
+        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({binds})"
+
+    batches = []
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        try:
+            for chunk in _chunks(df, batch_rows):
+                rows = _rows(chunk)
+                _timed(batches, len(rows), lambda: cur.executemany(sql, rows))
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            cur.close()
+    finally:
+        raw.close()
+    return batches
+
+
+def _write_generic(engine, df, table_name, mode, key, batch_rows):
+    """
+    executemany through SQLAlchemy in one transaction. Merges delete the
+    batch's keys before inserting it, which works on any dialect.
+    """
+    columns = list(df.columns)
+    names = {c: f"p{i}" for i, c in enumerate(columns)}
+    insert = text(
+        f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(':' + names[c] for c in columns)})"
+    )
+    if mode == "merge":
+        delete = text(f"DELETE FROM {table_name} WHERE " + " AND ".join(f"{k} = :{names[k]}" for k in key))
+
+    batches = []
+    with engine.begin() as conn:
+        for chunk in _chunks(df, batch_rows):
+            params = [dict(zip(names.values(), row)) for row in _rows(chunk)]
+
+            def write():
+                if mode == "merge":
+                    conn.execute(delete, [{names[k]: p[names[k]] for k in key} for p in params])
+                conn.execute(insert, params)
+
+            _timed(batches, len(params), write)
+    return batches
+
+
+_WRITERS = {
+    "snowflake": _write_snowflake,
+    "oracle": _write_oracle,
+}
+
+
+def write_frame_to_engine(engine, df, table_name, mode="append", key=None, batch_rows=None):
+    """
+    Bulk-write a DataFrame into an existing table through engine, picking the
+    fastest path for its dialect: staged Parquet + COPY INTO (write_pandas) on
+    Snowflake, array-bound executemany on Oracle, and SQLAlchemy executemany
+    elsewhere. mode="merge" upserts rows on the key columns, which must be
+    unique and not NULL in df: dialects disagree on duplicate keys, and NULL
+    keys never match an existing row.
+    Returns rows, seconds, rows/sec and the rows and seconds of every batch.
+    """
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unsupported write mode: {mode} (expected one of {', '.join(WRITE_MODES)})")
+    key = [key] if isinstance(key, str) else list(key or ())
+    if mode == "merge" and not key:
+        raise ValueError("merge mode needs the key columns to match rows on")
+    missing = [k for k in key if k not in df.columns]
+    if missing:
+        raise ValueError(f"Key columns not in the frame: {', '.join(missing)}")
+    if mode == "merge":
+        null_keys = [k for k in key if df[k].isna().any()]
+        if null_keys:
+            raise ValueError(f"Key columns contain NULLs, which merge cannot match: {', '.join(null_keys)}")
+        if df.duplicated(key).any():
+            raise ValueError(f"Duplicate keys in the frame; merge needs unique {', '.join(key)} values")
+
+    dialect = engine.dialect.name
+    batch_rows = batch_rows or DEFAULT_WRITE_BATCH_ROWS.get(dialect, GENERIC_WRITE_BATCH_ROWS)
+    if batch_rows < 1:
+        raise ValueError("batch_rows must be positive")
+    writer = _WRITERS.get(dialect, _write_generic)
+
+    start = time.perf_counter()
+    batches = writer(engine, df, table_name, mode, key, batch_rows) if len(df) else []
+    seconds = time.perf_counter() - start
+    return {
+        "rows": len(df),
+        "seconds": seconds,
+        "rows_per_sec": len(df) / seconds if seconds else 0.0,
+        "method": writer.__name__.removeprefix("_write_"),
+        "batches": batches,
+    }
+
+
+def write_frame(db_type, user, df, table_name, mode="append", key=None, batch_rows=None, **engine_kwargs):
+    """
+    Bulk-write a DataFrame (e.g. the compute_metrics result) into table_name
+    using the cached engine for db_type/user. See write_frame_to_engine.
+    """
+    engine = get_engine(db_type, user, **engine_kwargs)
+    return write_frame_to_engine(engine, df, table_name, mode=mode, key=key, batch_rows=batch_rows)
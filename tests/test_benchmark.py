@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+import duckdb
+import pyarrow.compute as pc
+from typer.testing import CliRunner
+from db_connector import process_data
+from db_connector.benchmark import app, compare_to_baseline, run_benchmark
+from db_connector.synthetic import generate_tca_data
+
+
+class TestGenerateTcaData(unittest.TestCase):
+    def test_seeded_output_is_deterministic(self):
+        first = generate_tca_data(5000, 20, seed=7)
+        second = generate_tca_data(5000, 20, seed=7)
+        other = generate_tca_data(5000, 20, seed=8)
+        for a, b in zip(first, second):
+            self.assertTrue(a.equals(b))
+        self.assertFalse(first[0].equals(other[0]))
+
+    def test_sizes_and_skew(self):
+        quotes, orders, _ = generate_tca_data(20_000, 50, n_orders=40)
+        self.assertEqual(quotes.num_rows, 20_000)
+        self.assertEqual(orders.num_rows, 40)
+        counts = pc.value_counts(quotes["security_id"].combine_chunks().dictionary_decode())
+        top = max(counts.field("counts").to_pylist())
+        # Zipf activity: the busiest security carries far more than an even share
+        self.assertGreater(top, 5 * 20_000 / 50)
+
+    def test_matches_setup_tables_schemas(self):
+        quotes, orders, condition_filter = generate_tca_data(50_000, 5, n_orders=50)
+        conn = duckdb.connect()
+        process_data.setup_tables(conn)
+        process_data.bulk_load(conn, quotes, orders, condition_filter)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 50_000)
+        metrics = process_data.compute_metrics(conn, method="asof")
+        self.assertGreater(len(metrics), 0)
+
+    def test_rejects_empty_sizes(self):
+        with self.assertRaises(ValueError):
+            generate_tca_data(0, 10)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_records_every_stage(self):
+        run = run_benchmark([2000])
+        stages = run["results"]["2000"]
+        self.assertIn("bulk_load", stages)
+        self.assertIn("compute_metrics", stages)
+        for result in stages.values():
+            self.assertGreater(result["wall_seconds"], 0)
+            self.assertGreater(result["peak_rss_mb"], 0)
+            self.assertGreater(result["rows_per_sec"], 0)
+
+    def test_compare_flags_slower_stages(self):
+        baseline = {"results": {"1000": {
+            "bulk_load": {"wall_seconds": 1.0, "peak_rss_mb": 100.0},
+            "filter_quotes": {"wall_seconds": 0.01, "peak_rss_mb": 100.0},
+        }}}
+        run = {"results": {"1000": {
+            "bulk_load": {"wall_seconds": 1.5, "peak_rss_mb": 110.0},
+            # Too fast in the baseline to compare on wall time
+            "filter_quotes": {"wall_seconds": 0.05, "peak_rss_mb": 100.0},
+        }}}
+        regressions = compare_to_baseline(run, baseline, tolerance=0.25)
+        self.assertEqual([(r["stage"], r["metric"]) for r in regressions], [("bulk_load", "wall_seconds")])
+        self.assertEqual(compare_to_baseline(run, baseline, tolerance=0.6), [])
+
+    def test_cli_writes_json_and_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "run.json")
+            baseline = os.path.join(tmpdir, "baseline.json")
+            with open(baseline, "w") as f:
+                json.dump({"results": {"1000": {"bulk_load": {"wall_seconds": 1e-4, "peak_rss_mb": 1e-3}}}}, f)
+            result = CliRunner().invoke(app, ["-s", "1000", "-o", output, "-b", baseline])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("REGRESSION bulk_load", result.output)
+            with open(output) as f:
+                self.assertIn("1000", json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    unittest.main()
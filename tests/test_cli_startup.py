@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs one CLI invocation in a fresh interpreter and reports, on stderr, the
+# time from interpreter start-up to command completion and which heavy
+# packages ended up imported.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from db_connector.cli import app
+try:
+    app(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+heavy = {"sqlalchemy", "keyring", "rich", "oracledb", "snowflake"}
+loaded = sorted({name.split(".")[0] for name in sys.modules} & heavy)
+print(json.dumps({"elapsed": time.perf_counter() - start, "modules": loaded}), file=sys.stderr)
+"""
+
+# Cold-start budgets in seconds; generous enough for a loaded CI runner, tight
+# enough to catch SQLAlchemy creeping back into the fast commands.
+STARTUP_BUDGETS = {
+    "--help": 1.0,
+    "check-credentials": 1.0,
+    "get-engine": 3.0,
+}
+
+
+def run_cli(*args):
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "PYTHON_KEYRING_BACKEND": "keyring.backends.null.Keyring",
+        "ORACLE_SCOTT_PASSWORD": "tiger",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+class TestCLIStartup(unittest.TestCase):
+    def test_help_does_not_import_heavy_modules(self):
+        stats = run_cli("--help")
+        self.assertNotIn("sqlalchemy", stats["modules"])
+        self.assertNotIn("keyring", stats["modules"])
+        self.assertLess(stats["elapsed"], STARTUP_BUDGETS["--help"])
+
+    def test_check_credentials_does_not_import_sqlalchemy(self):
+        stats = run_cli("check-credentials", "-t", "oracle", "-u", "scott")
+        self.assertIn("keyring", stats["modules"])
+        self.assertNotIn("sqlalchemy", stats["modules"])
+        self.assertLess(stats["elapsed"], STARTUP_BUDGETS["check-credentials"])
+
+    def test_get_engine_imports_sqlalchemy(self):
+        stats = run_cli("get-engine", "-t", "oracle", "-u", "scott", "--host", "localhost", "--sid", "ORCL")
+        self.assertIn("sqlalchemy", stats["modules"])
+        self.assertLess(stats["elapsed"], STARTUP_BUDGETS["get-engine"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import keyring
+from db_connector import credentials
+from db_connector.file_keyring import FileKeyring
+
+
+class TestCredentialCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.backend = FileKeyring(os.path.join(self.tmpdir.name, "keyring.json"))
+        self.previous = keyring.get_keyring()
+        keyring.set_keyring(self.backend)
+        credentials.invalidate_credentials()
+
+    def tearDown(self):
+        credentials.invalidate_credentials()
+        keyring.set_keyring(self.previous)
+        self.tmpdir.cleanup()
+
+    def test_file_keyring_roundtrip(self):
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        self.assertEqual(FileKeyring(self.backend.path).get_password("db_connector", "oracle:scott"), "tiger")
+        self.backend.delete_password("db_connector", "oracle:scott")
+        self.assertIsNone(self.backend.get_password("db_connector", "oracle:scott"))
+
+    def test_get_credentials_is_cached(self):
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        with mock.patch.object(self.backend, 'get_password', wraps=self.backend.get_password) as get_password:
+            self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "tiger"})
+            self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "tiger"})
+        self.assertEqual(get_password.call_count, 1)
+
+    def test_cache_expires_after_ttl(self):
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        with mock.patch.object(credentials.time, 'monotonic', return_value=1000.0):
+            credentials.get_credentials("oracle", "scott")
+        self.backend.set_password("db_connector", "oracle:scott", "lion")
+        with mock.patch.object(credentials.time, 'monotonic', return_value=1000.0 + credentials.CREDENTIAL_TTL + 1):
+            self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "lion"})
+
+    def test_invalidate_credentials(self):
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        credentials.get_credentials("oracle", "scott")
+        self.backend.set_password("db_connector", "oracle:scott", "lion")
+        self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "tiger"})
+        credentials.invalidate_credentials("oracle", "scott")
+        self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "lion"})
+
+    def test_misses_are_not_cached(self):
+        self.assertIsNone(credentials.get_credentials("oracle", "scott"))
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        self.assertEqual(credentials.get_credentials("oracle", "scott"), {"password": "tiger"})
+
+    def test_prefetch_credentials(self):
+        self.backend.set_password("db_connector", "oracle:scott", "tiger")
+        with mock.patch.dict(os.environ, {"SNOWFLAKE_LOADER_PASSWORD": "from-env"}):
+            result = credentials.prefetch_credentials([("oracle", "scott"), ("snowflake", "loader"), ("oracle", "nobody")])
+        self.assertEqual(result, {
+            ("oracle", "scott"): {"password": "tiger"},
+            ("snowflake", "loader"): {"password": "from-env"},
+            ("oracle", "nobody"): None,
+        })
+        with mock.patch.object(self.backend, 'get_password') as get_password:
+            self.assertEqual(credentials.get_credentials("snowflake", "loader"), {"password": "from-env"})
+        get_password.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+import oracledb
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from db_connector import db_engine, instrumentation
+from db_connector.db_engine import BaseEngineBuilder, OracleEngineBuilder, SnowflakeEngineBuilder
+
+
+class SQLiteEngineBuilder(BaseEngineBuilder):
+    """File-backed SQLite stand-in so the registry can be exercised without a warehouse."""
+
+    def build_url(self, user: str, password: str, **kwargs):
+        return URL.create("sqlite", database=kwargs['path'])
+
+
+class TestEngineRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "test.db")
+        builders = {**db_engine.engine_builders, 'sqlite': SQLiteEngineBuilder(pool_size=3)}
+        self.patches = [
+            mock.patch.dict(db_engine.engine_builders, builders),
+            mock.patch.object(db_engine, 'get_credentials', return_value={'password': 'secret'}),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        db_engine.dispose_engines()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def test_get_engine_is_cached(self):
+        first = db_engine.get_engine('sqlite', 'alice', path=self.path)
+        second = db_engine.get_engine('SQLite', 'alice', path=self.path)
+        self.assertIs(first, second)
+        self.assertEqual(db_engine.get_credentials.call_count, 1)
+        self.assertEqual(first.pool.size(), 3)
+
+    def test_different_params_get_different_engines(self):
+        first = db_engine.get_engine('sqlite', 'alice', path=self.path)
+        other = db_engine.get_engine('sqlite', 'alice', path=self.path + "2")
+        self.assertIsNot(first, other)
+
+    def test_dispose_engines_clears_cache(self):
+        first = db_engine.get_engine('sqlite', 'alice', path=self.path)
+        db_engine.dispose_engines()
+        self.assertIsNot(first, db_engine.get_engine('sqlite', 'alice', path=self.path))
+
+    def test_dispose_engine(self):
+        first = db_engine.get_engine('sqlite', 'alice', path=self.path)
+        db_engine.dispose_engine('sqlite', 'alice', path=self.path)
+        self.assertIsNot(first, db_engine.get_engine('sqlite', 'alice', path=self.path))
+
+    def test_create_connection_string_does_not_build_engine(self):
+        with mock.patch.object(db_engine, 'create_engine') as create_engine:
+            url = db_engine.create_connection_string('oracle', 'scott', host='db', port=1521, sid='ORCL')
+        create_engine.assert_not_called()
+        self.assertEqual(url.render_as_string(hide_password=False), "oracle+oracledb://scott:secret@db:1521/ORCL")
+
+
+class TestPoolSettings(unittest.TestCase):
+    def test_builder_defaults_and_overrides(self):
+        self.assertEqual(SnowflakeEngineBuilder().pool_settings['pool_recycle'], 1800)
+        builder = OracleEngineBuilder(pool_size=20, pool_pre_ping=False)
+        self.assertEqual(builder.pool_settings['pool_size'], 20)
+        self.assertFalse(builder.pool_settings['pool_pre_ping'])
+        self.assertEqual(builder.pool_settings['max_overflow'], 10)
+
+    def test_unknown_pool_setting(self):
+        with self.assertRaises(ValueError):
+            OracleEngineBuilder(pool_sise=20)
+
+    def test_snowflake_url_escapes_password(self):
+        url = SnowflakeEngineBuilder().build_url('bob', 'p@ss/word', account='acme')
+        self.assertEqual(url.password, 'p@ss/word')
+        self.assertEqual(url.host, 'acme')
+
+
+
+class StubCursor:
+    """
+    Cursor of a stub oracledb connection that counts round trips the way the
+    driver makes them: execute fetches prefetchrows rows, and each later
+    fetch that empties the buffer fetches arraysize more.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.description = None
+        self.rowcount = -1
+        self.outputtypehandler = None
+        self.inputtypehandler = None
+
+    def execute(self, statement, parameters=None, **kwargs):
+        self.conn.round_trips += 1
+        if "stub_rows" in statement:
+            self._rows = [(i,) for i in range(self.conn.n_rows)]
+            self.description = [("N", oracledb.DB_TYPE_NUMBER, None, None, 10, 0, True)]
+        else:
+            # Dialect start-up probes (current schema, decimal separator, ...)
+            self._rows = [("1.1" if "1.1" in statement else "SCOTT",)]
+            self.description = [("V", oracledb.DB_TYPE_VARCHAR, 100, 100, None, None, True)]
+        self._pos = 0
+        self._buffered = min(self.prefetchrows, len(self._rows))
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        if not self._buffered:
+            self.conn.round_trips += 1
+            self._buffered = min(self.arraysize, len(self._rows) - self._pos)
+        self._buffered -= 1
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchmany(self, size=None):
+        rows = []
+        for _ in range(size or self.arraysize):
+            row = self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows) + 1)
+
+    def var(self, *args, **kwargs):
+        return None
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class StubConnection:
+    version = "19.3.0.0.0"
+    thin = True
+    max_identifier_length = 128
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.round_trips = 0
+        self.autocommit = False
+        self.outputtypehandler = None
+        self.inputtypehandler = None
+        self.stmtcachesize = 20
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def ping(self):
+        pass
+
+
+class TestOracleThinMode(unittest.TestCase):
+    def test_urls(self):
+        builder = OracleEngineBuilder()
+        url = builder.build_url('scott', 'tiger', host='db', service_name='ORCLPDB1')
+        self.assertEqual(url.render_as_string(hide_password=False),
+                         "oracle+oracledb://scott:tiger@db:1521?service_name=ORCLPDB1")
+        url = builder.build_url('scott', 'tiger', dsn='db:1521/ORCLPDB1', host='ignored')
+        self.assertEqual(url.drivername, "oracle+oracledb")
+        self.assertEqual(url.query['dsn'], 'db:1521/ORCLPDB1')
+        with mock.patch.dict(os.environ, {}, clear=True), self.assertRaises(ValueError):
+            builder.build_url('scott', 'tiger', host='db')
+
+    def test_session_pool_params(self):
+        builder = OracleEngineBuilder(pool_size=4, max_overflow=6, pool_timeout=5, pool_pre_ping=False)
+        params = builder.session_pool_params('scott', 'tiger', host='db', sid='ORCL')
+        self.assertEqual((params['min'], params['max'], params['wait_timeout']), (4, 10, 5000))
+        self.assertEqual((params['host'], params['port'], params['sid']), ('db', 1521, 'ORCL'))
+        self.assertEqual(params['ping_interval'], -1)
+        self.assertNotIn('server_type', params)
+        drcp = builder.session_pool_params('scott', 'tiger', dsn='db/ORCLPDB1', drcp=True, cclass='TCA')
+        self.assertEqual((drcp['dsn'], drcp['server_type'], drcp['cclass']), ('db/ORCLPDB1', 'pooled', 'TCA'))
+
+    def test_engine_uses_driver_pool_lazily(self):
+        pool = mock.Mock()
+        pool.acquire.return_value = StubConnection(0)
+        builder = OracleEngineBuilder()
+        with mock.patch.object(oracledb, 'create_pool', return_value=pool) as create_pool:
+            engine = builder.build_engine('scott', 'tiger', host='db', service_name='ORCLPDB1', drcp=True)
+            create_pool.assert_not_called()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1 FROM dual"))
+            create_pool.assert_called_once()
+            kwargs = create_pool.call_args.kwargs
+            self.assertEqual(kwargs['service_name'], 'ORCLPDB1')
+            self.assertEqual(kwargs['purity'], oracledb.PURITY_SELF)
+            self.assertEqual(kwargs['getmode'], oracledb.POOL_GETMODE_TIMEDWAIT)
+            builder.dispose(engine)
+        pool.close.assert_called_once_with(force=True)
+
+    def test_connects_are_instrumented(self):
+        pool = mock.Mock()
+        pool.acquire.return_value = StubConnection(0)
+        sink = instrumentation.add_sink(mock.Mock())
+        self.addCleanup(instrumentation.clear_sinks)
+        engine = OracleEngineBuilder().build_engine('scott', 'tiger', host='db', service_name='ORCLPDB1')
+        with mock.patch.object(oracledb, 'create_pool', return_value=pool):
+            for _ in range(2):
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1 FROM dual"))
+        engine.dispose()
+        connects = [call.args[0] for call in sink.write.call_args_list if call.args[0]["kind"] == "connect"]
+        # NullPool takes a session from the driver pool on every checkout
+        self.assertEqual(len(connects), 2)
+        self.assertEqual(connects[0]["source"], "sqlalchemy:oracle")
+        self.assertGreaterEqual(connects[0]["seconds"], 0)
+
+    def round_trips(self, n_rows, **builder_settings):
+        conn = StubConnection(n_rows)
+        pool = mock.Mock()
+        pool.acquire.return_value = conn
+        engine = OracleEngineBuilder(**builder_settings).build_engine('scott', 'tiger', host='db', sid='ORCL')
+        with mock.patch.object(oracledb, 'create_pool', return_value=pool):
+            with engine.connect() as sa_conn:
+                start = conn.round_trips
+                rows = sa_conn.execute(text("SELECT n FROM stub_rows")).fetchall()
+        engine.dispose()
+        self.assertEqual(len(rows), n_rows)
+        return conn.round_trips - start
+
+    def test_fetch_round_trips_per_million_rows(self):
+        n_rows = 1_000_000
+        # Driver defaults: 2 prefetched rows, then 100 rows per round trip
+        self.assertEqual(self.round_trips(n_rows, arraysize=100, prefetchrows=2), 1 + math.ceil((n_rows - 2) / 100))
+        # Builder default: arraysize rows per round trip, prefetchrows = arraysize + 1
+        arraysize = db_engine.DEFAULT_ORACLE_ARRAYSIZE
+        self.assertEqual(self.round_trips(n_rows), 1 + math.ceil((n_rows - arraysize - 1) / arraysize))
+        # A result smaller than prefetchrows takes a single round trip
+        self.assertEqual(self.round_trips(500), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import duckdb
+from db_connector import duckdb_session, load_data
+from db_connector.duckdb_session import DuckDBSession, get_session, open_snapshot, tuning_config
+
+
+def setting(conn, name):
+    return conn.execute(f"SELECT current_setting('{name}')").fetchone()[0]
+
+
+class TestTuning(unittest.TestCase):
+    def test_profiles_and_overrides(self):
+        with mock.patch.object(duckdb_session, "_available_memory", return_value=8 * 2**30):
+            loader = tuning_config("q.duckdb", "loader")
+            analytics = tuning_config("q.duckdb", "analytics", threads=2, memory_limit="1GB")
+        self.assertEqual(loader["memory_limit"], "4096MiB")
+        self.assertFalse(loader["preserve_insertion_order"])
+        self.assertEqual(loader["temp_directory"], "q.duckdb.tmp")
+        self.assertEqual((analytics["threads"], analytics["memory_limit"]), (2, "1GB"))
+        with self.assertRaises(ValueError):
+            tuning_config(profile="oltp")
+
+    def test_memory_limit_follows_cgroup(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "memory"))
+            with open(os.path.join(root, "memory.max"), "w") as f:
+                f.write(f"{4 * 2**30}\n")
+            with open(os.path.join(root, "memory", "memory.limit_in_bytes"), "w") as f:
+                f.write("9223372036854771712\n")  # v1 "unlimited"
+            with mock.patch.object(duckdb_session, "CGROUP_ROOT", root), \
+                    mock.patch.object(duckdb_session, "_physical_memory", return_value=64 * 2**30):
+                self.assertEqual(tuning_config(profile="analytics")["memory_limit"], "3072MiB")
+                with open(os.path.join(root, "memory.max"), "w") as f:
+                    f.write("max\n")
+                self.assertEqual(tuning_config(profile="analytics")["memory_limit"], "49152MiB")
+
+    def test_spill_directory(self):
+        with mock.patch.dict(os.environ, {duckdb_session.SPILL_DIR_ENV: "/data/spill"}):
+            self.assertEqual(tuning_config("q.duckdb")["temp_directory"], "/data/spill")
+        self.assertEqual(tuning_config("q.duckdb", spill_dir="/fast")["temp_directory"], "/fast")
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertTrue(tuning_config()["temp_directory"].endswith(f"-{os.getpid()}"))
+
+    def test_connection_applies_settings(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            conn = duckdb_session.connect(profile="loader", spill_dir=tmpdir, threads=1, memory_limit="256MB")
+            self.assertEqual(setting(conn, "threads"), 1)
+            self.assertFalse(setting(conn, "preserve_insertion_order"))
+            self.assertEqual(setting(conn, "temp_directory"), tmpdir)
+            # A join far larger than the memory limit spills instead of failing
+            rows = conn.execute(
+                "SELECT COUNT(*) FROM range(3000000) a(i) JOIN (SELECT i, repeat('x', 40) AS pad FROM range(3000000) b(i)) b USING (i)"
+            ).fetchone()[0]
+            self.assertEqual(rows, 3000000)
+            conn.close()
+
+
+class TestDuckDBSession(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "quotes.duckdb")
+
+    def tearDown(self):
+        duckdb_session.close_sessions()
+        self.tmpdir.cleanup()
+
+    def test_opens_lazily(self):
+        session = DuckDBSession(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        session.conn.execute("CREATE TABLE t AS SELECT 1 AS a")
+        self.assertTrue(os.path.exists(self.path))
+        session.close()
+
+    def test_cursor_per_thread(self):
+        session = DuckDBSession(self.path)
+        session.conn.execute("CREATE TABLE t AS SELECT * FROM range(1000) r(i)")
+        cursors, totals = {}, {}
+
+        def read(n):
+            cursors[n] = session.cursor()
+            self.assertIs(session.cursor(), cursors[n])
+            totals[n] = cursors[n].execute("SELECT SUM(i) FROM t").fetchone()[0]
+
+        threads = [threading.Thread(target=read, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(set(totals.values()), {499500})
+        self.assertEqual(len({id(c) for c in cursors.values()}), 4)
+        session.close()
+
+    def test_snapshot_readable_while_loading(self):
+        session = DuckDBSession(self.path, profile="loader")
+        session.conn.execute("CREATE TABLE quotes AS SELECT * FROM range(100) r(i)")
+        snapshot = session.snapshot(os.path.join(self.tmpdir.name, "quotes.snapshot.duckdb"))
+        session.conn.execute("INSERT INTO quotes SELECT * FROM range(50)")
+
+        # Another process reads the snapshot while this one still holds the database open for writing
+        code = f"import duckdb; print(duckdb.connect({snapshot!r}, read_only=True).execute('SELECT COUNT(*) FROM quotes').fetchone()[0])"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "100")
+
+        with open_snapshot(snapshot) as reader:
+            reader.cursor()
+            session.snapshot(snapshot)
+            # The open reader keeps its snapshot; a new one sees the refresh
+            self.assertEqual(reader.cursor().execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 100)
+        with open_snapshot(snapshot) as reader:
+            self.assertEqual(reader.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 150)
+            with self.assertRaises(duckdb.Error):
+                reader.conn.execute("INSERT INTO quotes VALUES (1)")
+        session.close()
+
+    def test_shared_sessions(self):
+        self.assertIs(get_session(self.path, "loader"), get_session(self.path))
+        self.assertIsNot(get_session(self.path), get_session(self.path, read_only=True))
+
+    def test_load_data_uses_loader_session(self):
+        with mock.patch.object(load_data, "DUCKDB_PATH", self.path):
+            conn = load_data.get_duckdb_conn()
+            self.assertIs(conn, load_data.get_duckdb_conn())
+            self.assertFalse(setting(conn, "preserve_insertion_order"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import datetime
+import unittest
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from db_connector import incremental, process_data
+from db_connector.synthetic import generate_tca_data
+
+CUTOFFS = [datetime.datetime(2024, 1, 2, 12, 0), datetime.datetime(2024, 1, 2, 14, 0)]
+
+
+def time_slice(table, column, start=None, end=None):
+    mask = pa.array(np.ones(table.num_rows, dtype=bool))
+    if start is not None:
+        mask = pc.and_(mask, pc.greater_equal(table[column], pa.scalar(start, table[column].type)))
+    if end is not None:
+        mask = pc.and_(mask, pc.less(table[column], pa.scalar(end, table[column].type)))
+    return table.filter(mask)
+
+
+def from_scratch(conn):
+    query = process_data._metrics_query("asof", order_keys=True)
+    return conn.execute(query, {"tolerance": process_data.CLOSEST_QUOTE_TOLERANCE,
+                                "horizons": [process_data.SETTLEMENT_HORIZON]}).df()
+
+
+def sorted_frame(df):
+    return df.sort_values(list(process_data.ORDER_KEY_COLUMNS)).reset_index(drop=True)
+
+
+class TestIncrementalMetrics(unittest.TestCase):
+    def setUp(self):
+        self.quotes, self.orders, self.condition_filter = generate_tca_data(50_000, 5, n_orders=200, seed=3)
+        self.conn = duckdb.connect()
+        process_data.setup_tables(self.conn)
+        incremental.setup_incremental(self.conn)
+        process_data.bulk_load(self.conn, None, None, self.condition_filter)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def ingest_until(self, start, end):
+        incremental.ingest(self.conn, time_slice(self.quotes, "timestamp", start, end),
+                           time_slice(self.orders, "fulfill_time", start, end))
+
+    def assert_matches_full_run(self):
+        actual = sorted_frame(self.conn.execute("SELECT * FROM tca_metrics").df())
+        expected = sorted_frame(from_scratch(self.conn))
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+
+    def test_first_refresh_is_full(self):
+        self.ingest_until(None, CUTOFFS[0])
+        stats = incremental.refresh_metrics(self.conn)
+        self.assertTrue(stats["full"])
+        self.assertGreater(stats["rows"], 0)
+        self.assert_matches_full_run()
+
+    def test_deltas_match_full_run_and_touch_few_orders(self):
+        self.ingest_until(None, CUTOFFS[0])
+        incremental.refresh_metrics(self.conn)
+        for start, end in zip(CUTOFFS, CUTOFFS[1:] + [None]):
+            self.ingest_until(start, end)
+            stats = incremental.refresh_metrics(self.conn)
+            self.assertFalse(stats["full"])
+            self.assert_matches_full_run()
+            total = self.conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            self.assertLess(stats["orders"], total)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM tca_dirty_ranges").fetchone()[0], 0)
+
+    def test_refresh_without_changes_touches_nothing(self):
+        self.ingest_until(None, None)
+        incremental.refresh_metrics(self.conn)
+        stats = incremental.refresh_metrics(self.conn)
+        self.assertEqual(stats["orders"], 0)
+        self.assert_matches_full_run()
+
+    def test_new_exchange_recomputes_whole_security(self):
+        self.ingest_until(None, None)
+        incremental.refresh_metrics(self.conn)
+        security = self.conn.execute("SELECT security_id FROM orders ORDER BY fulfill_time LIMIT 1").fetchone()[0]
+        exchange = "XTST"
+        self.conn.execute("INSERT INTO condition_filter SELECT DISTINCT ?, condition_code_to_drop FROM condition_filter",
+                          [exchange])
+        incremental.refresh_metrics(self.conn, full=True)
+        new_order = self.orders.filter(pc.equal(self.orders["security_id"], security)).slice(0, 1)
+        new_order = new_order.set_column(
+            new_order.schema.get_field_index("mic_exchange"), "mic_exchange", pa.array([exchange])
+        )
+        incremental.ingest(self.conn, orders=new_order)
+        stats = incremental.refresh_metrics(self.conn)
+        # The new order repeats an existing order's keys, so it is one more row but not one more key
+        n_security_orders = self.conn.execute(
+            "SELECT COUNT(*) FROM (SELECT DISTINCT * EXCLUDE (mic_exchange, order_size) FROM orders WHERE security_id = ?)",
+            [security],
+        ).fetchone()[0]
+        self.assertEqual(stats["orders"], n_security_orders)
+        self.assert_matches_full_run()
+
+    def test_mark_dirty_and_full_refresh(self):
+        self.ingest_until(None, None)
+        incremental.refresh_metrics(self.conn)
+        security = self.conn.execute("SELECT security_id FROM orders LIMIT 1").fetchone()[0]
+        incremental.mark_dirty(self.conn, security, CUTOFFS[0], CUTOFFS[1])
+        self.assertGreater(incremental.refresh_metrics(self.conn)["orders"], 0)
+        stats = incremental.refresh_metrics(self.conn, full=True)
+        self.assertTrue(stats["full"])
+        self.assert_matches_full_run()
+        with self.assertRaises(ValueError):
+            incremental.mark_dirty(self.conn, security, CUTOFFS[0], CUTOFFS[1], source="trades")
+
+
+if __name__ == "__main__":
+    unittest.main()
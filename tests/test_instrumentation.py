@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+import unittest
+import duckdb
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import URL
+from typer.testing import CliRunner
+from db_connector import instrumentation, process_data
+from db_connector.cli import app
+from db_connector.db_engine import BaseEngineBuilder
+from db_connector.instrumentation import (JsonLinesSink, PrometheusTextSink, duckdb_query, read_events,
+                                          summarize_events)
+
+
+class SQLiteEngineBuilder(BaseEngineBuilder):
+    def build_url(self, user: str, password: str, **kwargs):
+        return URL.create("sqlite", database=kwargs['path'])
+
+
+class CollectingSink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.sink = instrumentation.add_sink(CollectingSink())
+
+    def tearDown(self):
+        instrumentation.clear_sinks()
+        self.tmpdir.cleanup()
+
+    def kinds(self):
+        return [event["kind"] for event in self.sink.events]
+
+    def test_engine_events(self):
+        engine = SQLiteEngineBuilder().build_engine("user", "secret", path=os.path.join(self.tmpdir.name, "t.db"))
+        with engine.connect() as conn:
+            conn.execute(text("CREATE TABLE t (a INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1), (2)"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM t")).fetchall()
+        engine.dispose()
+
+        self.assertEqual(self.kinds().count("connect"), 1)
+        self.assertEqual(self.kinds().count("checkout"), 2)
+        queries = [e for e in self.sink.events if e["kind"] == "query"]
+        self.assertEqual(queries[1]["statement"], "INSERT INTO t VALUES (1), (2)")
+        self.assertEqual(queries[1]["rows"], 2)
+        self.assertTrue(all(e["source"] == "sqlalchemy:sqlite" for e in queries))
+
+    def test_failed_statement_is_recorded_and_cleared(self):
+        engine = SQLiteEngineBuilder().build_engine("user", "secret", path=os.path.join(self.tmpdir.name, "t.db"))
+        with engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            self.assertEqual(conn.info["db_connector_query_start"], [])
+            conn.execute(text("SELECT 1"))
+        engine.dispose()
+
+        failed, ok = [e for e in self.sink.events if e["kind"] == "query"]
+        self.assertEqual(failed["statement"], "SELECT * FROM missing")
+        self.assertTrue(failed["error"])
+        self.assertNotIn("error", ok)
+
+    def test_disabled_records_nothing(self):
+        instrumentation.clear_sinks()
+        engine = SQLiteEngineBuilder().build_engine("user", "secret", path=os.path.join(self.tmpdir.name, "t.db"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        engine.dispose()
+        duckdb_query(duckdb.connect(), "SELECT 1")
+        self.assertEqual(self.sink.events, [])
+
+    def test_duckdb_query_records_profile(self):
+        conn = duckdb.connect()
+        df = duckdb_query(conn, "SELECT i FROM range(100) t(i) WHERE i >= $low", {"low": 40}, label="tail")
+        self.assertEqual(len(df), 60)
+        event, = self.sink.events
+        self.assertEqual((event["source"], event["label"], event["rows"]), ("duckdb", "tail", 60))
+        self.assertGreater(event["bytes"], 0)
+        self.assertIn("children", event["profile"])
+        # Profiling is switched off again for the caller's own queries
+        conn.execute("SELECT 1").fetchall()
+        self.assertEqual(json.loads(conn.get_profiling_information(format="json")), {"result": "disabled"})
+
+    def test_process_data_queries_are_labelled(self):
+        conn = duckdb.connect()
+        process_data.setup_tables(conn)
+        process_data.filter_quotes(conn)
+        process_data.compute_metrics(conn, method="asof")
+        self.assertEqual([e["label"] for e in self.sink.events], ["filter_quotes", "compute_metrics:asof"])
+
+    def test_prometheus_text_sink(self):
+        path = os.path.join(self.tmpdir.name, "db.prom")
+        sink = instrumentation.add_sink(PrometheusTextSink(path, min_interval=3600))
+        duckdb_query(duckdb.connect(), "SELECT * FROM range(5)", label="five")
+        instrumentation.record({"kind": "connect", "source": "sqlalchemy:oracle", "seconds": 0.5})
+        instrumentation.remove_sink(sink)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('db_connector_query_rows_total{label="five",source="duckdb"} 5', lines)
+        self.assertIn('db_connector_connect_seconds_sum{source="sqlalchemy:oracle"} 0.5', lines)
+
+
+class TestProfileSummary(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "profile.jsonl")
+        sink = JsonLinesSink(self.path)
+        for seconds in (0.5, 1.5):
+            sink.write({"kind": "query", "source": "duckdb", "label": "compute_metrics", "seconds": seconds, "rows": 10})
+        sink.write({"kind": "query", "source": "sqlalchemy:oracle", "statement": "SELECT  *\n FROM t", "seconds": 1.8})
+        sink.write({"kind": "connect", "source": "sqlalchemy:oracle", "seconds": 0.25})
+        sink.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_summarize_sorts_groups(self):
+        events = read_events(self.path)
+        by_total = summarize_events(events)["statements"]
+        self.assertEqual([s["statement"] for s in by_total], ["compute_metrics", "SELECT * FROM t"])
+        self.assertEqual((by_total[0]["count"], by_total[0]["total"], by_total[0]["rows"]), (2, 2.0, 20))
+        by_max = summarize_events(events, sort="max")["statements"]
+        self.assertEqual(by_max[0]["statement"], "SELECT * FROM t")
+        self.assertEqual(summarize_events(events)["connects"]["sqlalchemy:oracle"]["count"], 1)
+        with self.assertRaises(ValueError):
+            summarize_events(events, sort="median")
+
+    def test_profile_command(self):
+        result = CliRunner().invoke(app, ["profile", "--file", self.path, "--top", "1"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("compute_metrics", result.output)
+        self.assertNotIn("SELECT * FROM t", result.output)
+        self.assertIn("1 connects", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+import asyncio
+import datetime
+import threading
+import time
+import unittest
+import duckdb
+import pyarrow as pa
+from snowflake.connector.errors import ProgrammingError
+from db_connector.load_data import (
+    build_incremental_query, chunk_securities, get_watermarks, load_incremental, load_queries, load_securities,
+    store_arrow_batches,
+)
+
+
+class FakeArrowCursor:
+    """Stands in for a Snowflake cursor whose result arrives as Arrow chunks."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def fetch_arrow_batches(self):
+        yield from self.tables
+
+
+class FakeSnowflake:
+    """Local stand-in for snowflake.connector that simulates query latency."""
+
+    def __init__(self, latency, rows=100, batches=1):
+        self.latency = latency
+        self.rows = rows
+        self.batches = batches
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queries = []
+
+    def connect(self):
+        return FakeSnowflakeConnection(self)
+
+
+class FakeSnowflakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.params = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        if "FAIL" in query:
+            raise ProgrammingError("simulated failure")
+        if "BROKEN" in query:
+            raise OSError("connection reset")
+        self.params = params
+        server = self.server
+        server.queries.append((query, params))
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.latency)
+        with server.lock:
+            server.in_flight -= 1
+
+    def fetch_arrow_batches(self):
+        if self.params is None:
+            for i in range(self.server.batches):
+                yield quote_table(i * self.server.rows, self.server.rows)
+            return
+        # Bound IN list: return rows for each requested security except "EMPTY",
+        # with Snowflake's upper-cased column names.
+        ids = [sec for sec in self.params if sec != "EMPTY" for _ in range(self.server.rows)]
+        yield pa.table({"SECURITY_ID": pa.array(ids), "BID_PRICE": pa.array([1.0] * len(ids))})
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    """Wraps a DuckDB connection and records the size of every registered batch."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.batch_sizes = []
+
+    def register(self, name, batch):
+        self.batch_sizes.append(batch.num_rows)
+        return self.conn.register(name, batch)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def quote_table(start, rows):
+    return pa.table({
+        "security_id": pa.array(["AAPL"] * rows),
+        "bid_price": pa.array([float(i) for i in range(start, start + rows)]),
+    })
+
+
+class TestStoreArrowBatches(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_streams_batches_into_table(self):
+        cursor = FakeArrowCursor([quote_table(0, 2500), quote_table(2500, 700)])
+        recorder = RecordingConnection(self.conn)
+        stats = store_arrow_batches(cursor, "AAPL", conn=recorder, batch_rows=1000)
+
+        self.assertEqual(stats["rows"], 3200)
+        self.assertGreater(stats["bytes"], 0)
+        self.assertLessEqual(max(recorder.batch_sizes), 1000)
+        count, total = self.conn.execute("SELECT COUNT(*), SUM(bid_price) FROM AAPL").fetchone()
+        self.assertEqual(count, 3200)
+        self.assertEqual(total, sum(range(3200)))
+
+    def test_appends_to_existing_table(self):
+        store_arrow_batches(FakeArrowCursor([quote_table(0, 10)]), "AAPL", conn=self.conn)
+        store_arrow_batches(FakeArrowCursor([quote_table(10, 5)]), "AAPL", conn=self.conn)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM AAPL").fetchone()[0], 15)
+
+    def test_empty_result_creates_nothing(self):
+        stats = store_arrow_batches(FakeArrowCursor([]), "AAPL", conn=self.conn)
+        self.assertEqual(stats["rows"], 0)
+        tables = self.conn.execute("SELECT table_name FROM information_schema.tables").fetchall()
+        self.assertEqual(tables, [])
+
+
+class TestLoadQueries(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_queries_run_concurrently(self):
+        server = FakeSnowflake(latency=0.2)
+        queries = {f"SEC{i}": f"SELECT {i}" for i in range(4)}
+        result = asyncio.run(load_queries(queries, conn=self.conn, max_concurrency=4, connect=server.connect))
+
+        self.assertEqual(server.max_in_flight, 4)
+        self.assertLess(result["wall_seconds"], 0.2 * 4 / 2)
+        self.assertGreater(result["speedup"], 2)
+        for table_name, stats in result["queries"].items():
+            self.assertEqual(stats["rows"], 100)
+            self.assertGreaterEqual(stats["seconds"], 0.2)
+            self.assertEqual(self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0], 100)
+
+    def test_concurrency_is_bounded(self):
+        server = FakeSnowflake(latency=0.05)
+        queries = {f"SEC{i}": f"SELECT {i}" for i in range(6)}
+        asyncio.run(load_queries(queries, conn=self.conn, max_concurrency=2, connect=server.connect))
+        self.assertEqual(server.max_in_flight, 2)
+
+    def test_failed_query_does_not_stop_others(self):
+        server = FakeSnowflake(latency=0)
+        queries = {"GOOD": "SELECT 1", "BAD": "SELECT FAIL"}
+        result = asyncio.run(load_queries(queries, conn=self.conn, connect=server.connect))
+        self.assertEqual(result["queries"]["GOOD"]["rows"], 100)
+        self.assertEqual(result["queries"]["BAD"]["rows"], 0)
+        self.assertIn("simulated failure", result["queries"]["BAD"]["error"])
+
+    def test_non_snowflake_failure_does_not_deadlock(self):
+        server = FakeSnowflake(latency=0.05, rows=10, batches=20)
+        queries = {"GOOD": "SELECT 1", "BAD": "SELECT BROKEN"}
+        results = []
+        # Run on a thread so a deadlock fails the test instead of hanging the suite
+        runner = threading.Thread(target=lambda: results.append(asyncio.run(load_queries(
+            queries, conn=self.conn, connect=server.connect, queue_size=2,
+        ))), daemon=True)
+        runner.start()
+        runner.join(10)
+        self.assertFalse(runner.is_alive(), "load_queries deadlocked")
+        result = results[0]
+        self.assertEqual(result["queries"]["GOOD"]["rows"], 200)
+        self.assertEqual(result["queries"]["BAD"]["error"], "OSError: connection reset")
+
+
+class TestLoadSecurities(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_chunk_securities(self):
+        self.assertEqual(chunk_securities(["A", "B", "A", "C"], chunk_size=2), [["A", "B"], ["C"]])
+
+    def test_one_query_per_chunk_into_single_table(self):
+        server = FakeSnowflake(latency=0, rows=3)
+        securities = ["AAPL", "TSLA", "GOOGL", "MSFT", "EMPTY"]
+        result = asyncio.run(load_securities(
+            securities, where="timestamp >= '2024-01-01'", chunk_size=2, conn=self.conn, connect=server.connect
+        ))
+
+        self.assertEqual(len(server.queries), 3)
+        sql, params = max(server.queries, key=lambda q: len(q[1]))
+        self.assertIn("security_id IN (%s, %s)", sql)
+        self.assertIn("AND timestamp >= '2024-01-01'", sql)
+        self.assertEqual(result["rows_by_security"], {"AAPL": 3, "TSLA": 3, "GOOGL": 3, "MSFT": 3, "EMPTY": 0})
+        rows = self.conn.execute("SELECT security_id, COUNT(*) FROM quotes GROUP BY 1 ORDER BY 1").fetchall()
+        self.assertEqual(rows, [("AAPL", 3), ("GOOGL", 3), ("MSFT", 3), ("TSLA", 3)])
+
+
+class FakeQuoteSource:
+    """Snowflake stand-in for incremental loads: applies the bound watermarks in Python."""
+
+    def __init__(self, rows, honour_watermarks=True, batch_rows=None, fail_after=None):
+        self.rows = rows
+        self.honour_watermarks = honour_watermarks
+        self.batch_rows = batch_rows
+        self.fail_after = fail_after
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        triples = [params[i:i + 3] for i in range(0, len(params), 3)]
+        marks = {security_id: (ts, cc) for security_id, ts, cc in triples}
+        self.result = [
+            row for row in self.rows
+            if row[0] in marks and (
+                not self.honour_watermarks or marks[row[0]][0] is None
+                or (row[1], row[2] or "") > marks[row[0]]
+            )
+        ]
+
+    def fetch_arrow_batches(self):
+        # Rows come back newest first, as an unordered query may return them
+        result = sorted(self.result, key=lambda row: (row[1], row[2] or ""), reverse=True)
+        batch_rows = self.batch_rows or len(result)
+        for i, start in enumerate(range(0, len(result), batch_rows)):
+            if i == self.fail_after:
+                raise OSError("connection reset")
+            columns = list(zip(*result[start:start + batch_rows]))
+            yield pa.table({
+                "SECURITY_ID": pa.array(columns[0]),
+                "TIMESTAMP": pa.array(columns[1], pa.timestamp("us")),
+                "CONDITION_CODE": pa.array(columns[2], pa.string()),
+                "BID_PRICE": pa.array(columns[3]),
+            })
+
+    def close(self):
+        pass
+
+
+def ts(second):
+    return datetime.datetime(2024, 1, 2, 9, 30, second)
+
+
+class TestLoadIncremental(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+        self.rows = [
+            ("AAPL", ts(0), "A", 1.0),
+            ("AAPL", ts(1), None, 1.1),
+            ("AAPL", ts(1), "B", 1.2),
+            ("TSLA", ts(0), "A", 2.0),
+        ]
+
+    def tearDown(self):
+        self.conn.close()
+
+    def load(self, source):
+        return asyncio.run(load_incremental(["AAPL", "TSLA"], conn=self.conn, connect=source.connect))
+
+    def test_first_run_loads_everything_and_sets_watermarks(self):
+        result = self.load(FakeQuoteSource(self.rows))
+        self.assertEqual(result["rows_by_security"], {"AAPL": 3, "TSLA": 1})
+        self.assertEqual(get_watermarks(self.conn), {"AAPL": (ts(1), "B"), "TSLA": (ts(0), "A")})
+
+    def test_next_run_moves_only_new_rows(self):
+        self.load(FakeQuoteSource(self.rows))
+        new_rows = [("AAPL", ts(1), "C", 1.3), ("TSLA", ts(5), "A", 2.5)]
+        result = self.load(FakeQuoteSource(self.rows + new_rows))
+        self.assertEqual(result["rows_by_security"], {"AAPL": 1, "TSLA": 1})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 6)
+        self.assertEqual(get_watermarks(self.conn), {"AAPL": (ts(1), "C"), "TSLA": (ts(5), "A")})
+
+    def test_overlapping_runs_do_not_duplicate(self):
+        source = FakeQuoteSource(self.rows, honour_watermarks=False)
+        self.load(source)
+        self.load(source)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 4)
+        self.assertEqual(get_watermarks(self.conn)["AAPL"], (ts(1), "B"))
+
+    def test_failed_batch_does_not_advance_watermarks(self):
+        # The newest rows arrive first; the second batch fails before the older ones are stored
+        result = self.load(FakeQuoteSource(self.rows, batch_rows=2, fail_after=1))
+        self.assertIn("connection reset", result["queries"]["chunk_0"]["error"])
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 2)
+        self.assertEqual(get_watermarks(self.conn), {})
+        # The next run fetches the whole chunk again and upserts over the stored rows
+        result = self.load(FakeQuoteSource(self.rows, batch_rows=2))
+        self.assertIsNone(result["queries"]["chunk_0"]["error"])
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 4)
+        self.assertEqual(get_watermarks(self.conn), {"AAPL": (ts(1), "B"), "TSLA": (ts(0), "A")})
+
+    def test_build_incremental_query_binds_watermarks(self):
+        sql, params = build_incremental_query(["AAPL", "TSLA"], {"AAPL": (ts(1), "B")}, where="q.timestamp >= '2024-01-02'")
+        self.assertIn("FROM VALUES (%s, %s, %s), (%s, %s, %s)", sql)
+        # where bounds only the first load of securities without a watermark
+        self.assertIn("(w.wm_timestamp IS NULL AND (q.timestamp >= '2024-01-02'))", sql)
+        self.assertEqual(params, ("AAPL", ts(1), "B", "TSLA", None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
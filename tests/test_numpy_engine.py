@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from db_connector import numpy_engine
+from db_connector.synthetic import generate_tca_data
+from tests.test_process_data import CONDITION_FILTER, ORDERS, QUOTES, ts
+
+
+def sorted_frame(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def assert_same_metrics(actual, expected):
+    assert_frame_equal(sorted_frame(actual), sorted_frame(expected), check_exact=False, rtol=1e-6)
+
+
+class TestNumpyEngine(unittest.TestCase):
+    def test_metrics_match_duckdb_on_fixture(self):
+        expected = numpy_engine.metrics_from_frames(QUOTES, ORDERS, CONDITION_FILTER, engine="duckdb")
+        actual = numpy_engine.compute_metrics(QUOTES, ORDERS, CONDITION_FILTER)
+        # The stale-quote TSLA order has no closest quote, as in DuckDB
+        self.assertEqual(sorted(actual["security_id"]), ["AAPL", "AAPL", "MSFT"])
+        assert_same_metrics(actual, expected)
+
+    def test_metrics_match_duckdb_on_synthetic_data(self):
+        quotes, orders, condition_filter = generate_tca_data(100_000, 20, n_orders=300, seed=5)
+        for tolerance in (0, 3, 60):
+            expected = numpy_engine.metrics_from_frames(quotes, orders, condition_filter, engine="duckdb",
+                                                        tolerance_seconds=tolerance)
+            actual = numpy_engine.compute_metrics(quotes, orders, condition_filter, tolerance_seconds=tolerance)
+            self.assertGreater(len(actual), 0)
+            assert_same_metrics(actual, expected)
+        # pandas inputs give the same rows as Arrow ones
+        pandas_inputs = (quotes.to_pandas(), orders.to_pandas(), condition_filter.to_pandas())
+        assert_same_metrics(numpy_engine.compute_metrics(*pandas_inputs),
+                            numpy_engine.compute_metrics(quotes, orders, condition_filter))
+
+    def test_shortfall_metrics_match_duckdb(self):
+        quotes, orders, _ = generate_tca_data(50_000, 10, n_orders=100, seed=6)
+        assert_same_metrics(numpy_engine.compute_shortfall_metrics(quotes, orders),
+                            numpy_engine.shortfall_metrics_from_frames(quotes, orders, engine="duckdb"))
+        assert_same_metrics(numpy_engine.compute_shortfall_metrics(QUOTES, ORDERS),
+                            numpy_engine.shortfall_metrics_from_frames(QUOTES, ORDERS, engine="duckdb"))
+
+    def test_null_and_empty_windows_match_duckdb(self):
+        quotes = QUOTES.copy()
+        quotes.loc[0, "volume"] = np.nan
+        quotes.loc[3, "bid_price"] = np.nan
+        orders = pd.concat([ORDERS, pd.DataFrame([
+            ("AAPL", "XNAS", ts(5), ts(-10), ts(-5), 10.0, 100.0),   # window before any quote
+            ("MSFT", "XNYS", ts(16), ts(16), ts(16), 10.0, np.nan),  # NULL execution price
+            (None, "XNAS", ts(3), ts(1), ts(5), 10.0, 100.0),        # NULL security
+        ], columns=ORDERS.columns)], ignore_index=True)
+        assert_same_metrics(numpy_engine.compute_metrics(quotes, orders, CONDITION_FILTER),
+                            numpy_engine.metrics_from_frames(quotes, orders, CONDITION_FILTER, engine="duckdb"))
+        assert_same_metrics(numpy_engine.compute_shortfall_metrics(quotes, orders),
+                            numpy_engine.shortfall_metrics_from_frames(quotes, orders, engine="duckdb"))
+
+    def test_no_quotes_match_duckdb(self):
+        all_dropped = pd.concat([CONDITION_FILTER, pd.DataFrame([("XNYS", "X")], columns=CONDITION_FILTER.columns)])
+        for quotes, condition_filter in ((QUOTES.iloc[:0], CONDITION_FILTER),
+                                         (QUOTES.assign(condition_code="X"), all_dropped)):
+            metrics = numpy_engine.metrics_from_frames(quotes, ORDERS, condition_filter, engine="numpy")
+            self.assertEqual(len(metrics), 0)
+            self.assertEqual(len(numpy_engine.metrics_from_frames(quotes, ORDERS, condition_filter, engine="duckdb")), 0)
+        quotes = QUOTES.iloc[:0]
+        shortfall = numpy_engine.shortfall_metrics_from_frames(quotes, ORDERS, engine="numpy")
+        self.assertEqual(len(shortfall), len(ORDERS))
+        self.assertTrue(shortfall["pre_trade_price"].isna().all())
+        assert_same_metrics(shortfall, numpy_engine.shortfall_metrics_from_frames(quotes, ORDERS, engine="duckdb"))
+
+    def test_auto_engine_switches_on_quote_count(self):
+        self.assertEqual(numpy_engine.choose_engine(numpy_engine.NUMPY_ENGINE_MAX_QUOTES), "numpy")
+        self.assertEqual(numpy_engine.choose_engine(numpy_engine.NUMPY_ENGINE_MAX_QUOTES + 1), "duckdb")
+        with mock.patch.object(numpy_engine, "NUMPY_ENGINE_MAX_QUOTES", 5), \
+                mock.patch.object(numpy_engine, "compute_metrics") as numpy_metrics:
+            result = numpy_engine.metrics_from_frames(QUOTES, ORDERS, CONDITION_FILTER)
+        numpy_metrics.assert_not_called()
+        self.assertEqual(len(result), 3)
+        with self.assertRaises(ValueError):
+            numpy_engine.choose_engine(10, engine="polars")
+
+
+if __name__ == "__main__":
+    unittest.main()
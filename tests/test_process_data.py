@@ -0,0 +1,253 @@
+import datetime
+import unittest
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.testing import assert_frame_equal
+from db_connector import process_data
+
+
+def ts(second):
+    return datetime.datetime(2024, 1, 2, 9, 30) + datetime.timedelta(seconds=second)
+
+
+def quote(security_id, second, condition_code, bid, ask, trade_price=None, volume=100.0):
+    return (security_id, ts(second), condition_code, bid, ask, trade_price or (bid + ask) / 2, volume)
+
+
+QUOTES = pd.DataFrame([
+    quote("AAPL", 0, "A", 100.0, 101.0),
+    quote("AAPL", 2, "X", 90.0, 91.0),       # dropped on XNAS
+    quote("AAPL", 4, "A", 102.0, 103.0),
+    quote("AAPL", 9, "A", 103.0, 104.0),
+    quote("AAPL", 15, "A", 104.0, 105.0),
+    quote("AAPL", 20, "A", 105.0, 106.0),
+    quote("MSFT", 1, "A", 200.0, 201.0),
+    quote("MSFT", 6, "A", 201.0, 202.0),
+    quote("MSFT", 16, "A", 202.0, 203.0),
+    quote("TSLA", 50, "A", 300.0, 301.0),    # too old for the TSLA order
+], columns=["security_id", "timestamp", "condition_code", "bid_price", "ask_price", "trade_price", "volume"])
+
+ORDERS = pd.DataFrame([
+    # security_id, mic_exchange, fulfill_time, order_start_time, order_end_time, order_size, execution_price
+    ("AAPL", "XNAS", ts(3), ts(1), ts(5), 100.0, 101.0),
+    ("AAPL", "XNAS", ts(10), ts(6), ts(10), 50.0, 104.0),
+    ("MSFT", "XNYS", ts(6), ts(2), ts(6), 10.0, 201.0),
+    ("TSLA", "XNAS", ts(70), ts(60), ts(70), 10.0, 300.0),
+], columns=["security_id", "mic_exchange", "fulfill_time", "order_start_time", "order_end_time", "order_size", "execution_price"])
+
+CONDITION_FILTER = pd.DataFrame([
+    ("XNAS", "X"),
+], columns=["mic_exchange", "condition_code_to_drop"])
+
+
+def fixture_conn(quotes=QUOTES, orders=ORDERS, condition_filter=CONDITION_FILTER):
+    conn = duckdb.connect()
+    process_data.setup_tables(conn)
+    process_data.load_data(conn, quotes, orders, condition_filter)
+    return conn
+
+
+def sorted_frame(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+        process_data.setup_tables(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_arrow_input_is_stored_clustered(self):
+        shuffled = pa.Table.from_pandas(QUOTES.sample(frac=1, random_state=1), preserve_index=False)
+        stats = process_data.bulk_load(self.conn, shuffled, pa.Table.from_pandas(ORDERS), chunk_rows=3)
+        self.assertEqual(stats["quotes"]["rows"], len(QUOTES))
+        self.assertEqual(stats["orders"]["rows"], len(ORDERS))
+        stored = self.conn.execute("SELECT security_id, timestamp FROM quotes ORDER BY rowid").fetchall()
+        self.assertEqual(stored, sorted(stored))
+
+    def test_pandas_fallback_and_extra_columns(self):
+        process_data.bulk_load(self.conn, QUOTES.assign(venue="X"), condition_filter=CONDITION_FILTER)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], len(QUOTES))
+
+    def test_schema_validation(self):
+        with self.assertRaisesRegex(ValueError, "missing column volume"):
+            process_data.bulk_load(self.conn, QUOTES.drop(columns=["volume"]))
+        with self.assertRaisesRegex(ValueError, "column timestamp"):
+            process_data.bulk_load(self.conn, QUOTES.assign(timestamp="09:30"))
+
+    def test_single_transaction(self):
+        with self.assertRaises(ValueError):
+            process_data.bulk_load(self.conn, QUOTES, ORDERS.drop(columns=["fulfill_time"]))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0], 0)
+
+    def test_clustering_reduces_row_groups_touched(self):
+        n = 300_000
+        quotes = pd.DataFrame({
+            "security_id": np.array(["S0", "S1", "S2"])[np.arange(n) % 3],
+            "timestamp": pd.Timestamp("2024-01-02 09:30") + pd.to_timedelta(np.arange(n), unit="s"),
+            "condition_code": "A",
+            "bid_price": 1.0, "ask_price": 1.0, "trade_price": 1.0, "volume": 1.0,
+        })
+        start, end = datetime.datetime(2024, 1, 2, 10), datetime.datetime(2024, 1, 2, 11)
+
+        self.conn.register("arrival_order", quotes)
+        self.conn.execute("CREATE TABLE unclustered AS SELECT * FROM arrival_order")
+        unclustered = process_data.row_groups_touched(self.conn, "S0", start, end, table_name="unclustered")
+        process_data.bulk_load(self.conn, quotes)
+        clustered = process_data.row_groups_touched(self.conn, "S0", start, end)
+
+        self.assertEqual(unclustered["touched"], unclustered["total"])
+        self.assertEqual(clustered["touched"], 1)
+        self.assertGreater(clustered["total"], 1)
+
+
+class TestFilterQuotes(unittest.TestCase):
+    def test_drops_excluded_codes_once_per_quote(self):
+        conn = fixture_conn()
+        df = process_data.filter_quotes(conn)
+        conn.close()
+        self.assertEqual(len(df), len(QUOTES) - 1)
+        self.assertNotIn("X", set(df["condition_code"]))
+
+    def test_code_kept_if_any_exchange_keeps_it(self):
+        orders = pd.concat([ORDERS, ORDERS.iloc[[0]].assign(mic_exchange="XNYS")], ignore_index=True)
+        conn = fixture_conn(orders=orders)
+        df = process_data.filter_quotes(conn)
+        conn.close()
+        self.assertEqual(len(df), len(QUOTES))
+
+    def test_quotes_without_orders_are_kept(self):
+        conn = fixture_conn(orders=ORDERS[ORDERS["security_id"] != "AAPL"])
+        df = process_data.filter_quotes(conn)
+        conn.close()
+        self.assertEqual(len(df), len(QUOTES))
+
+
+class TestClosestQuotes(unittest.TestCase):
+    def setUp(self):
+        self.conn = fixture_conn()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_rank_engine(self):
+        df = process_data.closest_quotes(self.conn, method="rank")
+        self.assertEqual(
+            list(df.itertuples(index=False, name=None)),
+            [("AAPL", ts(3), 100.5), ("AAPL", ts(10), 103.5), ("MSFT", ts(6), 201.5)],
+        )
+
+    def test_asof_matches_rank(self):
+        for tolerance in (0, 1, 3, 30):
+            rank = process_data.closest_quotes(self.conn, method="rank", tolerance_seconds=tolerance)
+            asof = process_data.closest_quotes(self.conn, method="asof", tolerance_seconds=tolerance)
+            assert_frame_equal(rank, asof)
+        # Both sub-second quotes are one whole second before the fill; the later one wins
+        quotes = pd.concat([QUOTES, pd.DataFrame([
+            quote("IBM", 100.2, "A", 9.5, 10.5),
+            quote("IBM", 100.7, "A", 10.5, 11.5),
+        ], columns=QUOTES.columns)], ignore_index=True)
+        orders = pd.concat([ORDERS, pd.DataFrame([
+            ("IBM", "XNYS", ts(101), ts(100), ts(101), 10.0, 11.0),
+        ], columns=ORDERS.columns)], ignore_index=True)
+        conn = fixture_conn(quotes, orders)
+        try:
+            rank = process_data.closest_quotes(conn, method="rank")
+            asof = process_data.closest_quotes(conn, method="asof")
+        finally:
+            conn.close()
+        assert_frame_equal(rank, asof)
+        self.assertIn(("IBM", ts(101), 11.0), list(rank.itertuples(index=False, name=None)))
+
+    def test_tolerance(self):
+        df = process_data.closest_quotes(self.conn, method="asof", tolerance_seconds=30)
+        self.assertIn(("TSLA", ts(70), 300.5), list(df.itertuples(index=False, name=None)))
+
+    def test_compute_metrics_engines_agree(self):
+        rank = process_data.compute_metrics(self.conn, method="rank")
+        asof = process_data.compute_metrics(self.conn, method="asof")
+        self.assertEqual(len(rank), 3)  # one row per order with a quote at +10s
+        assert_frame_equal(sorted_frame(rank), sorted_frame(asof))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            process_data.closest_quotes(self.conn, method="nearest")
+
+
+class TestOrderVwaps(unittest.TestCase):
+    def brute_force_vwap(self, quotes, security_id, start, end):
+        window = quotes[(quotes["security_id"] == security_id)
+                        & (quotes["timestamp"] >= start) & (quotes["timestamp"] <= end)]
+        if window["volume"].sum() == 0:
+            return None
+        return (window["trade_price"] * window["volume"]).sum() / window["volume"].sum()
+
+    def test_matches_brute_force_per_order(self):
+        quotes = QUOTES.assign(volume=[100.0, 50.0, 25.0, 200.0, 10.0, 75.0, 30.0, 60.0, 90.0, 5.0])
+        orders = pd.concat([ORDERS, pd.DataFrame([
+            ("AAPL", "XNAS", ts(12), ts(11), ts(12), 1.0, 104.0),   # no trades in window
+            ("AAPL", "XNAS", ts(20), ts(0), ts(20), 1.0, 104.0),    # whole tape, inclusive bounds
+        ], columns=ORDERS.columns)], ignore_index=True)
+        conn = fixture_conn(quotes=quotes, orders=orders)
+        df = process_data.order_vwaps(conn)
+        conn.close()
+
+        self.assertEqual(len(df), len(orders))
+        for row in df.itertuples(index=False):
+            expected = self.brute_force_vwap(quotes, row.security_id, row.order_start_time, row.order_end_time)
+            if expected is None:
+                self.assertTrue(pd.isna(row.vwap_price))
+            else:
+                self.assertAlmostEqual(row.vwap_price, expected, places=6)
+
+    def test_shortfall_uses_order_vwap(self):
+        conn = fixture_conn()
+        df = process_data.compute_shortfall_metrics(conn)
+        conn.close()
+        aapl = df[df["security_id"] == "AAPL"].sort_values("execution_price")
+        # first AAPL order covers quotes at 2s (X) and 4s; second covers 9s only
+        self.assertAlmostEqual(aapl["vwap_price"].iloc[0], (90.5 + 102.5) / 2, places=4)
+        self.assertAlmostEqual(aapl["vwap_price"].iloc[1], 103.5, places=4)
+
+
+class TestMarkouts(unittest.TestCase):
+    def setUp(self):
+        self.conn = fixture_conn()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_long_output(self):
+        df = process_data.compute_markouts(self.conn, horizons=[1, 5, 10, 60])
+        first = df[(df["security_id"] == "AAPL") & (df["order_end_time"] == ts(5))]
+        self.assertEqual(list(first["horizon_seconds"]), [1, 5, 10, 60])
+        self.assertEqual(list(first["post_trade_price"]), [102.5, 103.5, 104.5, 105.5])
+        self.assertAlmostEqual(first["return_bps"].iloc[0], (102.5 - 101.0) / 101.0 * 100)
+        self.assertEqual(len(df), len(ORDERS) * 4)
+
+    def test_wide_output(self):
+        df = process_data.compute_markouts(self.conn, horizons=[1, 300], wide=True)
+        self.assertEqual(len(df), len(ORDERS))
+        self.assertIn("post_trade_price_300s", df.columns)
+        self.assertIn("return_1s_bps", df.columns)
+        tsla = df[df["security_id"] == "TSLA"].iloc[0]
+        self.assertEqual(tsla["post_trade_price_1s"], 300.5)
+
+    def test_settlement_uses_prevailing_quote(self):
+        conn = fixture_conn(quotes=QUOTES[QUOTES["timestamp"] != ts(15)])
+        df = process_data.compute_metrics(conn, method="asof")
+        conn.close()
+        first = df[(df["security_id"] == "AAPL") & (df["execution_price"] == 101.0)]
+        self.assertEqual(first["end_price"].iloc[0], 103.5)
+
+    def test_invalid_horizons(self):
+        with self.assertRaises(ValueError):
+            process_data.compute_markouts(self.conn, horizons=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import datetime
+import tempfile
+import unittest
+import duckdb
+import pyarrow as pa
+from db_connector import process_data
+from db_connector.staging import ParquetStage
+
+
+def day(n):
+    return datetime.date(2024, 1, n)
+
+
+class FakeQuoteFetcher:
+    """Stands in for Snowflake: returns one quote per security per day at 09:30 and 15:00."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, securities, start_date, end_date):
+        self.calls.append((list(securities), start_date, end_date))
+        rows = []
+        d = start_date
+        while d <= end_date:
+            for security_id in securities:
+                for hour in (9, 15):
+                    rows.append((security_id, datetime.datetime.combine(d, datetime.time(hour, 30)), "A", 10.0, 11.0, 10.5, 100.0))
+            d += datetime.timedelta(days=1)
+        columns = list(zip(*rows))
+        names = ["SECURITY_ID", "TIMESTAMP", "CONDITION_CODE", "BID_PRICE", "ASK_PRICE", "TRADE_PRICE", "VOLUME"]
+        yield from pa.table(dict(zip(names, columns))).to_batches(max_chunksize=3)
+
+
+class TestParquetStage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.stage = ParquetStage(self.tmpdir.name)
+        self.fetch = FakeQuoteFetcher()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_only_missing_ranges_are_fetched(self):
+        result = self.stage.ensure(["AAPL", "MSFT"], day(2), day(4), fetch=self.fetch)
+        self.assertEqual(result["rows"], 2 * 3 * 2)
+        self.assertEqual(self.fetch.calls, [(["AAPL", "MSFT"], day(2), day(4))])
+
+        self.assertEqual(self.stage.ensure(["AAPL", "MSFT"], day(2), day(4), fetch=self.fetch)["fetched"], [])
+
+        self.stage.ensure(["AAPL", "TSLA"], day(3), day(5), fetch=self.fetch)
+        self.assertEqual(self.fetch.calls[1:], [
+            (["TSLA"], day(3), day(5)),
+            (["AAPL"], day(5), day(5)),
+        ])
+
+    def test_manifest_persists(self):
+        self.stage.ensure(["AAPL"], day(2), day(2), fetch=self.fetch)
+        reopened = ParquetStage(self.tmpdir.name)
+        self.assertTrue(reopened.is_covered("quotes", "AAPL", day(2)))
+        self.assertEqual(reopened.missing_ranges(["AAPL"], day(1), day(3)), {(day(1), day(1)): ["AAPL"], (day(3), day(3)): ["AAPL"]})
+
+    def test_empty_days_are_recorded(self):
+        def no_rows(securities, start_date, end_date):
+            return iter([])
+        self.stage.ensure(["AAPL"], day(6), day(7), fetch=no_rows)
+        self.assertEqual(self.stage.missing_ranges(["AAPL"], day(6), day(7)), {})
+
+    def test_process_data_reads_partitions_in_place(self):
+        self.stage.ensure(["AAPL", "MSFT"], day(2), day(4), fetch=self.fetch)
+        conn = duckdb.connect()
+        self.stage.create_view(conn, day(3), day(3), securities=["AAPL"])
+        process_data.setup_tables(conn)
+
+        df = process_data.filter_quotes(conn)
+        self.assertEqual(len(df), 2)
+        self.assertEqual(set(df["security_id"]), {"AAPL"})
+        plan = conn.execute("EXPLAIN ANALYZE SELECT * FROM quotes").fetchall()[0][1]
+        self.assertIn("Scanning Files: 1/", plan)
+        conn.close()
+
+    def test_numeric_security_ids_stay_strings(self):
+        result = self.stage.ensure(["12", "13"], day(2), day(2), fetch=self.fetch)
+        self.assertEqual(result["rows"], 4)
+        self.assertEqual(self.stage.manifest["quotes"]["12"]["2024-01-02"]["rows"], 2)
+        conn = duckdb.connect()
+        self.stage.create_view(conn, day(2), day(2))
+        self.assertEqual(conn.execute("SELECT typeof(security_id) FROM quotes LIMIT 1").fetchone()[0], "VARCHAR")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM quotes WHERE security_id = '12'").fetchone()[0], 2)
+        conn.close()
+
+    def test_create_view_without_data(self):
+        with self.assertRaises(ValueError):
+            self.stage.create_view(duckdb.connect(), day(2), day(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import URL
+from db_connector import db_engine
+from db_connector.db_engine import BaseEngineBuilder
+from db_connector.streaming import QueryStream, _set_fetch_size, stream_query
+
+
+class SQLiteEngineBuilder(BaseEngineBuilder):
+    def build_url(self, user: str, password: str, **kwargs):
+        return URL.create("sqlite", database=kwargs['path'])
+
+
+class FakeArrowCursor:
+    """Snowflake-style cursor returning its result as Arrow tables."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+
+    def fetch_arrow_batches(self):
+        yield from self.tables
+
+    def close(self):
+        self.closed = True
+
+
+class TestStreamQuery(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "stream.db")
+        self.patches = [
+            mock.patch.dict(db_engine.engine_builders, {'sqlite': SQLiteEngineBuilder()}),
+            mock.patch.object(db_engine, 'get_credentials', return_value={'password': 'secret'}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.engine = db_engine.get_engine('sqlite', 'user', path=self.path)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE quotes (security_id TEXT, price REAL, note TEXT)"))
+            conn.execute(text("INSERT INTO quotes VALUES (:s, :p, :n)"),
+                         [{"s": f"SEC{i % 3}", "p": float(i), "n": None if i < 1500 else "late"} for i in range(2500)])
+
+    def tearDown(self):
+        db_engine.dispose_engines()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def stream(self, sql, params=None, **kwargs):
+        return stream_query('sqlite', 'user', sql, params, path=self.path, **kwargs)
+
+    def test_arrow_batches_are_bounded(self):
+        schema = pa.schema([("security_id", pa.string()), ("price", pa.float64()), ("note", pa.string())])
+        stream = self.stream("SELECT * FROM quotes ORDER BY price", batch_rows=1000, schema=schema)
+        batches = list(stream)
+        self.assertEqual([b.num_rows for b in batches], [1000, 1000, 500])
+        self.assertTrue(all(b.schema.equals(schema) for b in batches))
+        self.assertEqual(batches[2].column("price")[0].as_py(), 2000.0)
+        self.assertEqual(batches[2].column("note")[0].as_py(), "late")
+        self.assertEqual(stream.stats["rows"], 2500)
+        self.assertEqual(stream.stats["batches"], 3)
+        self.assertEqual(stream.stats["bytes"], sum(b.nbytes for b in batches))
+        self.assertGreater(stream.stats["rows_per_sec"], 0)
+
+    def test_pandas_chunks_with_params(self):
+        chunks = list(self.stream("SELECT price FROM quotes WHERE security_id = :sec ORDER BY price",
+                                  {"sec": "SEC1"}, batch_rows=400, output="pandas"))
+        self.assertTrue(all(isinstance(c, pd.DataFrame) for c in chunks))
+        self.assertEqual([len(c) for c in chunks], [400, 400, 33])
+        self.assertEqual(chunks[0]["price"].iloc[1], 4.0)
+
+    def test_early_close_releases_connection(self):
+        with self.stream("SELECT * FROM quotes", batch_rows=100) as stream:
+            next(iter(stream))
+            self.assertEqual(self.engine.pool.checkedout(), 1)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    def test_rejects_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            self.stream("SELECT 1", output="polars")
+        with self.assertRaises(ValueError):
+            self.stream("SELECT 1", batch_rows=0)
+
+    def test_fetch_size_follows_batch_rows(self):
+        cursor = mock.Mock(arraysize=100, prefetchrows=2)
+        context = mock.Mock(execution_options={"fetch_rows": 5000})
+        _set_fetch_size(None, cursor, "SELECT 1", {}, context, False)
+        self.assertEqual((cursor.arraysize, cursor.prefetchrows), (5000, 5001))
+
+
+class TestSnowflakeStream(unittest.TestCase):
+    def test_reads_native_arrow_batches(self):
+        dialect = sqlite.dialect(paramstyle="pyformat")
+        dialect.name = "snowflake"
+        cursor = FakeArrowCursor([pa.table({"A": list(range(7))}), pa.table({"A": [7, 8]})])
+        engine = mock.Mock(dialect=dialect)
+        engine.raw_connection.return_value.cursor.return_value = cursor
+
+        stream = QueryStream(engine, "SELECT a FROM t WHERE d = :d", {"d": "2024-01-02"}, batch_rows=3)
+        self.assertEqual([b.num_rows for b in stream], [3, 3, 1, 2])
+        self.assertEqual(cursor.executed, [("SELECT a FROM t WHERE d = %(d)s", {"d": "2024-01-02"})])
+        self.assertTrue(cursor.closed)
+        engine.raw_connection.return_value.close.assert_called_once()
+        self.assertEqual(stream.stats["rows"], 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import datetime
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import duckdb
+import pandas as pd
+from db_connector import process_data, tca_runner
+from db_connector.staging import ParquetStage
+from db_connector.synthetic import generate_tca_data
+from db_connector.tca_runner import plan_shards, run_sharded_tca
+
+DAYS = [datetime.date(2024, 1, 2), datetime.date(2024, 1, 3)]
+
+
+def per_day_metrics(data):
+    frames = []
+    for day, (quotes, orders, condition_filter) in zip(DAYS, data):
+        conn = duckdb.connect()
+        process_data.setup_tables(conn)
+        process_data.bulk_load(conn, quotes, orders, condition_filter)
+        metrics = process_data.compute_metrics(conn, method="asof")
+        metrics.insert(0, "trade_date", day)
+        frames.append(metrics)
+    return pd.concat(frames, ignore_index=True)
+
+
+def sorted_frame(df):
+    df = df.assign(trade_date=pd.to_datetime(df["trade_date"]))
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+class TestShardedTca(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.database = os.path.join(cls.tmpdir.name, "tca.duckdb")
+        cls.data = [generate_tca_data(20_000, 4, n_orders=30, seed=i, trade_date=day) for i, day in enumerate(DAYS)]
+        conn = duckdb.connect(cls.database)
+        process_data.setup_tables(conn)
+        for i, (quotes, orders, condition_filter) in enumerate(cls.data):
+            process_data.bulk_load(conn, quotes, orders, condition_filter if i == 0 else None)
+        conn.close()
+        cls.expected = sorted_frame(per_day_metrics(cls.data))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_plan_shards(self):
+        shards = plan_shards(self.database, 3)
+        self.assertEqual({day for day, _ in shards}, set(DAYS))
+        self.assertEqual(sum(shards.values()), 60)
+        self.assertEqual(set(plan_shards(self.database, 3, trade_dates=DAYS[1:])), {s for s in shards if s[0] == DAYS[1]})
+
+    def test_process_pool_matches_per_day_runs(self):
+        result = run_sharded_tca(self.database, n_buckets=2, max_workers=2)
+        self.assertEqual(result["failed"], {})
+        self.assertGreater(len(self.expected), 0)
+        pd.testing.assert_frame_equal(sorted_frame(result["metrics"]), self.expected)
+        self.assertTrue(all(s["attempts"] == 1 for s in result["shards"].values()))
+
+    def test_failed_shard_is_retried_alone(self):
+        calls = []
+        victim = min(plan_shards(self.database, 2))
+
+        def flaky(spec):
+            shard = (spec["trade_date"], spec["bucket"])
+            calls.append(shard)
+            if shard == victim and calls.count(shard) == 1:
+                raise duckdb.IOException("transient")
+            return real(spec)
+
+        real = tca_runner._run_shard
+        with mock.patch.object(tca_runner, "_run_shard", flaky):
+            result = run_sharded_tca(self.database, n_buckets=2, max_workers=2, executor_factory=ThreadPoolExecutor)
+        self.assertEqual(result["failed"], {})
+        self.assertEqual(result["shards"][victim]["attempts"], 2)
+        self.assertEqual(len(calls), len(result["shards"]) + 1)
+        pd.testing.assert_frame_equal(sorted_frame(result["metrics"]), self.expected)
+
+    def test_persistent_failure_is_reported(self):
+        real = tca_runner._run_shard
+
+        def broken_day(spec):
+            if spec["trade_date"] == DAYS[0]:
+                raise ValueError("bad day")
+            return real(spec)
+
+        with mock.patch.object(tca_runner, "_run_shard", broken_day):
+            result = run_sharded_tca(self.database, n_buckets=2, max_workers=2, retries=1,
+                                     executor_factory=ThreadPoolExecutor)
+        self.assertEqual({day for day, _ in result["failed"]}, {DAYS[0]})
+        self.assertTrue(all(result["shards"][s]["attempts"] == 2 for s in result["failed"]))
+        self.assertEqual(set(result["metrics"]["trade_date"]), {DAYS[1]})
+
+    def test_quotes_from_parquet_stage(self):
+        stage = ParquetStage(os.path.join(self.tmpdir.name, "stage"))
+        for day, (quotes, _, _) in zip(DAYS, self.data):
+            quotes = quotes.cast(quotes.schema.set(0, quotes.schema.field(0).with_type(quotes.schema.field(0).type.value_type)))
+            stage.ensure(sorted(set(quotes["security_id"].to_pylist())), day, day,
+                         fetch=lambda securities, start, end, quotes=quotes: quotes.to_batches())
+        result = run_sharded_tca(self.database, n_buckets=2, max_workers=2, stage_root=stage.root,
+                                 executor_factory=ThreadPoolExecutor)
+        self.assertEqual(result["failed"], {})
+        pd.testing.assert_frame_equal(sorted_frame(result["metrics"]), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+import duckdb
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from db_connector import db_engine, writeback
+from db_connector.db_engine import BaseEngineBuilder
+from db_connector.writeback import write_frame, write_frame_to_engine
+
+
+class SQLiteEngineBuilder(BaseEngineBuilder):
+    def build_url(self, user: str, password: str, **kwargs):
+        return URL.create("sqlite", database=kwargs['path'])
+
+
+def metrics_frame(ids, prices):
+    return pd.DataFrame({
+        "security_id": ids,
+        "fulfill_time": [datetime.datetime(2024, 1, 2, 10, i) for i in range(len(ids))],
+        "execution_price": prices,
+    })
+
+
+class TestGenericWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "tca.db")
+        self.patches = [
+            mock.patch.dict(db_engine.engine_builders, {'sqlite': SQLiteEngineBuilder()}),
+            mock.patch.object(db_engine, 'get_credentials', return_value={'password': 'secret'}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.engine = db_engine.get_engine('sqlite', 'user', path=self.path)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE tca_metrics (security_id TEXT, fulfill_time TIMESTAMP, execution_price REAL)"))
+
+    def tearDown(self):
+        db_engine.dispose_engines()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def table(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT security_id, execution_price FROM tca_metrics ORDER BY security_id")).fetchall()
+
+    def test_append_in_batches(self):
+        df = metrics_frame(["A", "B", "C", "D", "E"], [1.0, 2.0, np.nan, 4.0, 5.0])
+        stats = write_frame('sqlite', 'user', df, "tca_metrics", batch_rows=2, path=self.path)
+        self.assertEqual(stats["method"], "generic")
+        self.assertEqual([b["rows"] for b in stats["batches"]], [2, 2, 1])
+        self.assertEqual(stats["rows"], 5)
+        self.assertEqual(self.table(), [("A", 1.0), ("B", 2.0), ("C", None), ("D", 4.0), ("E", 5.0)])
+
+    def test_merge_updates_and_inserts(self):
+        write_frame('sqlite', 'user', metrics_frame(["A", "B"], [1.0, 2.0]), "tca_metrics", path=self.path)
+        write_frame('sqlite', 'user', metrics_frame(["B", "C"], [20.0, 30.0]), "tca_metrics",
+                    mode="merge", key="security_id", path=self.path)
+        self.assertEqual(self.table(), [("A", 1.0), ("B", 20.0), ("C", 30.0)])
+
+    def test_rejects_bad_arguments(self):
+        df = metrics_frame(["A"], [1.0])
+        with self.assertRaises(ValueError):
+            write_frame_to_engine(self.engine, df, "tca_metrics", mode="replace")
+        with self.assertRaises(ValueError):
+            write_frame_to_engine(self.engine, df, "tca_metrics", mode="merge")
+        with self.assertRaises(ValueError):
+            write_frame_to_engine(self.engine, df, "tca_metrics", mode="merge", key=["order_id"])
+        with self.assertRaisesRegex(ValueError, "security_id"):
+            write_frame_to_engine(self.engine, metrics_frame(["A", None], [1.0, 2.0]), "tca_metrics",
+                                  mode="merge", key="security_id")
+        with self.assertRaisesRegex(ValueError, "Duplicate keys"):
+            write_frame_to_engine(self.engine, metrics_frame(["A", "A"], [1.0, 2.0]), "tca_metrics",
+                                  mode="merge", key="security_id")
+        self.assertEqual(self.table(), [])
+
+    def test_oracle_array_binding(self):
+        # SQLite accepts Oracle-style :1 binds, so it stands in for the raw cursor path.
+        df = metrics_frame(["A", "B", "C"], [1.0, 2.0, 3.0])
+        batches = writeback._write_oracle(self.engine, df, "tca_metrics", "append", [], 2)
+        self.assertEqual([b["rows"] for b in batches], [2, 1])
+        self.assertEqual(self.table(), [("A", 1.0), ("B", 2.0), ("C", 3.0)])
+
+    def test_oracle_merge_statement(self):
+        sql = writeback._merge_sql("tca_metrics", "(SELECT :1 AS security_id, :2 AS execution_price FROM dual)",
+                                   ["security_id", "execution_price"], ["security_id"])
+        self.assertEqual(sql, (
+            "MERGE INTO tca_metrics t USING (SELECT :1 AS security_id, :2 AS execution_price FROM dual) s "
+            "ON (t.security_id = s.security_id) WHEN MATCHED THEN UPDATE SET execution_price = s.execution_price "
+            "WHEN NOT MATCHED THEN INSERT (security_id, execution_price) VALUES (s.security_id, s.execution_price)"
+        ))
+
+
+class DuckDBRawConnection:
+    """Raw DBAPI stand-in for a Snowflake connection, backed by one DuckDB connection."""
+
+    def __init__(self, conn):
+        self.driver_connection = conn
+
+    def cursor(self):
+        return mock.Mock(execute=self.driver_connection.execute)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def duckdb_write_pandas(conn, df, table_name, **kwargs):
+    conn.register("chunk", df)
+    conn.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM chunk")
+    conn.unregister("chunk")
+    return True, 1, len(df), []
+
+
+class TestSnowflakeWriter(unittest.TestCase):
+    def setUp(self):
+        self.conn = duckdb.connect()
+        self.conn.execute("CREATE TABLE tca_metrics (security_id VARCHAR, fulfill_time TIMESTAMP, execution_price DOUBLE)")
+        self.engine = mock.Mock()
+        self.engine.dialect.name = "snowflake"
+        self.engine.raw_connection.return_value = DuckDBRawConnection(self.conn)
+        patch = mock.patch("snowflake.connector.pandas_tools.write_pandas", side_effect=duckdb_write_pandas)
+        self.write_pandas = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_staged_copy_per_batch(self):
+        stats = write_frame_to_engine(self.engine, metrics_frame(list("ABCDE"), [1.0] * 5), "tca_metrics", batch_rows=2)
+        self.assertEqual(stats["method"], "snowflake")
+        self.assertEqual(self.write_pandas.call_count, 3)
+        self.assertEqual(self.write_pandas.call_args.kwargs, {"quote_identifiers": False, "auto_create_table": False})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM tca_metrics").fetchone()[0], 5)
+
+    def test_merge_through_temporary_stage(self):
+        write_frame_to_engine(self.engine, metrics_frame(["A", "B"], [1.0, 2.0]), "tca_metrics")
+        stats = write_frame_to_engine(self.engine, metrics_frame(["B", "C"], [20.0, 30.0]), "tca_metrics",
+                                      mode="merge", key=["security_id"])
+        self.assertEqual(len(stats["batches"]), 2)  # one staged batch plus the MERGE
+        rows = self.conn.execute("SELECT security_id, execution_price FROM tca_metrics ORDER BY 1").fetchall()
+        self.assertEqual(rows, [("A", 1.0), ("B", 20.0), ("C", 30.0)])
+        self.assertEqual(self.conn.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'tca_metrics_merge_stage'").fetchone()[0], 0)
+
+    def test_failed_merge_keeps_original_error(self):
+        def execute(sql):
+            if sql.startswith("DROP"):
+                raise duckdb.ConnectionException("connection lost")
+            return self.conn.execute(sql)
+
+        cursor = mock.Mock(execute=mock.Mock(side_effect=execute))
+        self.engine.raw_connection.return_value.cursor = lambda: cursor
+        self.write_pandas.side_effect = ValueError("COPY INTO failed")
+        with self.assertRaisesRegex(ValueError, "COPY INTO failed"):
+            write_frame_to_engine(self.engine, metrics_frame(["A"], [1.0]), "tca_metrics",
+                                  mode="merge", key=["security_id"])
+        cursor.execute.assert_called_with("DROP TABLE IF EXISTS tca_metrics_merge_stage")
+
+if __name__ == "__main__":
+    unittest.main()